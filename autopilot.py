@@ -0,0 +1,315 @@
+from typing import List, Tuple, Union, Literal, Optional, Set, Iterable
+from array import array
+import heapq
+import time
+
+from controls import InputSource
+from engine import GameState, OPPOSITE_DIRECTION
+from grid import OccupancyGrid, SNAKE, FOOD, WALL
+from snake import Snake, DIRECTION_DELTA
+from wall import Wall
+from type_alias import *
+
+# distance of the cells no food can be reached from
+UNREACHABLE = 1 << 30
+
+# seconds a tick may spend updating the field and checking moves before the
+# fallback move is taken
+AUTOPILOT_BUDGET = 0.002
+
+# cells flooded between two checks of the time budget
+BUDGET_CHECK_CELLS = 64
+
+
+class Autopilot(InputSource):
+    def __init__(self, budget: Optional[float] = AUTOPILOT_BUDGET):
+        """Computer player following a distance field to the nearest food
+
+        The field holds the BFS distance of every cell to the nearest food around
+        the walls, with the parent of each cell on its shortest path. It is kept
+        up to date from one tick to the next instead of being recomputed:
+        - new food lowers the distances around it, touching only the cells it
+          gets closer to;
+        - eaten food and new walls raise the distances of the cells whose path
+          went through them, found through the parents, and only these cells
+          are searched again from their neighbours.
+        The snake bodies change every tick and stay out of the field. A move is
+        safe if its cell is free and leaves the snake at least as many free cells
+        as its length. Moves are checked from the closest to the food until the
+        time budget of the tick runs out, then the unchecked move with the most
+        free neighbours is taken. The budget covers the update of the field too:
+        distances not spread by the deadline are spread on the next ticks.
+
+        The autopilot is also a policy, see policies.POLICIES.
+
+        Args:
+            budget (Optional[float], optional): seconds a tick may spend updating the field and checking moves. Defaults to AUTOPILOT_BUDGET (None for no limit).
+        """
+        self.budget = budget
+
+        self.grid: Optional[OccupancyGrid] = None
+        self.dist = array("i")
+        self.parent = array("i")
+        self.neighbors: List[Tuple[int, ...]] = []
+        # cells of the food the field leads to, and walls it goes around
+        self.foods: Set[int] = set()
+        self.walls: List[Wall] = []
+        # candidate distance, cell and parent cell not spread yet
+        self.heap: List[Tuple[int, int, int]] = []
+
+    def __call__(self, state: GameState) -> Optional[Direction]:
+        """Steer the snake of the player, as a policy"""
+        return self.next_action(state)
+
+    def build(self, state: GameState, deadline: float = float("inf")) -> None:
+        """Compute the field of a game from scratch
+
+        Args:
+            state (GameState): the game
+            deadline (float, optional): perf_counter time at which to leave the rest of the work to the next update. Defaults to no limit.
+        """
+        grid = state.grid
+        if grid is not self.grid:
+            self.grid = grid
+            cols, rows = grid.cols, grid.rows
+            self.neighbors = []
+            for idx in range(cols * rows):
+                row, col = divmod(idx, cols)
+                cells = []
+                if row > 0:
+                    cells.append(idx - cols)
+                if row < rows - 1:
+                    cells.append(idx + cols)
+                if col > 0:
+                    cells.append(idx - 1)
+                if col < cols - 1:
+                    cells.append(idx + 1)
+                self.neighbors.append(tuple(cells))
+
+        size = grid.cols * grid.rows
+        self.dist = array("i", [UNREACHABLE]) * size
+        self.parent = array("i", [-1]) * size
+        self.walls = list(state.wall_controller.walls)
+        self.foods = set()
+        self.heap = []
+        self.__add_foods(grid.index(pos) for pos in state.food_controller.get_pos())
+        self.__propagate(deadline)
+
+    def update(self, state: GameState, deadline: float = float("inf")) -> None:
+        """Bring the field up to date with the food and walls of the game
+
+        The distances that are not spread by the deadline are spread by the next
+        updates, meanwhile some cells are farther from the food than they are.
+
+        Args:
+            state (GameState): the game
+            deadline (float, optional): perf_counter time at which to leave the rest of the work to the next update. Defaults to no limit.
+        """
+        walls = state.wall_controller.walls
+        known = len(self.walls)
+        if (
+            state.grid is not self.grid
+            or len(walls) < known
+            or any(walls[i] is not self.walls[i] for i in range(known))
+        ):
+            # another game, a reset or a removed wall
+            self.build(state, deadline)
+            return
+
+        grid = self.grid
+        for wall in walls[known:]:
+            self.walls.append(wall)
+            self.__remove_cells(
+                [grid.index(pos) for pos in wall.get_collision_detect_pos()]
+            )
+
+        foods = {grid.index(pos) for pos in state.food_controller.get_pos()}
+        if foods != self.foods:
+            eaten = self.foods - foods
+            self.foods -= eaten
+            self.__remove_cells(eaten)
+            self.__add_foods(foods - self.foods)
+        self.__propagate(deadline)
+
+    def __add_foods(self, cells: Iterable[int]) -> None:
+        """Queue the lower distances around new food"""
+        for idx in cells:
+            if idx >= 0:
+                self.foods.add(idx)
+                heapq.heappush(self.heap, (0, idx, -1))
+
+    def __remove_cells(self, cells: Iterable[int]) -> None:
+        """Raise the distances of the paths through eaten food or new wall cells
+
+        Args:
+            cells (Iterable[int]): cells that no longer hold food, or are walls now
+        """
+        dist, parent, neighbors = self.dist, self.parent, self.neighbors
+
+        # every cell whose shortest path goes through the cells loses its distance
+        stale = [idx for idx in cells if idx >= 0]
+        for idx in stale:
+            dist[idx] = UNREACHABLE
+            parent[idx] = -1
+        i = 0
+        while i < len(stale):
+            idx = stale[i]
+            i += 1
+            for other in neighbors[idx]:
+                if parent[other] == idx:
+                    dist[other] = UNREACHABLE
+                    parent[other] = -1
+                    stale.append(other)
+
+        # then gets it back from its neighbours outside the stale region
+        walls = self.grid.layers[WALL]
+        heap = self.heap
+        for idx in stale:
+            if walls[idx]:
+                continue
+            for other in neighbors[idx]:
+                if dist[other] != UNREACHABLE:
+                    heapq.heappush(heap, (dist[other] + 1, idx, other))
+
+    def __propagate(self, deadline: float = float("inf")) -> None:
+        """Spread the queued shorter distances over the board
+
+        Candidates queued before cells were raised again may no longer hold, so
+        a candidate is only taken while its parent still has the distance it was
+        derived from, or is a food.
+
+        Args:
+            deadline (float, optional): perf_counter time at which to keep the rest of the queue for later. Defaults to no limit.
+        """
+        dist, parent, neighbors = self.dist, self.parent, self.neighbors
+        walls = self.grid.layers[WALL]
+        heap = self.heap
+        popped = 0
+        while heap:
+            popped += 1
+            if popped % BUDGET_CHECK_CELLS == 0 and time.perf_counter() > deadline:
+                return
+            d, idx, prev = heapq.heappop(heap)
+            if d >= dist[idx] or walls[idx]:
+                continue
+            if (dist[prev] != d - 1) if prev >= 0 else (idx not in self.foods):
+                continue
+            dist[idx] = d
+            parent[idx] = prev
+            d += 1
+            for other in neighbors[idx]:
+                if d < dist[other] and not walls[other]:
+                    heapq.heappush(heap, (d, other, idx))
+
+    def get_distance(self, pos: Position) -> int:
+        """Get the number of moves from a position to the nearest food, around the walls
+
+        Args:
+            pos (Position): the position (px)
+
+        Returns:
+            int: the distance, UNREACHABLE if no food can be reached or the position is outside the board
+        """
+        idx = self.grid.index(pos)
+        return self.dist[idx] if idx >= 0 else UNREACHABLE
+
+    def __room(self, start: int, tail: int, length: int, deadline: float) -> int:
+        """Count the free cells reachable from a cell, up to the length of the snake
+
+        Args:
+            start (int): the cell the head moves to
+            tail (int): the cell the tail leaves in the same tick, -1 if the snake grows
+            length (int): the length of the snake
+            deadline (float): perf_counter time at which to stop counting
+
+        Returns:
+            int: the number of cells, -1 if the deadline passed
+        """
+        taken, neighbors = self.grid.taken, self.neighbors
+        foods = self.grid.layers[FOOD]
+        seen = {start}
+        queue = [start]
+        i = 0
+        while i < len(queue):
+            if len(queue) >= length:
+                return len(queue)
+            if i % BUDGET_CHECK_CELLS == 0 and time.perf_counter() > deadline:
+                return -1
+            idx = queue[i]
+            i += 1
+            for other in neighbors[idx]:
+                if other in seen:
+                    continue
+                # food cells are free to move into
+                if taken[other] > foods[other] and other != tail:
+                    continue
+                seen.add(other)
+                queue.append(other)
+        return len(queue)
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        deadline = time.perf_counter() + (
+            self.budget if self.budget is not None else float("inf")
+        )
+        self.update(state, deadline)
+
+        grid = self.grid
+        snake: Snake = state.snakes[player]
+        head_x, head_y = snake.get_head_pos()
+        # the tail moves away in the same tick, unless the snake grows
+        if grid.count(FOOD, snake.get_head_pos()):
+            tail = -1
+        else:
+            tail = grid.index(snake.get_tail_pos())
+
+        moves = []
+        for direction, (dx, dy) in DIRECTION_DELTA.items():
+            if direction == OPPOSITE_DIRECTION[snake.get_direction()]:
+                continue
+            idx = grid.index(
+                (head_x + dx * grid.cell_size, head_y + dy * grid.cell_size)
+            )
+            if idx < 0 or grid.layers[WALL][idx]:
+                continue
+            if grid.layers[SNAKE][idx] and idx != tail:
+                continue
+            # closest to the food first, going straight on a tie
+            moves.append(
+                (self.dist[idx], direction != snake.get_direction(), direction, idx)
+            )
+        if not moves:
+            return None
+        moves.sort()
+
+        # the closest move leaving enough room, else the one leaving the most
+        length = snake.get_length()
+        best, best_room = moves[0][2], -1
+        for i, (_, _, direction, idx) in enumerate(moves):
+            room = self.__room(idx, tail, length, deadline)
+            if room < 0:
+                # out of time, the unchecked move with the most free neighbours
+                return max(
+                    moves[i:], key=lambda move: self.__free_neighbors(move[3], tail)
+                )[2]
+            if room >= length:
+                return direction
+            if room > best_room:
+                best, best_room = direction, room
+        return best
+
+    def __free_neighbors(self, idx: int, tail: int) -> int:
+        """Count the free cells next to a cell, a cheap stand-in for its room
+
+        Args:
+            idx (int): the cell
+            tail (int): the cell the tail leaves in the same tick, -1 if the snake grows
+
+        Returns:
+            int: the number of neighbours the snake can move into
+        """
+        taken, foods = self.grid.taken, self.grid.layers[FOOD]
+        return sum(
+            1
+            for other in self.neighbors[idx]
+            if taken[other] <= foods[other] or other == tail
+        )
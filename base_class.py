@@ -6,6 +6,9 @@ from type_alias import Position, Color
 
 
 class Block(ABC):
+    # no per-instance __dict__, there may be thousands of blocks
+    __slots__ = ("pos", "color", "width", "height")
+
     def __init__(self, pos: Position, color: Color, width: int, height: int):
         """__init__ method for Block class
 
@@ -0,0 +1,196 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Any, Iterator
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from config import *
+from engine import GameState
+from policies import POLICIES, get_policy
+
+RESULT_FIELDS = [
+    "game",
+    "seed",
+    "policy",
+    "max_food_cnt",
+    "max_wall_cnt",
+    "generate_wall_interval",
+    "score",
+    "length",
+    "ticks",
+    "time_played",
+    "game_over_code",
+]
+
+
+def run_game(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Play one headless game to the end
+
+    Args:
+        task (Dict[str, Any]): game number, seed, policy name, max_ticks and game settings
+
+    Returns:
+        Dict[str, Any]: the task with score, length, ticks, time played and game over code
+            (0: border, 1: snake body, 2: wall, None: stopped at max_ticks)
+    """
+    # the game owns its generator, the global one only drives the policy
+    random.seed(task["seed"])
+    policy = get_policy(task["policy"])
+
+    state = GameState(
+        width=task["width"],
+        height=task["height"],
+        max_food_cnt=task["max_food_cnt"],
+        max_wall_cnt=task["max_wall_cnt"],
+        generate_wall_interval=task["generate_wall_interval"],
+        seed=task["seed"],
+        cell_size=task["cell_size"],
+    )
+    while not state.done and state.ticks < task["max_ticks"]:
+        state.step(policy(state))
+
+    result = {field: task[field] for field in RESULT_FIELDS if field in task}
+    result.update(
+        score=state.score,
+        length=state.snake.get_length(),
+        ticks=state.ticks,
+        time_played=round(state.time_played, 3),
+        game_over_code=state.game_over_code,
+    )
+    return result
+
+
+def make_tasks(args: argparse.Namespace) -> Iterator[Dict[str, Any]]:
+    """Expand the command line into one task per game
+
+    Every combination of policy and settings is played args.games times, game i
+    of every combination uses seed args.seed + i so they can be compared.
+
+    Args:
+        args (argparse.Namespace): parsed command line
+
+    Yields:
+        Dict[str, Any]: a task for run_game
+    """
+    game = 0
+    for policy, max_food_cnt, max_wall_cnt, generate_wall_interval in itertools.product(
+        args.policy, args.max_food_cnt, args.max_wall_cnt, args.generate_wall_interval
+    ):
+        for i in range(args.games):
+            yield {
+                "game": game,
+                "seed": args.seed + i,
+                "policy": policy,
+                "max_food_cnt": max_food_cnt,
+                "max_wall_cnt": max_wall_cnt,
+                "generate_wall_interval": generate_wall_interval,
+                "width": args.width,
+                "height": args.height,
+                "cell_size": args.cell_size,
+                "max_ticks": args.max_ticks,
+            }
+            game += 1
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line
+
+    Args:
+        argv (Optional[List[str]], optional): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        argparse.Namespace: parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Play many seeded headless games in parallel and stream the results."
+    )
+    parser.add_argument(
+        "-n", "--games", type=int, default=100, help="games per combination of settings"
+    )
+    parser.add_argument(
+        "-o", "--output", default="results.jsonl", help="result file, .csv or .jsonl"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument(
+        "--policy",
+        nargs="+",
+        default=["greedy"],
+        help=f"policies to play, among {sorted(POLICIES)} or 'module:function'",
+    )
+    parser.add_argument("--max-food-cnt", type=int, nargs="+", default=[MAX_FOOD_CNT])
+    parser.add_argument("--max-wall-cnt", type=int, nargs="+", default=[MAX_WALL_CNT])
+    parser.add_argument(
+        "--generate-wall-interval",
+        type=float,
+        nargs="+",
+        default=[GENERATE_WALL_INTERVAL],
+    )
+    parser.add_argument("--width", type=int, default=GRID_COLS * CELL_SIZE)
+    parser.add_argument("--height", type=int, default=GRID_ROWS * CELL_SIZE)
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE)
+    parser.add_argument(
+        "--max-ticks",
+        type=int,
+        default=100_000,
+        help="stop a game after this many ticks",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Play the games on a process pool, writing each result as soon as it arrives
+
+    Args:
+        argv (Optional[List[str]], optional): arguments, defaults to sys.argv[1:]
+    """
+    args = parse_args(argv)
+    for policy in args.policy:
+        get_policy(policy)  # fail early on a bad name
+
+    tasks = list(make_tasks(args))
+    as_csv = args.output.endswith(".csv")
+
+    start_time = time.time()
+    totals: Dict[Any, List[int]] = {}
+    with open(args.output, "w", newline="") as f, multiprocessing.Pool(
+        args.jobs
+    ) as pool:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS) if as_csv else None
+        if writer is not None:
+            writer.writeheader()
+
+        chunksize = max(1, len(tasks) // (4 * (args.jobs or 1)))
+        for result in pool.imap_unordered(run_game, tasks, chunksize=chunksize):
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                f.write(json.dumps(result) + "\n")
+
+            key = (
+                result["policy"],
+                result["max_food_cnt"],
+                result["max_wall_cnt"],
+                result["generate_wall_interval"],
+            )
+            totals.setdefault(key, []).append(result["score"])
+
+    elapsed = time.time() - start_time
+    print(f"{len(tasks)} games in {elapsed:.1f}s, results in {args.output}")
+    for key, scores in sorted(totals.items()):
+        policy, max_food_cnt, max_wall_cnt, generate_wall_interval = key
+        print(
+            f"policy={policy} max_food_cnt={max_food_cnt} max_wall_cnt={max_wall_cnt} "
+            f"generate_wall_interval={generate_wall_interval}: "
+            f"mean score {sum(scores) / len(scores):.1f}, max {max(scores)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
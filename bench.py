@@ -0,0 +1,647 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Any, Callable
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from colors import *
+from config import *
+from type_alias import *
+
+# a setup builds the state of a case outside the timing and returns the operation to time
+Setup = Callable[[Any], Callable[[], None]]
+
+BENCHMARKS: Dict[str, Tuple[Setup, List[Any], Optional[int]]] = {}
+
+
+def benchmark(name: str, params: List[Any], max_loops: Optional[int] = None):
+    """Register a benchmark case
+
+    Args:
+        name (str): name of the case
+        params (List[Any]): the parameter values the case is run with, e.g. snake lengths
+        max_loops (Optional[int], optional): most operations to run on one setup, for
+            operations that change their own cost like growing. Defaults to None.
+    """
+
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = (setup, params, max_loops)
+        return setup
+
+    return register
+
+
+def cycle_cells(cells: int) -> List[Position]:
+    """Get a closed path visiting every cell of a square board once
+
+    Args:
+        cells (int): the least number of cells of the path
+
+    Returns:
+        List[Position]: positions (px) of the path, each next to the following one and the last next to the first
+    """
+    side = max(4, math.ceil(math.sqrt(cells)))
+    side += side % 2
+    path = [(col, 0) for col in range(side)]
+    for row in range(1, side):
+        cols = range(side - 1, 0, -1) if row % 2 else range(1, side)
+        path.extend((col, row) for col in cols)
+    path.extend((0, row) for row in range(side - 1, 0, -1))
+    return [(col * 10, row * 10) for col, row in path]
+
+
+def make_snake(length: int, free_cells: int):
+    """Build a snake lying on a closed path of a board, with room left on the path
+
+    Args:
+        length (int): length of the snake
+        free_cells (int): the least number of cells of the path left in front of the snake
+
+    Returns:
+        Tuple[Snake, List[Direction]]: the snake and the direction to take at every cell of the path
+    """
+    from grid import OccupancyGrid
+    from snake import Snake, SnakeBodyBlock, DIRECTION_DELTA
+
+    path = cycle_cells(length + free_cells)
+    side = max(x for x, _ in path) + 10
+    delta_direction = {delta: direction for direction, delta in DIRECTION_DELTA.items()}
+    directions = []
+    for (x, y), (next_x, next_y) in zip(path, path[1:] + path[:1]):
+        directions.append(delta_direction[((next_x - x) // 10, (next_y - y) // 10)])
+
+    grid = OccupancyGrid(side, side)
+    snake = Snake(
+        body=[SnakeBodyBlock(pos, WHITE, 10, 10) for pos in path[:length]],
+        direction=directions[length - 1],
+        grid=grid,
+    )
+    return snake, directions
+
+
+@benchmark("snake.move", [10, 100, 1_000, 10_000])
+def bench_snake_move(length: int) -> Callable[[], None]:
+    snake, directions = make_snake(length, 1)
+    cells = len(directions)
+    head = [length - 1]
+
+    def op():
+        snake.set_direction(directions[head[0]])
+        snake.move()
+        head[0] = (head[0] + 1) % cells
+
+    return op
+
+
+@benchmark("snake.grow", [10, 100, 1_000, 10_000], max_loops=2_000)
+def bench_snake_grow(length: int) -> Callable[[], None]:
+    snake, directions = make_snake(length, 2_000)
+    head = [length - 1]
+
+    def op():
+        snake.set_direction(directions[head[0]])
+        snake.grow(color=RED)
+        head[0] += 1
+
+    return op
+
+
+@benchmark("utils.check", [10, 100, 1_000, 10_000])
+def bench_check(length: int) -> Callable[[], None]:
+    from utils import check
+
+    snake, _ = make_snake(length, 1)
+    snake_pos = snake.get_all_pos()
+    food_pos = [(-10, -10 * i) for i in range(1, 4)]
+    wall_pos = [(-20, -10 * i) for i in range(1, 6)]
+
+    def op():
+        check(snake_pos, food_pos, wall_pos)
+
+    return op
+
+
+def make_full_board(fill: float):
+    """Build an 800x800 board with a share of its cells taken
+
+    Args:
+        fill (float): share of the cells taken, between 0 and 1
+
+    Returns:
+        Tuple[OccupancyGrid, FreeCellSampler, random.Random]: the board, its sampler and a seeded generator
+    """
+    from grid import OccupancyGrid, SNAKE
+    from placement import FreeCellSampler
+
+    rng = random.Random(0)
+    grid = OccupancyGrid(SCREEN_WIDTH, SCREEN_HEIGHT)
+    cells = grid.cols * grid.rows
+    for idx in rng.sample(range(cells), int(fill * cells)):
+        grid.add(SNAKE, grid.position(idx))
+    return grid, FreeCellSampler(grid, rng=rng), rng
+
+
+@benchmark("FoodController.generate", [0.0, 0.5, 0.9, 0.99])
+def bench_food_generate(fill: float) -> Callable[[], None]:
+    from food import FoodController
+    from placement import PlacementError
+
+    grid, sampler, rng = make_full_board(fill)
+    food_controller = FoodController(
+        SCREEN_WIDTH,
+        SCREEN_HEIGHT,
+        food_list=[],
+        verbose=False,
+        grid=grid,
+        sampler=sampler,
+        rng=rng,
+    )
+
+    def op():
+        try:
+            food_controller.generate(1)
+        except PlacementError:
+            return
+        food_controller.remove(0)
+
+    return op
+
+
+@benchmark("FoodController.get_food_at_pos", [3, 100, 1_000, 10_000])
+def bench_get_food_at_pos(foods: int) -> Callable[[], None]:
+    from food import Food, FoodController
+
+    rng = random.Random(0)
+    food_controller = FoodController(
+        SCREEN_WIDTH * 4, SCREEN_HEIGHT * 4, food_list=[], verbose=False
+    )
+    cells = rng.sample(range((SCREEN_WIDTH // 10 * 4) ** 2), foods)
+    for cell in cells:
+        row, col = divmod(cell, SCREEN_WIDTH // 10 * 4)
+        food_controller.add(Food(pos=(col * 10, row * 10)))
+    last_pos = food_controller.get_pos(foods - 1)
+
+    def op():
+        food_controller.get_food_at_pos(last_pos)
+
+    return op
+
+
+@benchmark("WallController.generate", [0.0, 0.5, 0.9])
+def bench_wall_generate(fill: float) -> Callable[[], None]:
+    from placement import PlacementError
+    from wall import WallController
+
+    grid, sampler, rng = make_full_board(fill)
+    wall_controller = WallController(
+        None,
+        SCREEN_WIDTH,
+        SCREEN_HEIGHT,
+        verbose=False,
+        grid=grid,
+        sampler=sampler,
+        rng=rng,
+    )
+
+    def op():
+        try:
+            wall_controller.generate(1)
+        except PlacementError:
+            return
+        wall_controller.remove(0)
+
+    return op
+
+
+@benchmark("WallController.get_all_collision", [1, 10, 100, 1_000])
+def bench_get_all_collision(walls: int) -> Callable[[], None]:
+    from wall import Wall, WallController
+
+    rng = random.Random(0)
+    wall_controller = WallController(None, SCREEN_WIDTH, SCREEN_HEIGHT, verbose=False)
+    for _ in range(walls):
+        pos = (rng.randrange(0, SCREEN_WIDTH, 10), rng.randrange(0, SCREEN_HEIGHT, 10))
+        wall_controller.add(Wall(rng.choice(["Vertical", "Horizontal"]), pos))
+
+    # a wall changes every time, so the cached list is rebuilt
+    def op():
+        wall = wall_controller.get(0)
+        wall_controller.remove(0)
+        wall_controller.add(wall)
+        wall_controller.get_all_collision()
+
+    return op
+
+
+@benchmark("GameState.fork", [80, 200])
+def bench_fork(cells: int) -> Callable[[], None]:
+    from engine import GameState
+    from policies import greedy_policy
+
+    state = GameState(width=cells * 10, height=cells * 10, seed=0)
+    for _ in range(1_000):
+        if state.done:
+            break
+        state.step(greedy_policy(state))
+
+    # one copy of the game and a tick of the copy per operation, as in a rollout
+    def op():
+        state.fork().step()
+
+    return op
+
+
+@benchmark("ObservationEncoder tick", [80, 200])
+def bench_observation(cells: int) -> Callable[[], None]:
+    from engine import GameState
+    from observation import ObservationEncoder
+    from policies import greedy_policy
+
+    state = GameState(width=cells * 10, height=cells * 10, seed=0)
+    encoder = ObservationEncoder(crop=11)
+    encoder.observe(state)
+
+    # one tick and one incremental update per operation, a new game when the last one ended
+    def op():
+        if state.done:
+            state.reset(state.seed + 1)
+        state.step(greedy_policy(state))
+        encoder.observe(state)
+
+    return op
+
+
+@benchmark("Autopilot tick", [80, 200])
+def bench_autopilot(cells: int) -> Callable[[], None]:
+    from autopilot import Autopilot
+    from engine import GameState
+
+    state = GameState(
+        width=cells * 10, height=cells * 10, seed=0, generate_wall_interval=1
+    )
+    autopilot = Autopilot(budget=None)
+    autopilot.update(state)
+
+    # one decision and tick per operation, a new game when the last one ended
+    def op():
+        if state.done:
+            state.reset(state.seed + 1)
+        state.step(autopilot(state))
+
+    return op
+
+
+@benchmark("HamiltonianCycle repair", [40, 80])
+def bench_cycle_repair(cells: int) -> Callable[[], None]:
+    from hamilton import HamiltonianCycle, spanning_tree
+
+    cycle = HamiltonianCycle(cells, cells, *spanning_tree(cells, cells, frozenset()))
+    blocks = (cells // 2) ** 2
+    walls = [frozenset([block]) for block in range(0, blocks, 7)]
+    i = [0]
+
+    # one new blocked block repaired from the cycle without it, past the cache
+    def op():
+        blocked = walls[i[0] % len(walls)]
+        i[0] += 1
+        HamiltonianCycle(
+            cells, cells, *spanning_tree(cells, cells, blocked, cycle.edges)
+        )
+
+    return op
+
+
+@benchmark("HamiltonianSolver tick", [80, 200])
+def bench_hamilton(cells: int) -> Callable[[], None]:
+    from engine import GameState
+    from hamilton import HamiltonianSolver
+
+    state = GameState(
+        width=cells * 10, height=cells * 10, seed=0, generate_wall_interval=1
+    )
+    solver = HamiltonianSolver()
+    solver.update(state)
+
+    # one decision and tick per operation, a new game when the last one ended
+    def op():
+        if state.done:
+            state.reset(state.seed + 1)
+        state.step(solver(state))
+
+    return op
+
+
+@benchmark("game_loop frame", ["full", "dirty", "palette"])
+def bench_frame(mode: str) -> Callable[[], None]:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+
+    from engine import GameState
+    from policies import greedy_policy
+    from render import RENDERERS
+    from utils import layout_info
+
+    pygame.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    renderer = RENDERERS[mode](screen)
+    state = GameState(seed=0)
+    games = [state]
+
+    # one tick and one frame per operation, a new game when the last one ended
+    def op():
+        state = games[0]
+        if state.done:
+            state = games[0] = GameState(seed=state.seed + 1)
+        state.step(greedy_policy(state))
+        overlays = layout_info(
+            screen.get_size(), state.score, state.time_played, place="upperright"
+        )
+        renderer.render(state, overlays)
+
+    return op
+
+
+@benchmark("render long snake", ["full", "dirty", "palette"])
+def bench_long_snake(mode: str) -> Callable[[], None]:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+
+    from engine import GameState
+    from render import RENDERERS
+    from snake import SnakeBodyBlock
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    renderer = RENDERERS[mode](screen)
+    state = GameState(seed=0, max_food_cnt=0, max_wall_cnt=0)
+    cols, rows, cell_size = state.grid.cols, state.grid.rows, state.cell_size
+
+    # a cycle through every cell: rows back and forth right of the first column,
+    # then up the first column
+    cycle = []
+    for row in range(rows):
+        row_cols = range(1, cols) if row % 2 == 0 else range(cols - 1, 0, -1)
+        cycle.extend((col * cell_size, row * cell_size) for col in row_cols)
+    cycle.extend((0, row * cell_size) for row in range(rows - 1, -1, -1))
+
+    length = min(3_000, len(cycle) - 1)
+    colors = [COLOR_LIST[i % len(COLOR_LIST)] for i in range(length)]
+    snake = state.snake
+    snake.reset(
+        [
+            SnakeBodyBlock(pos, color, cell_size, cell_size)
+            for pos, color in zip(cycle, colors)
+        ],
+        "RIGHT",
+    )
+    step = [length]
+
+    # one move of the snake along the cycle and one frame per operation
+    def op():
+        x, y = snake.get_head_pos()
+        next_x, next_y = cycle[step[0] % len(cycle)]
+        step[0] += 1
+        snake.set_direction(
+            "RIGHT"
+            if next_x > x
+            else "LEFT" if next_x < x else "DOWN" if next_y > y else "UP"
+        )
+        snake.move()
+        state.ticks += 1
+        renderer.render(state, [])
+
+    return op
+
+
+def time_case(
+    setup: Setup, param: Any, max_loops: Optional[int], min_time: float, repeat: int
+) -> float:
+    """Measure the operations per second of a case, best of several runs
+
+    Args:
+        setup (Setup): the setup of the case
+        param (Any): the parameter to run it with
+        max_loops (Optional[int]): most operations to run on one setup
+        min_time (float): least seconds of each run
+        repeat (int): number of runs
+
+    Returns:
+        float: operations per second of the fastest run
+    """
+    best = 0.0
+    for _ in range(repeat):
+        loops = 0
+        elapsed = 0.0
+        batch = 1
+        while elapsed < min_time:
+            if max_loops is not None:
+                batch = min(batch, max_loops)
+            op = setup(param)
+            gc.disable()
+            start = time.perf_counter()
+            for _ in range(batch):
+                op()
+            elapsed += time.perf_counter() - start
+            gc.enable()
+            loops += batch
+            batch *= 2
+        best = max(best, loops / elapsed)
+    return best
+
+
+def measure_memory(setup: Setup, param: Any, loops: int) -> int:
+    """Measure the peak memory allocated by the setup and some operations of a case
+
+    Args:
+        setup (Setup): the setup of the case
+        param (Any): the parameter to run it with
+        loops (int): number of operations to run
+
+    Returns:
+        int: peak of the traced allocations (bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+    op = setup(param)
+    for _ in range(loops):
+        op()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def entity_sizes(n: int = 10_000) -> Dict[str, float]:
+    """Measure the memory of a food, a wall, a snake body block and a snake block
+
+    Args:
+        n (int, optional): number of entities allocated per kind. Defaults to 10_000.
+
+    Returns:
+        Dict[str, float]: bytes allocated per entity, positions included
+    """
+    from food import Food
+    from snake import SnakeBodyBlock
+    from wall import Wall
+
+    def measure(make: Callable[[int], Any]) -> float:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        # positions spread over a large board, most coordinates are not cached ints
+        entities = [make(i) for i in range(n)]
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        # minus the list holding them
+        return (size - sys.getsizeof(entities)) / n
+
+    def pos(i: int) -> Position:
+        return (i % 1000 * 10, i // 1000 * 10)
+
+    sizes = {
+        "Food": measure(lambda i: Food(pos=pos(i), color=RED, score=10)),
+        "Wall": measure(lambda i: Wall("Horizontal", pos(i))),
+        "SnakeBodyBlock": measure(lambda i: SnakeBodyBlock(pos(i), RED, 10, 10)),
+    }
+
+    # a snake block only takes a slot in each ring of the snake
+    snake, _ = make_snake(10, 1)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(n):
+        snake.grow(color=RED)
+    sizes["Snake block"] = (tracemalloc.get_traced_memory()[0] - before) / n
+    tracemalloc.stop()
+    return sizes
+
+
+def run(
+    names: List[str], min_time: float, repeat: int, memory: bool
+) -> Dict[str, Dict[str, float]]:
+    """Run benchmark cases, printing each result as it completes
+
+    Args:
+        names (List[str]): names of the cases
+        min_time (float): least seconds of each timing run
+        repeat (int): number of timing runs per parameter
+        memory (bool): whether to measure the peak memory as well
+
+    Returns:
+        Dict[str, Dict[str, float]]: "ops" (per second) and "peak_kib" of every "name[param]"
+    """
+    results = {}
+    for name in names:
+        setup, params, max_loops = BENCHMARKS[name]
+        for param in params:
+            key = f"{name}[{param}]"
+            ops = time_case(setup, param, max_loops, min_time, repeat)
+            results[key] = {"ops": ops}
+            line = f"{key:<45} {ops:>14,.0f} ops/s"
+            if memory:
+                peak = measure_memory(setup, param, min(max_loops or 1_000, 1_000))
+                results[key]["peak_kib"] = peak / 1024
+                line += f" {peak / 1024:>12,.0f} KiB peak"
+            print(line, flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str) -> bool:
+    """Print the speed of every case against a stored baseline
+
+    Args:
+        results (Dict[str, Dict[str, float]]): the results of run
+        baseline_path (str): JSON file written by --save
+
+    Returns:
+        bool: False if a case got slower than the tolerance of the baseline
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    ok = True
+    tolerance = baseline.get("tolerance", 0.2)
+    print(f"\ncompared to {baseline_path} ({baseline.get('python', '?')}):")
+    for key, result in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:<45} {'new':>10}")
+            continue
+        ratio = result["ops"] / base["ops"]
+        slower = ratio < 1 - tolerance
+        ok &= not slower
+        print(f"{key:<45} {ratio:>9.2f}x{'  SLOWER' if slower else ''}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks, optionally saving them as or comparing them to a baseline
+
+    Args:
+        argv (Optional[List[str]], optional): arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the hot paths of the game, headless."
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        default="",
+        help="run only the cases whose name contains this text",
+    )
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per run")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per case, best kept"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the peak memory measurement"
+    )
+    parser.add_argument(
+        "--sizes", action="store_true", help="measure the bytes per entity as well"
+    )
+    parser.add_argument("--save", help="write the results to this baseline JSON file")
+    parser.add_argument(
+        "--baseline", help="compare the results to this baseline JSON file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="slowdown ratio tolerated by --baseline, stored by --save",
+    )
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run(names, args.min_time, args.repeat, not args.no_memory)
+
+    sizes = {}
+    if args.sizes:
+        sizes = entity_sizes()
+        for name, size in sizes.items():
+            print(f"{name:<45} {size:>14,.0f} bytes/entity")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "tolerance": args.tolerance,
+                    "results": results,
+                    "sizes": sizes,
+                },
+                f,
+                indent=2,
+            )
+    if args.baseline and not compare(results, args.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
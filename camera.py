@@ -0,0 +1,81 @@
+from typing import List, Tuple, Union, Literal
+
+from type_alias import *
+
+
+class Camera:
+    def __init__(
+        self, view_width: int, view_height: int, world_width: int, world_height: int
+    ):
+        """Viewport onto a board larger than the window
+
+        The camera keeps a target (the head of the snake) in the middle of the view,
+        clamped so the view never leaves the board. Positions are in board pixels,
+        the upper left corner of the view is drawn at (0, 0) of the screen.
+
+        Args:
+            view_width (int): width of the view (px)
+            view_height (int): height of the view (px)
+            world_width (int): width of the board (px)
+            world_height (int): height of the board (px)
+        """
+        self.view_width = view_width
+        self.view_height = view_height
+        self.world_width = world_width
+        self.world_height = world_height
+
+        # upper left corner of the view on the board
+        self.x = 0
+        self.y = 0
+
+    def follow(self, pos: Position, cell_size: int = 10) -> None:
+        """Center the view on a position, aligned to the cells
+
+        Args:
+            pos (Position): position to center on (px)
+            cell_size (int, optional): size of a cell (px). Defaults to 10.
+        """
+        x = pos[0] - self.view_width // 2
+        y = pos[1] - self.view_height // 2
+        x = min(max(x, 0), max(0, self.world_width - self.view_width))
+        y = min(max(y, 0), max(0, self.world_height - self.view_height))
+        self.x = x - x % cell_size
+        self.y = y - y % cell_size
+
+    def get_rect(self) -> Tuple[int, int, int, int]:
+        """Get the part of the board in view
+
+        Returns:
+            Tuple[int, int, int, int]: x, y, width and height of the view on the board (px)
+        """
+        return (self.x, self.y, self.view_width, self.view_height)
+
+    def is_visible(self, x: int, y: int, width: int, height: int) -> bool:
+        """Check if a rectangle of the board overlaps the view
+
+        Args:
+            x (int): left of the rectangle (px)
+            y (int): top of the rectangle (px)
+            width (int): width of the rectangle (px)
+            height (int): height of the rectangle (px)
+
+        Returns:
+            bool: True if any part of the rectangle is in view
+        """
+        return (
+            x < self.x + self.view_width
+            and x + width > self.x
+            and y < self.y + self.view_height
+            and y + height > self.y
+        )
+
+    def to_screen(self, pos: Position) -> Position:
+        """Convert a board position to a screen position
+
+        Args:
+            pos (Position): position on the board (px)
+
+        Returns:
+            Position: position on the screen (px)
+        """
+        return (pos[0] - self.x, pos[1] - self.y)
@@ -0,0 +1,45 @@
+# defines the default settings of the game
+
+from colors import *
+
+# set window size
+SCREEN_WIDTH, SCREEN_HEIGHT = 800, 800
+
+# size of a cell (px) and of the board (cells), the board may be larger than the
+# window, the view then follows the snake
+CELL_SIZE = 10
+GRID_COLS, GRID_ROWS = SCREEN_WIDTH // CELL_SIZE, SCREEN_HEIGHT // CELL_SIZE
+
+# initial speed
+INITIAL_SNAKE_SPEED = 10
+INITIAL_SNAKE_COLOR = WHITE
+
+# max food cnt, max wall cnt
+MAX_FOOD_CNT = 3
+MAX_WALL_CNT = 1
+
+GENERATE_WALL_INTERVAL = 10  # seconds
+
+# snakes on the board, 2 to play on one keyboard (arrow keys and WASD)
+PLAYERS = 1
+
+# let the computer steer the snake of the first player, see autopilot.Autopilot
+AUTOPILOT = False
+
+# frames per second of the rendering, independent from the speed of the snake
+RENDER_FPS = 60
+
+# "full": redraw and flip the whole window every frame
+# "dirty": redraw and upload only the regions that changed
+# "palette": keep one pixel per cell and scale it to the window in one blit
+# a board larger than the window is always drawn by the viewport renderer
+RENDER_MODE = "full"
+
+# directory to save a replay of every game to, None to not record games
+# (watch or verify them with `python replay.py`)
+REPLAY_DIR = None
+
+# time every phase of a frame and show p50/p99 per phase in the lower left corner
+PROFILE = False
+# CSV file to write the phase timings of every frame to when profiling
+PROFILE_DUMP = None
@@ -0,0 +1,164 @@
+from typing import (
+    List,
+    Tuple,
+    Union,
+    Literal,
+    Optional,
+    Dict,
+    Deque,
+    Callable,
+    Iterator,
+)
+import collections
+
+from engine import GameState, OPPOSITE_DIRECTION
+from type_alias import *
+
+# turns buffered per player between two ticks, further key presses are dropped
+QUEUE_SIZE = 3
+
+
+def keyboard_bindings(players: int = 1) -> Dict[int, Tuple[int, Direction]]:
+    """Map every key code to the player it steers and the direction it turns to
+
+    With one player the arrow keys, WASD and hjkl all steer the snake; with more
+    the first player keeps the arrow keys and hjkl and the second gets WASD.
+
+    Args:
+        players (int, optional): number of players on the keyboard. Defaults to 1.
+
+    Returns:
+        Dict[int, Tuple[int, Direction]]: player and direction of each key code
+    """
+    import pygame
+
+    wasd_player = 1 if players > 1 else 0
+    keys = {
+        "UP": [(pygame.K_UP, 0), ("k", 0), ("w", wasd_player)],
+        "DOWN": [(pygame.K_DOWN, 0), ("j", 0), ("s", wasd_player)],
+        "LEFT": [(pygame.K_LEFT, 0), ("h", 0), ("a", wasd_player)],
+        "RIGHT": [(pygame.K_RIGHT, 0), ("l", 0), ("d", wasd_player)],
+    }
+    bindings = {}
+    for direction, direction_keys in keys.items():
+        for key, player in direction_keys:
+            if isinstance(key, str):
+                bindings[ord(key)] = (player, direction)
+                bindings[ord(key.upper())] = (player, direction)
+            else:
+                bindings[key] = (player, direction)
+    return bindings
+
+
+class InputSource:
+    """Where the turns of a snake come from: keyboard, network, bot or replay"""
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        """Get the direction to turn to on the next tick
+
+        Args:
+            state (GameState): the game
+            player (int, optional): index of the snake in state.snakes. Defaults to 0.
+
+        Returns:
+            Optional[Direction]: the direction, None to keep going
+        """
+        return None
+
+
+class QueuedInput(InputSource):
+    def __init__(self, size: int = QUEUE_SIZE):
+        """Turns pushed between ticks and handed out one per tick
+
+        A quick UP-then-LEFT between two ticks turns on two consecutive ticks
+        instead of keeping only the last key. Turns that repeat the previous one or
+        reverse it are dropped when pushed, and checked again against the direction
+        of the snake when they are taken.
+
+        Args:
+            size (int, optional): most turns waiting, further ones are dropped. Defaults to QUEUE_SIZE.
+        """
+        self.queue: Deque[Direction] = collections.deque()
+        self.size = size
+
+    def push(self, direction: Direction) -> None:
+        """Buffer a turn
+
+        Args:
+            direction (Direction): the direction to turn to
+        """
+        queue = self.queue
+        if len(queue) >= self.size:
+            return
+        if queue and (
+            direction == queue[-1] or direction == OPPOSITE_DIRECTION[queue[-1]]
+        ):
+            return
+        queue.append(direction)
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        current = state.snakes[player].get_direction()
+        queue = self.queue
+        while queue:
+            direction = queue.popleft()
+            if direction != current and direction != OPPOSITE_DIRECTION[current]:
+                return direction
+        return None
+
+    def clear(self) -> None:
+        """Drop the buffered turns, e.g. when a new game starts"""
+        self.queue.clear()
+
+
+class KeyboardInput:
+    def __init__(self, players: int = 1, size: int = QUEUE_SIZE):
+        """Keyboard of one or more players, dispatching key presses to their queues
+
+        Args:
+            players (int, optional): number of players on the keyboard. Defaults to 1.
+            size (int, optional): turns buffered per player. Defaults to QUEUE_SIZE.
+        """
+        self.bindings = keyboard_bindings(players)
+        self.sources = [QueuedInput(size) for _ in range(players)]
+
+    def handle_key(self, key: int) -> bool:
+        """Buffer the turn of a pressed key
+
+        Args:
+            key (int): the key code of a KEYDOWN event
+
+        Returns:
+            bool: whether the key steers a snake
+        """
+        binding = self.bindings.get(key)
+        if binding is None:
+            return False
+        player, direction = binding
+        self.sources[player].push(direction)
+        return True
+
+
+class PolicyInput(InputSource):
+    def __init__(self, policy: Callable[[GameState], Optional[Direction]]):
+        """A bot steering the snake, see policies
+
+        Args:
+            policy (Callable[[GameState], Optional[Direction]]): picks the action of the next tick
+        """
+        self.policy = policy
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        return self.policy(state)
+
+
+class ReplayInput(InputSource):
+    def __init__(self, actions: Iterator[Optional[Direction]]):
+        """Recorded turns, e.g. replay.Replay.actions()
+
+        Args:
+            actions (Iterator[Optional[Direction]]): the action of every tick
+        """
+        self.actions = actions
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        return next(self.actions, None)
@@ -0,0 +1,308 @@
+from typing import List, Tuple, Union, Literal, Optional, Any
+import random
+
+from config import *
+from food import FoodController
+from grid import OccupancyGrid, SNAKE, FOOD, WALL
+from placement import FreeCellSampler, PlacementError
+from snake import Snake, SnakeBodyBlock
+from wall import WallController
+from type_alias import *
+
+# game over codes, see main.game_over
+COLLISION_BORDER = 0
+COLLISION_BODY = 1
+COLLISION_WALL = 2
+
+OPPOSITE_DIRECTION = {"UP": "DOWN", "DOWN": "UP", "LEFT": "RIGHT", "RIGHT": "LEFT"}
+
+
+class GameState:
+    def __init__(
+        self,
+        width: int = SCREEN_WIDTH,
+        height: int = SCREEN_HEIGHT,
+        max_food_cnt: int = MAX_FOOD_CNT,
+        max_wall_cnt: int = MAX_WALL_CNT,
+        generate_wall_interval: float = GENERATE_WALL_INTERVAL,
+        initial_snake_speed: float = INITIAL_SNAKE_SPEED,
+        initial_snake_color: Color = INITIAL_SNAKE_COLOR,
+        verbose: bool = False,
+        seed: Optional[int] = None,
+        cell_size: int = CELL_SIZE,
+    ):
+        """Render-free state of a single game, advanced one tick at a time by `step`.
+
+        Nothing on this path imports pygame, so games can be simulated headless
+        (bots, replay verification, load tests) as fast as the CPU allows.
+
+        Args:
+            width (int, optional): width of the board (px). Defaults to SCREEN_WIDTH.
+            height (int, optional): height of the board (px). Defaults to SCREEN_HEIGHT.
+            max_food_cnt (int, optional): number of food on the board. Defaults to MAX_FOOD_CNT.
+            max_wall_cnt (int, optional): number of walls at the start. Defaults to MAX_WALL_CNT.
+            generate_wall_interval (float, optional): seconds between new walls. Defaults to GENERATE_WALL_INTERVAL.
+            initial_snake_speed (float, optional): ticks per second at the start. Defaults to INITIAL_SNAKE_SPEED.
+            initial_snake_color (Color, optional): color of the initial snake. Defaults to INITIAL_SNAKE_COLOR.
+            verbose (bool, optional): whether the controllers log added food and walls. Defaults to False.
+            seed (Optional[int], optional): seed of the food and wall positions, the same seed and actions replay the same game. Defaults to None (a random seed).
+            cell_size (int, optional): size of a cell (px), the board has width // cell_size columns. Defaults to CELL_SIZE.
+        """
+        self.width = width
+        self.height = height
+        self.max_food_cnt = max_food_cnt
+        self.max_wall_cnt = max_wall_cnt
+        self.generate_wall_interval = generate_wall_interval
+        self.initial_snake_speed = initial_snake_speed
+        self.initial_snake_color = initial_snake_color
+        self.verbose = verbose
+        self.cell_size = cell_size
+
+        # records the direction changes when set, see replay.ReplayRecorder
+        self.recorder: Optional[Any] = None
+        # times the move, collision and spawn phases of step when set, see
+        # profiler.FrameProfiler
+        self.profiler: Optional[Any] = None
+
+        # built by the first reset, then reused by the next games
+        self.grid: Optional[OccupancyGrid] = None
+
+        self.reset(seed)
+
+    def reset(self, seed: Optional[int] = None) -> None:
+        """Start a new game: new snake, food and walls, zero score and time.
+
+        After the first game the grid, sampler, snakes and controllers are emptied
+        and refilled in place instead of being built again, so a restart allocates
+        next to nothing and listeners of the grid keep following the board.
+
+        Args:
+            seed (Optional[int], optional): seed of the new game. Defaults to None (a random seed).
+        """
+        # every game owns its generator, the global random module is never used
+        self.seed = random.getrandbits(64) if seed is None else seed
+
+        self.score = 0
+        self.ticks = 0
+        self.time_played = 0.0
+        self.game_over_code: Optional[int] = None
+
+        if self.grid is not None:
+            # the sampler and controllers share the generator, seeding it again
+            # draws the same sequence as a new generator with the seed
+            self.rng.seed(self.seed)
+            # snake, food and walls release their cells of the grid themselves,
+            # which gives the free cells back to the sampler
+            for snake, body in zip(self.snakes, self.spawn_bodies()):
+                snake.reset(body, "RIGHT")
+            self.food_controller.reset()
+            self.wall_controller.reset()
+            self.food_controller.generate(self.max_food_cnt)
+            self.wall_controller.generate(self.max_wall_cnt)
+            return
+
+        self.rng = random.Random(self.seed)
+
+        # snake, food and walls keep the grid up to date themselves
+        cell_size = self.cell_size
+        self.grid = OccupancyGrid(self.width, self.height, cell_size)
+        self.sampler = FreeCellSampler(self.grid, rng=self.rng)
+
+        # every snake on the board, the snake of the player first
+        self.snakes = [
+            Snake(body=body, direction="RIGHT", grid=self.grid)
+            for body in self.spawn_bodies()
+        ]
+        self.snake = self.snakes[0]
+
+        self.food_controller = FoodController(
+            width=self.width,
+            height=self.height,
+            food_list=[],
+            verbose=self.verbose,
+            grid=self.grid,
+            sampler=self.sampler,
+            rng=self.rng,
+            cell_size=cell_size,
+        )
+        self.food_controller.generate(self.max_food_cnt)
+
+        self.wall_controller = WallController(
+            walls=None,
+            width=self.width,
+            height=self.height,
+            verbose=self.verbose,
+            grid=self.grid,
+            sampler=self.sampler,
+            rng=self.rng,
+            cell_size=cell_size,
+        )
+        self.wall_controller.generate(self.max_wall_cnt)
+
+    def fork(self, seed: Optional[int] = None) -> "GameState":
+        """Get an independent copy of the game, e.g. for lookahead search.
+
+        Nothing that changes during a game is shared: the grid, the Fenwick tree
+        of the sampler and the rings of the snakes are copied as flat arrays, the
+        lists and indexes of the food and walls shallowly, and the copy gets its
+        own random generator. The food and walls themselves never change and are
+        shared. A fork takes microseconds whatever the length of the snakes. It
+        neither records, profiles nor logs.
+
+        Args:
+            seed (Optional[int], optional): seed of a new random stream for the copy. Defaults to None (the copy draws the same food and walls as the game would after the same actions).
+
+        Returns:
+            GameState: the copy, of the same class as the game
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.recorder = None
+        clone.profiler = None
+        clone.verbose = False
+
+        if seed is None:
+            clone.rng = random.Random.__new__(random.Random)
+            clone.rng.setstate(self.rng.getstate())
+        else:
+            clone.seed = seed
+            clone.rng = random.Random(seed)
+
+        clone.grid = self.grid.copy()
+        clone.sampler = self.sampler.copy(clone.grid, clone.rng)
+        clone.snakes = [snake.copy(clone.grid) for snake in self.snakes]
+        clone.snake = clone.snakes[0]
+        clone.food_controller = self.food_controller.copy(
+            clone.grid, clone.sampler, clone.rng
+        )
+        clone.food_controller.verbose = False
+        clone.wall_controller = self.wall_controller.copy(
+            clone.grid, clone.sampler, clone.rng
+        )
+        clone.wall_controller.verbose = False
+        return clone
+
+    def spawn_bodies(self) -> List[List[SnakeBodyBlock]]:
+        """Get the bodies of the snakes at the start of a game, all heading right
+
+        Returns:
+            List[List[SnakeBodyBlock]]: a body of two blocks ending at the center cell
+        """
+        cell_size = self.cell_size
+        center_x = self.grid.cols // 2 * cell_size
+        center_y = self.grid.rows // 2 * cell_size
+        return [
+            [
+                SnakeBodyBlock(
+                    pos=(center_x - cell_size, center_y - cell_size),
+                    color=self.initial_snake_color,
+                    width=cell_size,
+                    height=cell_size,
+                ),
+                SnakeBodyBlock(
+                    pos=(center_x, center_y - cell_size),
+                    color=self.initial_snake_color,
+                    width=cell_size,
+                    height=cell_size,
+                ),
+            ]
+        ]
+
+    @property
+    def done(self) -> bool:
+        """Whether the game is over."""
+        return self.game_over_code is not None
+
+    @property
+    def snake_speed(self) -> float:
+        """Current speed of the snake in ticks per second, growing with time played."""
+        return self.initial_snake_speed + 2 / 60 * max(0, self.time_played - 1)
+
+    def step(
+        self, action: Optional[Direction] = None, dt: Optional[float] = None
+    ) -> Tuple[int, bool]:
+        """Advance the game by one tick.
+
+        Args:
+            action (Optional[Direction], optional): direction to turn to, ignored if it reverses the snake. Defaults to None (keep going).
+            dt (Optional[float], optional): seconds elapsed since the last tick. Defaults to None (one tick at the current snake speed).
+
+        Returns:
+            Tuple[int, bool]: score gained in this tick, whether the game is over
+        """
+        if self.done:
+            return 0, True
+
+        snake = self.snake
+        food_controller = self.food_controller
+
+        current_snake_direction = snake.get_direction()
+        if (
+            action is not None
+            and action != current_snake_direction
+            and action != OPPOSITE_DIRECTION[current_snake_direction]
+        ):
+            snake.set_direction(action)
+            if self.recorder is not None:
+                self.recorder.record_turn(self.ticks, action)
+
+        grid = self.grid
+
+        reward = 0
+        snake_head_pos = snake.get_head_pos()
+        if grid.count(FOOD, snake_head_pos):
+            eaten_food = food_controller.get_at_pos(pos=snake_head_pos)[0]
+
+            reward = eaten_food.get_score()
+            self.score += reward
+            snake.grow(color=eaten_food.color)
+
+            food_controller.remove_food(eaten_food)
+        else:
+            snake.move()
+
+        self.ticks += 1
+        self.time_played += 1 / self.snake_speed if dt is None else dt
+        if self.profiler is not None:
+            self.profiler.mark("move")
+
+        # Game Over conditions
+        snake_head_pos = snake.get_head_pos()
+        if not (
+            0 <= snake_head_pos[0] <= self.width - self.cell_size
+            and 0 <= snake_head_pos[1] <= self.height - self.cell_size
+        ):
+            self.game_over_code = COLLISION_BORDER
+        elif grid.count(SNAKE, snake_head_pos) > 1:
+            # the head itself is one of the snake cells
+            self.game_over_code = COLLISION_BODY
+        elif grid.count(WALL, snake_head_pos):
+            self.game_over_code = COLLISION_WALL
+        if self.profiler is not None:
+            self.profiler.mark("collision")
+
+        if not self.done:
+            # respawn the eaten food only once the snake survived the tick,
+            # a dead snake may overlap itself and leave no valid position
+            self.refill()
+            if self.profiler is not None:
+                self.profiler.mark("spawn")
+
+        return reward, self.done
+
+    def refill(self) -> None:
+        """Respawn the eaten food and add a wall per generate_wall_interval
+
+        Food or walls that find no place come back on a later tick, once cells are freed.
+        """
+        food_controller = self.food_controller
+        wall_controller = self.wall_controller
+        try:
+            if food_controller.count() < self.max_food_cnt:
+                food_controller.generate(self.max_food_cnt - food_controller.count())
+
+            # generate a new wall per generate_wall_interval
+            if self.time_played / self.generate_wall_interval > wall_controller.count():
+                wall_controller.generate(1)
+        except PlacementError:
+            pass
@@ -0,0 +1,54 @@
+from typing import List, Tuple, Union, Literal, Dict
+import functools
+import pygame
+
+from colors import *
+from type_alias import *
+
+DEFAULT_FONT = "times new roman"
+
+# fonts already looked up, SysFont is slow (especially in the web build)
+_fonts: Dict[Tuple[str, int], pygame.font.Font] = {}
+
+
+def get_font(size: int, name: str = DEFAULT_FONT) -> pygame.font.Font:
+    """Get a system font, looking it up only the first time it is requested
+
+    Args:
+        size (int): size of the font
+        name (str, optional): name of the font. Defaults to DEFAULT_FONT.
+
+    Returns:
+        pygame.font.Font: the font
+    """
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = pygame.font.SysFont(name, size)
+    return font
+
+
+@functools.lru_cache(maxsize=128)
+def render_text(
+    text: str, size: int, color: Color = WHITE, name: str = DEFAULT_FONT
+) -> pygame.Surface:
+    """Render a line of text, reusing the surface if the same text was rendered recently
+
+    The returned surface is shared, it must not be drawn on.
+
+    Args:
+        text (str): the text to render
+        size (int): size of the font
+        color (Color, optional): color of the text. Defaults to WHITE.
+        name (str, optional): name of the font. Defaults to DEFAULT_FONT.
+
+    Returns:
+        pygame.Surface: the rendered text
+    """
+    return get_font(size, name).render(text, True, color)
+
+
+def clear_cache() -> None:
+    """Forget every font and rendered text, e.g. after pygame.quit()"""
+    _fonts.clear()
+    render_text.cache_clear()
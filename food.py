@@ -1,14 +1,21 @@
-from typing import List, Tuple, Union, Literal
-import pygame
-import itertools
+from typing import List, Tuple, Union, Literal, Optional, TYPE_CHECKING
+import random
 
 from base_class import Block, Controller
-from utils import generate_position, check
+from grid import OccupancyGrid, FOOD
+from placement import FreeCellSampler, PlacementError, MAX_PLACEMENT_ATTEMPTS
+from spatial import ChunkIndex
+from utils import generate_position
 from colors import *
 from type_alias import *
 
+if TYPE_CHECKING:
+    import pygame
+
 
 class Food(Block):
+    __slots__ = ("score",)
+
     def __init__(
         self,
         pos: Position = None,
@@ -45,12 +52,14 @@ class Food(Block):
         """
         return self.score
 
-    def draw(self: "Food", screen: pygame.Surface):
+    def draw(self: "Food", screen: "pygame.Surface"):
         """Draw the food instance on the screen.
 
         Args:
             screen (pygame.Surface): The surface to draw the food on.
         """
+        import pygame
+
         pygame.draw.rect(
             screen,
             self.color,
@@ -68,6 +77,11 @@ class FoodController(Controller):
         color_list: List[Color] = [WHITE, YELLOW, RED, ORANGE, BLUE, GREEN],
         score_list: List[int] = [10, 20, 30, 40, 50, 60],
         food_list: List[Food] = [],
+        verbose: bool = True,
+        grid: Optional[OccupancyGrid] = None,
+        sampler: Optional[FreeCellSampler] = None,
+        rng: Optional[random.Random] = None,
+        cell_size: int = 10,
     ):
         """FoodController class to manage all the food in the game
 
@@ -77,12 +91,26 @@ class FoodController(Controller):
             color_list (List[Color], optional): the list of colors to choose from. Defaults to [WHITE, YELLOW, RED, ORANGE, BLUE, GREEN].
             score_list (List[int], optional): the list of scores for each type of food. Defaults to [10, 20, 30, 40, 50, 60].
             food_list (List[Food], optional): exisiting food list. Defaults to [].
+            verbose (bool, optional): whether to log every added food. Defaults to True.
+            grid (Optional[OccupancyGrid], optional): occupancy grid to keep up to date. Defaults to None.
+            sampler (Optional[FreeCellSampler], optional): draws free cells of the grid for new food, instead of rejection sampling. Defaults to None.
+            rng (Optional[random.Random], optional): random generator of the food positions, when there is no sampler. Defaults to None (the global random module).
+            cell_size (int, optional): size of a cell and of the food (px). Defaults to 10.
         """
         self.width = width
         self.height = height
-
-        self.colors = self.__repeatable_generator(color_list)
-        self.scores = self.__repeatable_generator(score_list)
+        self.verbose = verbose
+        self.grid = grid
+        self.sampler = sampler
+        self.rng = random if rng is None else rng
+        self.cell_size = cell_size
+
+        self.color_list = color_list
+        self.score_list = score_list
+        # position of the next color and score in their lists, plain counters
+        # rather than generators so the controller can be copied
+        self.color_pos = 0
+        self.score_pos = 0
         self.foods = food_list
 
         self.color = self.__next_color()
@@ -90,18 +118,65 @@ class FoodController(Controller):
 
         self.food_cnt = len(self.foods)
 
-    def __repeatable_generator(self, iterable: List):
-        """A generator that repeats the elements of an iterable indefinitely.
+        # slot of every food in the list by its id, so a food is found and
+        # swap-removed without scanning the list
+        self.slots = {id(food): slot for slot, food in enumerate(self.foods)}
+
+        # food by position, for lookups and culling without scanning every food
+        self.index = ChunkIndex(cell_size)
+        for food in self.foods:
+            self.index.add(food, [food.get_pos()])
+
+        if self.grid is not None:
+            for food in self.foods:
+                self.grid.add(FOOD, food.get_pos())
+
+    def reset(self) -> None:
+        """Remove all the food instances and restart the colors and scores, e.g. for a new game.
+
+        The food list and the index are emptied in place instead of being replaced.
+        """
+        if self.grid is not None:
+            for food in self.foods:
+                self.grid.remove(FOOD, food.get_pos())
+        self.foods.clear()
+        self.slots.clear()
+        self.food_cnt = 0
+        self.index.clear()
+
+        self.color_pos = 0
+        self.score_pos = 0
+        self.color = self.__next_color()
+        self.score = self.__next_score()
+
+    def copy(
+        self,
+        grid: Optional[OccupancyGrid] = None,
+        sampler: Optional[FreeCellSampler] = None,
+        rng: Optional[random.Random] = None,
+    ) -> "FoodController":
+        """Get an independent copy of the controller, e.g. for a fork of the game.
+
+        The food instances are never modified, so the copy shares them.
 
         Args:
-            iterable (List): The iterable to repeat.
+            grid (Optional[OccupancyGrid], optional): the copy of the grid, which already holds the food. Defaults to None.
+            sampler (Optional[FreeCellSampler], optional): the sampler of the copy of the grid. Defaults to None.
+            rng (Optional[random.Random], optional): random generator of the copy. Defaults to None (the generator of this controller).
 
-        Yields:
-            Any: The next element from the iterable.
+        Returns:
+            FoodController: the copy
         """
-        cycle_iterator = itertools.cycle(iterable)
-        while True:
-            yield next(cycle_iterator)
+        controller = FoodController.__new__(FoodController)
+        controller.__dict__.update(self.__dict__)
+        controller.foods = list(self.foods)
+        controller.slots = dict(self.slots)
+        controller.index = self.index.copy()
+        controller.grid = grid
+        controller.sampler = sampler
+        if rng is not None:
+            controller.rng = rng
+        return controller
 
     def add(self, food: Food) -> None:
         """Add a food instance to the food list.
@@ -109,42 +184,64 @@ class FoodController(Controller):
         Args:
             food (Food): The food instance to add.
         """
+        self.slots[id(food)] = len(self.foods)
         self.foods.append(food)
         self.food_cnt += 1
-        print(f"Food added at {food.get_pos()}")
+        self.index.add(food, [food.get_pos()])
+        if self.grid is not None:
+            self.grid.add(FOOD, food.get_pos())
+        if self.verbose:
+            print(f"Food added at {food.get_pos()}")
 
     def generate(self, n: int = 1, *lists) -> Union[Food, List[Food]]:
         """Generate new food instances.
 
         Args:
             n (int, optional): The number of food instances to generate. Defaults to 1.
-            *lists: Variable number of lists.
+            *lists: Variable number of lists of positions the food must not overlap.
+
+        Raises:
+            PlacementError: if a sampler is used and the food could not be placed, BoardFullError if no cell is free
 
         Returns:
             Union[Food, List[Food]]: The generated food instance(s).
         """
+        # the existing food is occupied as well, so two food never share a cell
+        occupied = set(self.get_pos())
+        for lst in lists:
+            occupied.update(lst)
+
         temp_food_list = []
         cnt = 1
+        attempts = 0
         while cnt <= n:
-            position = generate_position(self.width, self.height)
-
-            if (
-                check(
-                    position,
-                    lists[0],
+            if self.sampler is not None:
+                if attempts == MAX_PLACEMENT_ATTEMPTS:
+                    raise PlacementError(
+                        f"No place found for new food in {MAX_PLACEMENT_ATTEMPTS} draws"
+                    )
+                attempts += 1
+                position = self.sampler.sample()
+            else:
+                position = generate_position(
+                    self.width, self.height, rng=self.rng, cell_size=self.cell_size
                 )
-                == False
+
+            if position not in occupied and not (
+                self.grid is not None and self.grid.is_taken(position)
             ):
                 new_food = Food(
                     pos=position,
                     color=self.color,
                     score=self.score,
-                    width=10,
-                    height=10,
+                    width=self.cell_size,
+                    height=self.cell_size,
                 )
                 self.add(new_food)
                 temp_food_list.append(new_food)
+                occupied.add(position)
                 cnt += 1
+                attempts = 0
                 self.update()
 
         return temp_food_list
@@ -169,7 +266,8 @@ class FoodController(Controller):
         Returns:
             Color: The next color.
         """
-        self.color = next(self.colors)
+        self.color = self.color_list[self.color_pos % len(self.color_list)]
+        self.color_pos += 1
         return self.color
 
     def __next_score(self) -> int:
@@ -178,7 +276,8 @@ class FoodController(Controller):
         Returns:
             int: The next score.
         """
-        self.score = next(self.scores)
+        self.score = self.score_list[self.score_pos % len(self.score_list)]
+        self.score_pos += 1
         return self.score
 
     def update(self) -> Tuple[Color, int]:
@@ -228,13 +327,32 @@ class FoodController(Controller):
     def remove(self, idx: int) -> None:
         """Remove the food instance at the specified index.
 
+        The last food instance takes its place, so the order of the list changes.
+
         Args:
             idx (int): The index of the food instance to remove.
         """
-        self.foods.pop(idx)
+        self.remove_food(self.foods[idx])
+
+    def remove_food(self, food: Food) -> None:
+        """Remove a food instance, in constant time whatever the number of food.
+
+        The last food instance takes its place, so the order of the list changes.
+
+        Args:
+            food (Food): The food instance to remove.
+        """
+        slot = self.slots.pop(id(food))
+        last = self.foods.pop()
+        if last is not food:
+            self.foods[slot] = last
+            self.slots[id(last)] = slot
         self.food_cnt -= 1
+        self.index.remove(food, [food.get_pos()])
+        if self.grid is not None:
+            self.grid.remove(FOOD, food.get_pos())
 
-    def draw(self: "FoodController", screen: pygame.Surface):
+    def draw(self: "FoodController", screen: "pygame.Surface"):
         """Draw all the food instances on the screen.
 
         Args:
@@ -252,8 +370,32 @@ class FoodController(Controller):
         Returns:
             Union[int, None]: The index of the food instance at the specified position, or None if not found.
         """
-        for idx in range(len(self.foods)):
-            if self.foods[idx].get_pos() == pos:
-                return idx
+        foods = self.index.at(pos)
+        if not foods:
+            return None
+        return self.slots[id(foods[0])]
+
+    def get_at_pos(self, pos: Position) -> List[Food]:
+        """Get the food instances at the specified position, without looking up their index.
 
-        return None
+        Args:
+            pos (Position): The position to check.
+
+        Returns:
+            List[Food]: The food instances at the position, possibly empty.
+        """
+        return self.index.at(pos)
+
+    def get_in_rect(self, x: int, y: int, width: int, height: int) -> List[Food]:
+        """Get the food instances near a region, e.g. to draw only the visible ones.
+
+        Args:
+            x (int): left of the region (px)
+            y (int): top of the region (px)
+            width (int): width of the region (px)
+            height (int): height of the region (px)
+
+        Returns:
+            List[Food]: the food instances in the chunks the region overlaps, including some just outside it.
+        """
+        return self.index.query(x, y, width, height)
@@ -0,0 +1,151 @@
+from typing import List, Tuple, Union, Literal, Callable
+
+from type_alias import *
+
+# layers of the occupancy grid
+SNAKE = 0
+FOOD = 1
+WALL = 2
+
+
+class OccupancyGrid:
+    def __init__(self, width: int, height: int, cell_size: int = 10):
+        """Persistent map of which cells are taken by the snake, food and walls
+
+        Every layer is a bytearray with one counter per cell, kept up to date by
+        the snake and the controllers, so a collision test is a single lookup.
+        Counters (instead of flags) allow overlaps, e.g. the snake head entering
+        its own body, to be detected and undone correctly.
+
+        Listeners are called with (index, taken) whenever a cell switches between
+        free and taken, so other indexes can follow the board incrementally.
+
+        Args:
+            width (int): width of the board (px)
+            height (int): height of the board (px)
+            cell_size (int, optional): size of a cell (px). Defaults to 10.
+        """
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+
+        self.cols = width // cell_size
+        self.rows = height // cell_size
+
+        self.layers = [bytearray(self.cols * self.rows) for _ in (SNAKE, FOOD, WALL)]
+
+        # number of entities of any layer in each cell
+        self.taken = bytearray(self.cols * self.rows)
+        self.free_cnt = self.cols * self.rows
+
+        self.listeners: List[Callable[[int, bool], None]] = []
+
+    def index(self, pos: Position) -> int:
+        """Get the index of the cell at a position
+
+        Args:
+            pos (Position): position (px)
+
+        Returns:
+            int: index of the cell, -1 if the position is outside the board
+        """
+        col = pos[0] // self.cell_size
+        row = pos[1] // self.cell_size
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return -1
+
+    def add(self, layer: int, pos: Position) -> None:
+        """Mark a position as taken in a layer, positions outside the board are ignored
+
+        Args:
+            layer (int): SNAKE, FOOD or WALL
+            pos (Position): position (px)
+        """
+        idx = self.index(pos)
+        if idx >= 0:
+            self.layers[layer][idx] += 1
+            if not self.taken[idx]:
+                self.free_cnt -= 1
+                for listener in self.listeners:
+                    listener(idx, True)
+            self.taken[idx] += 1
+
+    def remove(self, layer: int, pos: Position) -> None:
+        """Release a position taken in a layer, positions outside the board are ignored
+
+        Args:
+            layer (int): SNAKE, FOOD or WALL
+            pos (Position): position (px)
+        """
+        idx = self.index(pos)
+        if idx >= 0 and self.layers[layer][idx]:
+            self.layers[layer][idx] -= 1
+            self.taken[idx] -= 1
+            if not self.taken[idx]:
+                self.free_cnt += 1
+                for listener in self.listeners:
+                    listener(idx, False)
+
+    def count(self, layer: int, pos: Position) -> int:
+        """Get how many times a position is taken in a layer
+
+        Args:
+            layer (int): SNAKE, FOOD or WALL
+            pos (Position): position (px)
+
+        Returns:
+            int: number of entities of the layer at the position, 0 outside the board
+        """
+        idx = self.index(pos)
+        return self.layers[layer][idx] if idx >= 0 else 0
+
+    def is_taken(self, pos: Position) -> bool:
+        """Check if a position is taken in any layer
+
+        Args:
+            pos (Position): position (px)
+
+        Returns:
+            bool: True if the snake, a food or a wall occupies the position, False outside the board
+        """
+        idx = self.index(pos)
+        return idx >= 0 and self.taken[idx] > 0
+
+    def position(self, idx: int) -> Position:
+        """Get the position of a cell, the inverse of index
+
+        Args:
+            idx (int): index of the cell
+
+        Returns:
+            Position: position of the cell's upper left corner (px)
+        """
+        row, col = divmod(idx, self.cols)
+        return (col * self.cell_size, row * self.cell_size)
+
+    def copy(self) -> "OccupancyGrid":
+        """Get an independent copy of the grid, without the listeners
+
+        Returns:
+            OccupancyGrid: the copy, its layers are flat copies of the bytearrays
+        """
+        grid = OccupancyGrid.__new__(OccupancyGrid)
+        grid.__dict__.update(self.__dict__)
+        grid.layers = [layer[:] for layer in self.layers]
+        grid.taken = self.taken[:]
+        grid.listeners = []
+        return grid
+
+    def clear(self) -> None:
+        """Release every cell of every layer"""
+        for layer in self.layers:
+            layer[:] = bytes(len(layer))
+
+        if self.listeners:
+            for idx in range(len(self.taken)):
+                if self.taken[idx]:
+                    for listener in self.listeners:
+                        listener(idx, False)
+        self.taken[:] = bytes(len(self.taken))
+        self.free_cnt = self.cols * self.rows
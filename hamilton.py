@@ -0,0 +1,623 @@
+from typing import List, Tuple, Union, Literal, Optional, FrozenSet, Callable
+from array import array
+import collections
+
+from controls import InputSource
+from engine import GameState
+from grid import OccupancyGrid, FOOD, WALL
+from snake import Snake
+from wall import Wall
+from type_alias import *
+
+# tree edges of a block, one bit per side
+EDGE_LEFT = 1
+EDGE_DOWN = 2
+EDGE_RIGHT = 4
+EDGE_UP = 8
+
+# cycles kept for the (board size, wall layout) seen last
+CYCLE_CACHE_SIZE = 32
+
+# shortcuts stop once the snake covers this part of its cycle
+SHORTCUT_MAX_FILL = 0.5
+
+# cells kept between the head and the tail after a shortcut, on top of one per food
+SHORTCUT_BUFFER = 2
+
+# most cells out of the cycle searched for a detour to food out of the cycle
+DETOUR_SEARCH_CELLS = 64
+
+
+class HamiltonianCycle:
+    def __init__(self, cols: int, rows: int, edges: bytes, kept: bytes):
+        """Closed paths visiting every cell of a board once, built around a spanning tree
+
+        The board is split in blocks of 2x2 cells. The path goes around the tree
+        keeping it on its left, which visits the 4 cells of every block of the
+        tree once. A block holding a wall cell is left out of the tree, with all
+        its cells, and so are the last column and row of a board of odd size. A
+        tree per part of the board the walls cut off gives a loop per part.
+
+        Args:
+            cols (int): number of columns of the board
+            rows (int): number of rows of the board
+            edges (bytes): EDGE_* bits of every block, see spanning_tree
+            kept (bytes): whether every block is part of a tree, see spanning_tree
+        """
+        self.cols = cols
+        self.rows = rows
+        self.edges = edges
+
+        size = cols * rows
+        # next cell of every cell, and where the cell is on which loop, -1 if on none
+        self.succ = array("i", [-1]) * size
+        self.order = array("i", [-1]) * size
+        self.loop = array("i", [-1]) * size
+        self.loop_len: List[int] = []
+
+        block_cols = cols // 2
+        for block, bits in enumerate(edges):
+            if not kept[block]:
+                continue
+            by, bx = divmod(block, block_cols)
+            top_left = 2 * by * cols + 2 * bx
+            self.succ[top_left] = top_left - 1 if bits & EDGE_LEFT else top_left + cols
+            bottom_left = top_left + cols
+            self.succ[bottom_left] = (
+                bottom_left + cols if bits & EDGE_DOWN else bottom_left + 1
+            )
+            bottom_right = bottom_left + 1
+            self.succ[bottom_right] = (
+                bottom_right + 1 if bits & EDGE_RIGHT else bottom_right - cols
+            )
+            top_right = top_left + 1
+            self.succ[top_right] = top_right - cols if bits & EDGE_UP else top_left
+
+        succ, order, loop = self.succ, self.order, self.loop
+        for start in range(size):
+            if succ[start] < 0 or loop[start] >= 0:
+                continue
+            loop_id = len(self.loop_len)
+            idx, n = start, 0
+            while loop[idx] < 0:
+                loop[idx] = loop_id
+                order[idx] = n
+                n += 1
+                idx = succ[idx]
+            self.loop_len.append(n)
+
+    def distance(self, src: int, dst: int) -> int:
+        """Get the number of steps along the loop from a cell to another
+
+        Args:
+            src (int): the cell to start from
+            dst (int): the cell to reach
+
+        Returns:
+            int: the steps, -1 if the cells are not on the same loop
+        """
+        loop = self.loop[src]
+        if loop < 0 or loop != self.loop[dst]:
+            return -1
+        return (self.order[dst] - self.order[src]) % self.loop_len[loop]
+
+
+def blocked_blocks(grid: OccupancyGrid) -> FrozenSet[int]:
+    """Get the blocks of 2x2 cells a wall covers a cell of
+
+    Args:
+        grid (OccupancyGrid): occupancy grid of the board
+
+    Returns:
+        FrozenSet[int]: index of the blocks, row by row
+    """
+    cols = grid.cols
+    block_cols, block_rows = cols // 2, grid.rows // 2
+    walls = grid.layers[WALL]
+    blocked = set()
+    for idx in range(len(walls)):
+        if walls[idx]:
+            row, col = divmod(idx, cols)
+            if col < 2 * block_cols and row < 2 * block_rows:
+                blocked.add(row // 2 * block_cols + col // 2)
+    return frozenset(blocked)
+
+
+def spanning_tree(
+    cols: int,
+    rows: int,
+    blocked: FrozenSet[int],
+    prev: Optional[bytes] = None,
+) -> Tuple[bytes, bytes]:
+    """Connect the free blocks of a board with trees, keeping the edges of a previous tree
+
+    The edges of prev touching a blocked block are dropped, then the parts left
+    are joined again by the first edges found row by row, so the tree and its
+    cycle only change around the new walls.
+
+    Args:
+        cols (int): number of columns of the board
+        rows (int): number of rows of the board
+        blocked (FrozenSet[int]): the blocks left out
+        prev (Optional[bytes], optional): EDGE_* bits of every block of the previous tree. Defaults to None.
+
+    Returns:
+        Tuple[bytes, bytes]: EDGE_* bits and whether it is in a tree, of every block
+    """
+    block_cols, block_rows = cols // 2, rows // 2
+    size = block_cols * block_rows
+    edges = bytearray(size) if prev is None else bytearray(prev)
+    kept = bytearray(1 for _ in range(size))
+
+    for block in blocked:
+        kept[block] = 0
+        bits = edges[block]
+        edges[block] = 0
+        if bits & EDGE_LEFT:
+            edges[block - 1] &= ~EDGE_RIGHT
+        if bits & EDGE_RIGHT:
+            edges[block + 1] &= ~EDGE_LEFT
+        if bits & EDGE_UP:
+            edges[block - block_cols] &= ~EDGE_DOWN
+        if bits & EDGE_DOWN:
+            edges[block + block_cols] &= ~EDGE_UP
+
+    # union-find of the blocks, by the edges kept
+    root = list(range(size))
+
+    def find(block: int) -> int:
+        while root[block] != block:
+            root[block] = root[root[block]]
+            block = root[block]
+        return block
+
+    for block in range(size):
+        if edges[block] & EDGE_RIGHT:
+            root[find(block)] = find(block + 1)
+        if edges[block] & EDGE_DOWN:
+            root[find(block)] = find(block + block_cols)
+
+    for block in range(size):
+        if not kept[block]:
+            continue
+        bx = block % block_cols
+        if bx < block_cols - 1 and kept[block + 1]:
+            a, b = find(block), find(block + 1)
+            if a != b:
+                root[a] = b
+                edges[block] |= EDGE_RIGHT
+                edges[block + 1] |= EDGE_LEFT
+        if block + block_cols < size and kept[block + block_cols]:
+            a, b = find(block), find(block + block_cols)
+            if a != b:
+                root[a] = b
+                edges[block] |= EDGE_DOWN
+                edges[block + block_cols] |= EDGE_UP
+
+    return bytes(edges), bytes(kept)
+
+
+# cycles by (columns, rows, blocked blocks), least recently used first
+CYCLE_CACHE: (
+    "collections.OrderedDict[Tuple[int, int, FrozenSet[int]], HamiltonianCycle]"
+) = collections.OrderedDict()
+
+
+def get_cycle(
+    cols: int,
+    rows: int,
+    blocked: FrozenSet[int],
+    prev: Optional[HamiltonianCycle] = None,
+) -> HamiltonianCycle:
+    """Get the cycle of a wall layout, from the cache or repaired from a previous cycle
+
+    Args:
+        cols (int): number of columns of the board
+        rows (int): number of rows of the board
+        blocked (FrozenSet[int]): the blocks a wall covers a cell of
+        prev (Optional[HamiltonianCycle], optional): cycle before the last walls. Defaults to None.
+
+    Returns:
+        HamiltonianCycle: the cycle, shared, must not be modified
+    """
+    key = (cols, rows, blocked)
+    cycle = CYCLE_CACHE.get(key)
+    if cycle is not None:
+        CYCLE_CACHE.move_to_end(key)
+        return cycle
+
+    edges, kept = spanning_tree(
+        cols, rows, blocked, prev.edges if prev is not None else None
+    )
+    cycle = HamiltonianCycle(cols, rows, edges, kept)
+
+    CYCLE_CACHE[key] = cycle
+    if len(CYCLE_CACHE) > CYCLE_CACHE_SIZE:
+        CYCLE_CACHE.popitem(last=False)
+    return cycle
+
+
+class HamiltonianSolver(InputSource):
+    def __init__(self, shortcuts: bool = True):
+        """Computer player following a Hamiltonian cycle of the board, which never dies
+
+        The snake lies along the cycle, tail to head, and follows it, so it never
+        meets its body. While it is short it may cut ahead along the cycle towards
+        the nearest food, only if the cut keeps its head behind its tail along the
+        cycle with SHORTCUT_BUFFER cells plus one per food in between, as each food
+        eaten on the way lets the head catch up with the tail by one cell.
+
+        A new wall repairs the cycle around it (see spanning_tree). The body may
+        then lie across the new cycle, so the snake only follows the cycle where
+        every cell of the body ahead is gone when the head gets there, else it
+        chases its tail, until its body lies along the cycle again. A wall may
+        also cut the snake off in a part of the board smaller than its body,
+        which no move can get out of.
+
+        Food on cells left out of the cycle (next to walls) is eaten on detours
+        out of the cycle and back, bounded like the shortcuts.
+
+        The solver is also a policy, see policies.POLICIES.
+
+        Args:
+            shortcuts (bool, optional): whether to cut ahead towards the food. Defaults to True.
+        """
+        self.shortcuts = shortcuts
+
+        self.grid: Optional[OccupancyGrid] = None
+        self.cycle: Optional[HamiltonianCycle] = None
+        self.blocked: FrozenSet[int] = frozenset()
+        self.walls: List[Wall] = []
+        # whether the body lies along the cycle, from the tail to the head, and
+        # the number of its cells out of the cycle then, left by detours
+        self.aligned = False
+        self.off_loop = 0
+        # next cells of a detour through food out of the cycle, back onto the cycle
+        self.detour: List[int] = []
+
+    def __call__(self, state: GameState) -> Optional[Direction]:
+        """Steer the snake of the player, as a policy"""
+        return self.next_action(state)
+
+    def update(self, state: GameState) -> None:
+        """Get the cycle of the walls of the game, repairing it when walls were added
+
+        Args:
+            state (GameState): the game
+        """
+        grid = state.grid
+        walls = state.wall_controller.walls
+        known = len(self.walls)
+        if (
+            grid is not self.grid
+            or len(walls) < known
+            or any(walls[i] is not self.walls[i] for i in range(known))
+        ):
+            # another game, a reset or a removed wall
+            self.grid = grid
+            self.walls = list(walls)
+            self.blocked = blocked_blocks(grid)
+            self.cycle = get_cycle(grid.cols, grid.rows, self.blocked)
+            self.aligned = False
+            self.detour = []
+            return
+        if len(walls) == known:
+            return
+
+        cols = grid.cols
+        block_cols, block_rows = cols // 2, grid.rows // 2
+        blocked = set(self.blocked)
+        for wall in walls[known:]:
+            self.walls.append(wall)
+            for pos in wall.get_collision_detect_pos():
+                idx = grid.index(pos)
+                row, col = divmod(idx, cols)
+                if idx >= 0 and col < 2 * block_cols and row < 2 * block_rows:
+                    blocked.add(row // 2 * block_cols + col // 2)
+        if len(blocked) != len(self.blocked):
+            self.blocked = frozenset(blocked)
+            self.cycle = get_cycle(grid.cols, grid.rows, self.blocked, self.cycle)
+            self.aligned = False
+
+    def is_aligned(self, body: List[int]) -> bool:
+        """Check if a body lies along the cycle, from the tail to the head
+
+        Cells of the body out of the cycle, left by a detour, are skipped.
+
+        Args:
+            body (List[int]): cells of the body from the tail to the head
+
+        Returns:
+            bool: True if every next cell of the body on the cycle is further along the loop of the head
+        """
+        cycle = self.cycle
+        head = body[-1]
+        loop = cycle.loop[head]
+        if loop < 0:
+            return False
+        # steps from each cell to the head decrease strictly along the body
+        prev = cycle.loop_len[loop]
+        for idx in body:
+            if cycle.loop[idx] < 0:
+                continue
+            steps = cycle.distance(idx, head)
+            if steps < 0 or steps >= prev:
+                return False
+            prev = steps
+        return True
+
+    def __neighbors(self, idx: int) -> List[int]:
+        """Get the cells next to a cell, on the board"""
+        cols = self.grid.cols
+        row, col = divmod(idx, cols)
+        cells = []
+        if row > 0:
+            cells.append(idx - cols)
+        if row < self.grid.rows - 1:
+            cells.append(idx + cols)
+        if col > 0:
+            cells.append(idx - 1)
+        if col < cols - 1:
+            cells.append(idx + 1)
+        return cells
+
+    def __is_free(self, idx: int, tail: int) -> bool:
+        """Check if the head can move to a cell, food is free, the tail cell if it moves"""
+        grid = self.grid
+        return idx == tail or grid.taken[idx] == grid.layers[FOOD][idx]
+
+    def __follow(
+        self,
+        head: int,
+        tail: int,
+        loop_tail: int,
+        growing: bool,
+        length: int,
+        foods: List[int],
+    ) -> Optional[int]:
+        """Pick the next cell of a body lying along the cycle, None if none is safe
+
+        Args:
+            head (int): cell of the head
+            tail (int): the cell the tail leaves in this tick, -1 if it stays
+            loop_tail (int): the cell of the body on the cycle closest to the tail
+            growing (bool): whether the snake grows in this tick
+            length (int): length of the snake
+            foods (List[int]): cells of the food on the loop of the head
+
+        Returns:
+            Optional[int]: the next cell of the head
+        """
+        cycle = self.cycle
+        loop = cycle.loop[head]
+        loop_len = cycle.loop_len[loop]
+        # steps from the head to the tail, the cells in between are free, and the
+        # least steps left once every cell of the body out of the cycle is left
+        # by the tail without the tail moving on along the cycle
+        gap = cycle.distance(head, loop_tail)
+        slack = gap - self.off_loop
+
+        nxt = cycle.succ[head]
+        if not self.__is_free(nxt, tail):
+            return None
+        best, best_steps = nxt, 1
+
+        # a cut of n steps takes n - 1 from the slack, and every food eaten before
+        # the tail moves on one more
+        max_steps = slack - SHORTCUT_BUFFER - len(foods) - growing + 1
+        detour_steps = max_steps - 1
+        if not self.shortcuts or length > SHORTCUT_MAX_FILL * loop_len:
+            max_steps = 0
+        # the food closest along the cycle is the target, cutting past it is useless
+        target = min((cycle.distance(head, food) for food in foods), default=0)
+
+        for idx in self.__neighbors(head):
+            if cycle.loop[idx] == loop:
+                steps = cycle.distance(head, idx)
+                if best_steps < steps <= min(target, max_steps) and self.__is_free(
+                    idx, -1
+                ):
+                    best, best_steps = idx, steps
+
+        # the food out of the cycle is eaten on detours, which also leave cells
+        # out of the cycle in the body, so they are allowed even for a long snake
+        detour = self.__find_detour(head, gap, detour_steps)
+        if detour:
+            self.detour = detour[1:]
+            return detour[0]
+        return best
+
+    def __find_detour(self, head: int, gap: int, max_steps: int) -> List[int]:
+        """Find a path through free cells out of the cycle to food and back onto the cycle
+
+        The path goes back onto the cycle before the tail, like a shortcut.
+
+        Args:
+            head (int): cell of the head, on the cycle
+            gap (int): steps from the head to the tail along the cycle
+            max_steps (int): the furthest the path may go ahead along the cycle, less one per food on the way after the first
+
+        Returns:
+            List[int]: the cells of the detour, empty if there is none
+        """
+        cycle, grid = self.cycle, self.grid
+        loop = cycle.loop[head]
+        foods = grid.layers[FOOD]
+
+        def search(
+            start: int, is_goal: Callable[[int, int], bool], body: List[int]
+        ) -> List[int]:
+            # breadth first through the free cells out of the cycle, the cells the
+            # body will cover are not free on the way
+            prev = {idx: -1 for idx in body}
+            prev[start] = -1
+            depth = {start: 0}
+            queue = [start]
+            i = 0
+            while i < len(queue) and len(queue) < DETOUR_SEARCH_CELLS:
+                idx = queue[i]
+                i += 1
+                for other in self.__neighbors(idx):
+                    if other in prev or not self.__is_free(other, -1):
+                        continue
+                    prev[other] = idx
+                    depth[other] = depth[idx] + 1
+                    if is_goal(other, depth[other]):
+                        path = []
+                        while other != start:
+                            path.append(other)
+                            other = prev[other]
+                        return path[::-1]
+                    if cycle.loop[other] < 0:
+                        queue.append(other)
+            return []
+
+        to_food = search(
+            head, lambda idx, _: cycle.loop[idx] < 0 and foods[idx] > 0, []
+        )
+        if not to_food:
+            return []
+
+        grow = sum(1 for cell in to_food if foods[cell])
+
+        def is_exit(idx: int, _) -> bool:
+            if cycle.loop[idx] != loop:
+                return False
+            steps = cycle.distance(head, idx)
+            return 0 < steps < gap and steps <= max_steps - grow + 1
+
+        back = search(to_food[-1], is_exit, [head] + to_food)
+        if not back or any(foods[cell] for cell in back):
+            return []
+        return to_food + back
+
+    def __room(self, start: int, tail: int, length: int) -> Tuple[bool, int]:
+        """Flood the free cells reachable from a cell
+
+        Args:
+            start (int): the cell the head moves to
+            tail (int): cell of the tail
+            length (int): length of the snake, the most cells counted
+
+        Returns:
+            Tuple[bool, int]: whether the tail can be reached, the number of cells up to length
+        """
+        seen = {start}
+        queue = [start]
+        reaches_tail = False
+        i = 0
+        while i < len(queue) and not (reaches_tail and len(queue) >= length):
+            idx = queue[i]
+            i += 1
+            for other in self.__neighbors(idx):
+                if other == tail:
+                    reaches_tail = True
+                elif other not in seen and self.__is_free(other, -1):
+                    seen.add(other)
+                    queue.append(other)
+        return reaches_tail, min(len(queue), length)
+
+    def __recover(self, body: List[int], tail: int, grow: int) -> Optional[int]:
+        """Pick the next cell of a body lying across the cycle
+
+        The cycle is followed if every cell of the body ahead along it is left
+        by the tail before the head gets there, even if all the food is eaten on
+        the way. Else the head chases its tail, which always leaves the way free,
+        taking the move with the most room.
+
+        Args:
+            body (List[int]): cells of the body from the tail to the head
+            tail (int): the cell the tail leaves in this tick, -1 if it stays
+            grow (int): the most growth before the tail moves
+
+        Returns:
+            Optional[int]: the next cell of the head
+        """
+        cycle = self.cycle
+        head = body[-1]
+        nxt = cycle.succ[head]
+        if nxt >= 0 and self.__is_free(nxt, tail):
+            # the cell i from the tail is left after i + 1 moves, plus the growth
+            if all(
+                steps < 0 or steps > i + grow
+                for i, steps in enumerate(
+                    cycle.distance(head, idx) for idx in body[:-1]
+                )
+            ):
+                return nxt
+
+        best, best_score = None, None
+        for idx in self.__neighbors(head):
+            if idx != body[-2] and self.__is_free(idx, tail):
+                reaches_tail, room = self.__room(idx, body[0], len(body))
+                # back onto the cycle on a tie
+                score = (reaches_tail, room, cycle.loop[idx] >= 0)
+                if best_score is None or score > best_score:
+                    best, best_score = idx, score
+        return best
+
+    def next_action(self, state: GameState, player: int = 0) -> Optional[Direction]:
+        self.update(state)
+
+        grid = self.grid
+        loop = self.cycle.loop
+        snake: Snake = state.snakes[player]
+        head = grid.index(snake.get_head_pos())
+        if head < 0:
+            return None
+        # the tail moves away in the same tick, unless the snake grows, and it
+        # is where the head comes from if the snake has two blocks
+        growing = grid.count(FOOD, snake.get_head_pos()) > 0
+        if growing or snake.get_length() <= 2:
+            tail = -1
+        else:
+            tail = grid.index(snake.get_tail_pos())
+
+        nxt = None
+        if self.detour:
+            idx = self.detour.pop(0)
+            if idx in self.__neighbors(head) and self.__is_free(idx, tail):
+                nxt = idx
+            else:
+                self.detour = []
+                self.aligned = False
+
+        # food on the loop of the head, the food under the head is being eaten
+        foods = [
+            idx
+            for idx in map(grid.index, state.food_controller.get_pos())
+            if idx != head and loop[idx] >= 0 and loop[idx] == loop[head]
+        ]
+
+        if nxt is None and not self.aligned:
+            body = [grid.index(pos) for pos in snake.get_all_pos()]
+            self.aligned = self.is_aligned(body)
+            self.off_loop = sum(1 for idx in body if loop[idx] < 0)
+        if nxt is None and self.aligned:
+            for pos, _ in snake.iter_blocks():
+                loop_tail = grid.index(pos)
+                if loop[loop_tail] >= 0:
+                    break
+            nxt = self.__follow(
+                head, tail, loop_tail, growing, snake.get_length(), foods
+            )
+            if nxt is None:
+                self.aligned = False
+        if nxt is None:
+            body = [grid.index(pos) for pos in snake.get_all_pos()]
+            nxt = self.__recover(body, tail, int(growing) + len(foods))
+        if nxt is None:
+            return None
+
+        if self.aligned:
+            if loop[nxt] < 0:
+                self.off_loop += 1
+            if not growing and loop[grid.index(snake.get_tail_pos())] < 0:
+                self.off_loop -= 1
+
+        delta = nxt - head
+        if delta == -1:
+            return "LEFT"
+        if delta == 1:
+            return "RIGHT"
+        return "UP" if delta < 0 else "DOWN"
@@ -1,36 +1,42 @@
 import pygame
 import sys
 import asyncio
+import os
 import time
 
+from autopilot import Autopilot
 from colors import *
-from food import FoodController
-from utils import show_info, check
-from wall import WallController
-from snake import Snake, SnakeBodyBlock
-
-# set window size and name
-SCREEN_WIDTH, SCREEN_HEIGHT = 800, 800
-
-# initial speed
-INITIAL_SNAKE_SPEED = 10
-INITIAL_SNAKE_COLOR = WHITE
-
-# max food cnt, max wall cnt
-MAX_FOOD_CNT = 3
-MAX_WALL_CNT = 1
+from config import *
+from controls import KeyboardInput
+from engine import GameState
+from multiplayer import MultiGameState
+from fonts import render_text
+from profiler import FrameProfiler
+from render import RENDERERS, ViewportRenderer
+from replay import ReplayRecorder
+from utils import layout_info
+
+# set window name
+WINDOW_CAPTION = "UserName-蛇吃豆-UserID"
 
-GENERATE_WALL_INTERVAL = 10  # seconds
+# longest frame time (s) simulated at once
+MAX_FRAME_TIME = 0.25
 
-WINDOW_CAPTION = "UserName-蛇吃豆-UserID"
+# screens of the game loop
+PLAYING = "playing"
+GAME_OVER = "game_over"
 
 
-# game over function
-async def game_over(screen, code: int, score: int):
-    """game over function
+def game_over(code: int, score: int, scores=None):
+    """Report the end of a game and build the game over screen
 
     Args:
-        code (int): 0: collision with the wall, 1: collision with the snake body, 2: collision with the wall
+        code (int): 0: collision with the wall, 1: collision with the snake body, 2: collision with the wall, 3: collision with the head of another snake
+        score (int): the score of the game
+        scores (List[int], optional): the score of every player in a multiplayer game. Defaults to None.
+
+    Returns:
+        List[Overlay]: the score and restart hint, drawn on top of the board until the restart
     """
     if code == 0:
         print("Game Over because of collision with the wall")
@@ -38,10 +44,18 @@ async def game_over(screen, code: int, score: int):
         print("Game Over because of collision with the snake body")
     elif code == 2:
         print("Game Over because of collision with the wall")
-
-    my_font = pygame.font.SysFont("times new roman", 50)
-    game_over_surface = my_font.render("Your Score is : " + str(score), True, RED)
-    restart_surface = my_font.render("Press SPACE to restart", True, RED)
+    elif code == 3:
+        print("Game Over because of collision with the head of another snake")
+
+    if scores is None:
+        score_text = "Your Score is : " + str(score)
+    else:
+        score_text = "Scores : " + " | ".join(
+            f"P{player + 1} {player_score}"
+            for player, player_score in enumerate(scores)
+        )
+    game_over_surface = render_text(score_text, 50, RED)
+    restart_surface = render_text("Press SPACE to restart", 50, RED)
 
     game_over_rect = game_over_surface.get_rect()
     restart_rect = restart_surface.get_rect()
@@ -49,196 +63,149 @@ async def game_over(screen, code: int, score: int):
     game_over_rect.midtop = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4)
     restart_rect.midtop = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 3)
 
-    screen.blit(game_over_surface, game_over_rect)
-    screen.blit(restart_surface, restart_rect)
-    pygame.display.flip()
+    return [(game_over_surface, game_over_rect), (restart_surface, restart_rect)]
 
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    return True  # Return True to indicate restart
-        await asyncio.sleep(0.1)
-
-
-async def game_loop(screen):
-    # init snake direction
-    snake_direction = "RIGHT"
-    change_to = snake_direction
-    new_snake_direction = snake_direction
-
-    # initial score
-    score = 0
-
-    snake = Snake(
-        body=[
-            SnakeBodyBlock(
-                pos=(390, 390),
-                color=INITIAL_SNAKE_COLOR,
-                width=10,
-                height=10,
-            ),
-            SnakeBodyBlock(
-                pos=(400, 390),
-                color=INITIAL_SNAKE_COLOR,
-                width=10,
-                height=10,
-            ),
-        ],
-        direction="RIGHT",
-    )
 
-    # generate food and wall
-    # Create a new FoodController instance for each game
-    food_controller = FoodController(
-        width=SCREEN_WIDTH,
-        height=SCREEN_HEIGHT,
-        food_list=[],  # Explicitly start with an empty food list
-    )
-    # Generate initial food
-    food_controller.generate(MAX_FOOD_CNT, snake.get_all_pos())
+async def game_loop(screen, renderer, profiler):
+    """Run games one after the other, as a single loop switching between screens
 
-    wall_controller = WallController(
-        walls=None, width=SCREEN_WIDTH, height=SCREEN_HEIGHT
-    )
-    wall_controller.generate(
-        MAX_WALL_CNT, food_controller.get_pos(), snake.get_all_pos()
+    The game over screen is a state of the loop rather than a loop of its own, so
+    events keep being handled every frame and SPACE restarts on the next one. A
+    restart resets the game in place, reusing its snakes and controllers.
+    """
+    # turns pressed between two ticks are buffered per player
+    keyboard = KeyboardInput(PLAYERS)
+    sources = list(keyboard.sources)
+    if AUTOPILOT:
+        sources[0] = Autopilot()
+
+    settings = dict(
+        width=GRID_COLS * CELL_SIZE,
+        height=GRID_ROWS * CELL_SIZE,
+        max_food_cnt=MAX_FOOD_CNT,
+        max_wall_cnt=MAX_WALL_CNT,
+        generate_wall_interval=GENERATE_WALL_INTERVAL,
+        initial_snake_speed=INITIAL_SNAKE_SPEED,
+        initial_snake_color=INITIAL_SNAKE_COLOR,
+        verbose=True,
+        cell_size=CELL_SIZE,
     )
+    if PLAYERS > 1:
+        state = MultiGameState(PLAYERS, **settings)
+    else:
+        state = GameState(**settings)
+    # replays hold the turns of a single snake
+    record = REPLAY_DIR is not None and PLAYERS == 1
+    recorder = ReplayRecorder(state) if record else None
+    if profiler.enabled:
+        # the game marks the phases of its ticks itself
+        state.profiler = profiler
+
+    # Show hints
+    if AUTOPILOT:
+        hints = [
+            "The autopilot steers the first snake.",
+            "Press SPACE to restart the game.",
+        ]
+    elif PLAYERS > 1:
+        hints = [
+            "Player 1: arrow keys, player 2: WASD.",
+            "Press SPACE to restart the game.",
+        ]
+    else:
+        hints = [
+            "Use arrow keys or WASD to move the snake.",
+            "Press SPACE to restart the game.",
+        ]
+    hint_overlays = []
+    for i, hint in enumerate(hints):
+        hint_surface = render_text(hint, 20, WHITE)
+        hint_rect = hint_surface.get_rect(topleft=(10, 10 + i * 25))
+        hint_overlays.append((hint_surface, hint_rect))
 
     # init time and tick settings
     start_time = time.time()
     fps = pygame.time.Clock()
+    # simulated time not consumed by ticks yet
+    accumulator = 0.0
+
+    screen_state = PLAYING
+    game_over_overlays = []
 
     while True:
+        profiler.start_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                profiler.close()
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.WINDOWEXPOSED:
+                renderer.invalidate()
             elif event.type == pygame.KEYDOWN:
-                if event.key in [pygame.K_UP, ord("w"), ord("W"), ord("k"), ord("K")]:
-                    change_to = "UP"
-                elif event.key in [
-                    pygame.K_DOWN,
-                    ord("s"),
-                    ord("S"),
-                    ord("j"),
-                    ord("J"),
-                ]:
-                    change_to = "DOWN"
-                elif event.key in [
-                    pygame.K_LEFT,
-                    ord("a"),
-                    ord("A"),
-                    ord("h"),
-                    ord("H"),
-                ]:
-                    change_to = "LEFT"
-                elif event.key in [
-                    pygame.K_RIGHT,
-                    ord("d"),
-                    ord("D"),
-                    ord("l"),
-                    ord("L"),
-                ]:
-                    change_to = "RIGHT"
-
-        current_snake_direction = snake.get_direction()
-        # Handle direction changes
-        if change_to == "UP" and current_snake_direction != "DOWN":
-            new_snake_direction = "UP"
-        if change_to == "DOWN" and current_snake_direction != "UP":
-            new_snake_direction = "DOWN"
-        if change_to == "LEFT" and current_snake_direction != "RIGHT":
-            new_snake_direction = "LEFT"
-        if change_to == "RIGHT" and current_snake_direction != "LEFT":
-            new_snake_direction = "RIGHT"
-
-        snake.set_direction(new_snake_direction)
-
-        food_pos = food_controller.get_pos(idx="all")
-        snake_head_pos = snake.get_head_pos()
-
-        is_food_eaten = check(food_pos, snake_head_pos)
-        if is_food_eaten:
-            eaten_food_idx = food_controller.get_food_at_pos(pos=snake_head_pos)
-            eaten_food = food_controller.get_food(idx=eaten_food_idx)
-
-            score += eaten_food.get_score()
-            snake.grow(color=eaten_food.color)
-
-            food_controller.remove(idx=eaten_food_idx)
-            food_controller.generate(
-                1, snake.get_all_pos(), wall_controller.get_all_collision()
-            )
-        else:
-            snake.move()
-
-        # Draw everything
-        screen.fill(BLACK)
-        food_controller.draw(screen=screen)
-        wall_controller.draw(screen=screen)
-        snake.draw(screen=screen)
-
-        # Show hints
-        font = pygame.font.SysFont("times new roman", 20)
-        hints = [
-            "Use arrow keys or WASD to move the snake.",
-            "Press SPACE to restart the game.",
-        ]
-        for i, hint in enumerate(hints):
-            hint_surface = font.render(hint, True, WHITE)
-            hint_rect = hint_surface.get_rect(topleft=(10, 10 + i * 25))
-            screen.blit(hint_surface, hint_rect)
-
-        # Game Over conditions
-        snake_head_pos = snake.get_head_pos()
-        if snake_head_pos[0] < 0 or snake_head_pos[0] > SCREEN_WIDTH - 10:
-            should_restart = await game_over(screen, 0, score)
-            if should_restart:
-                return
-        if snake_head_pos[1] < 0 or snake_head_pos[1] > SCREEN_HEIGHT - 10:
-            should_restart = await game_over(screen, 0, score)
-            if should_restart:
-                return
-
-        # Touching the snake body
-        if check(snake_head_pos, [block.pos for block in snake.body[-2::-1]]):
-            should_restart = await game_over(screen, 1, score)
-            if should_restart:
-                return
-
-        if check(snake_head_pos, wall_controller.get_all_collision()):
-            should_restart = await game_over(screen, 2, score)
-            if should_restart:
-                return
-
-        show_info(
-            screen=screen,
+                if screen_state == GAME_OVER:
+                    if event.key == pygame.K_SPACE:
+                        state.reset()
+                        for source in keyboard.sources:
+                            source.clear()
+                        recorder = ReplayRecorder(state) if record else None
+                        start_time = time.time()
+                        accumulator = 0.0
+                        renderer.invalidate()
+                        screen_state = PLAYING
+                        game_over_overlays = []
+                else:
+                    keyboard.handle_key(event.key)
+        profiler.mark("events")
+
+        # Advance the game rules by as many fixed ticks as the elapsed time allows,
+        # at most MAX_FRAME_TIME so a stalled frame doesn't fast-forward the game
+        if screen_state == PLAYING:
+            accumulator += min(fps.get_time() / 1000, MAX_FRAME_TIME)
+        while not state.done and accumulator >= 1 / state.snake_speed:
+            accumulator -= 1 / state.snake_speed
+            actions = [
+                source.next_action(state, player)
+                for player, source in enumerate(sources)
+            ]
+            profiler.mark("update")
+            state.step(actions if PLAYERS > 1 else actions[0])
+        profiler.mark("update")
+
+        # Draw everything, with the hints and info on top
+        overlays = hint_overlays + layout_info(
+            screen.get_size(),
             place="upperright",
-            score=score,
-            time_played=(time.time() - start_time),
+            score=state.score,
+            time_played=state.time_played,
         )
+        overlays += profiler.overlays(screen.get_size(), state.snake.get_length())
 
-        # Refresh game screen
-        pygame.display.flip()
-
-        # generate a new wall per GENERATE_WALL_INTERVAL
-        if (
-            time.time() - start_time
-        ) / GENERATE_WALL_INTERVAL > wall_controller.count():
-            wall_controller.generate(1, food_controller.get_pos(), snake.get_all_pos())
+        # Game Over conditions
+        if screen_state == PLAYING and state.done:
+            if recorder is not None:
+                os.makedirs(REPLAY_DIR, exist_ok=True)
+                recorder.save(
+                    os.path.join(REPLAY_DIR, f"{int(start_time)}-{state.seed}.snkr")
+                )
+                state.recorder = recorder = None
+            game_over_overlays = game_over(
+                state.game_over_code,
+                state.score,
+                scores=state.scores if PLAYERS > 1 else None,
+            )
+            screen_state = GAME_OVER
+        overlays += game_over_overlays
+        profiler.mark("info")
+        renderer.render(state, overlays)
+        profiler.mark("render")
 
         # Frame Per Second /Refresh Rate
-        snake_speed = INITIAL_SNAKE_SPEED + 2 / 60 * max(
-            0, (time.time() - start_time - 1)
-        )
-        fps.tick(snake_speed)
+        fps.tick(RENDER_FPS)
 
         # Required for web environment
         await asyncio.sleep(0)
+        profiler.mark("wait")
+        profiler.end_frame()
 
 
 async def main():
@@ -249,8 +216,14 @@ async def main():
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption(WINDOW_CAPTION)
 
-    while True:
-        await game_loop(screen)
+    if GRID_COLS * CELL_SIZE > SCREEN_WIDTH or GRID_ROWS * CELL_SIZE > SCREEN_HEIGHT:
+        renderer = ViewportRenderer(screen, background=BLACK)
+    else:
+        renderer = RENDERERS[RENDER_MODE](screen, background=BLACK)
+
+    profiler = FrameProfiler(dump_path=PROFILE_DUMP, enabled=PROFILE)
+
+    await game_loop(screen, renderer, profiler)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict
+
+from colors import *
+from config import *
+from engine import (
+    GameState,
+    OPPOSITE_DIRECTION,
+    COLLISION_BORDER,
+    COLLISION_BODY,
+    COLLISION_WALL,
+)
+from grid import SNAKE, FOOD, WALL
+from snake import SnakeBodyBlock
+from type_alias import *
+
+# game over code of a snake whose head met the head of another snake
+COLLISION_HEAD = 3
+
+# initial colors of the snakes, player i gets color i modulo the number of colors
+PLAYER_COLORS = [WHITE, BLUE, ORANGE, YELLOW, GREEN, RED]
+
+
+class MultiGameState(GameState):
+    def __init__(
+        self,
+        players: int = 2,
+        *args,
+        player_colors: List[Color] = PLAYER_COLORS,
+        **kwargs,
+    ):
+        """Game of several snakes sharing the food and walls of one board
+
+        Every snake moves once per tick, then the moved heads are checked against
+        the border, the walls, the other heads and every snake body through the
+        occupancy grid, so a tick costs O(snakes) whatever their length. A dead
+        snake stays on the board as an obstacle. The game is over when every snake
+        is dead.
+
+        Args:
+            players (int, optional): number of snakes. Defaults to 2.
+            *args: arguments of GameState
+            player_colors (List[Color], optional): initial colors of the snakes. Defaults to PLAYER_COLORS.
+            **kwargs: keyword arguments of GameState
+        """
+        self.players = players
+        self.player_colors = player_colors
+        super().__init__(*args, **kwargs)
+
+    def reset(self, seed: Optional[int] = None) -> None:
+        """Start a new game: new snakes, food and walls, zero scores and time.
+
+        Args:
+            seed (Optional[int], optional): seed of the new game. Defaults to None (a random seed).
+        """
+        self.scores = [0] * self.players
+        # game over code of every snake, None while it is alive
+        self.game_over_codes: List[Optional[int]] = [None] * self.players
+        super().reset(seed)
+
+    def fork(self, seed: Optional[int] = None) -> "MultiGameState":
+        """Get an independent copy of the game, see GameState.fork
+
+        Args:
+            seed (Optional[int], optional): seed of a new random stream for the copy. Defaults to None (the same stream as the game).
+
+        Returns:
+            MultiGameState: the copy
+        """
+        clone = super().fork(seed)
+        clone.scores = list(self.scores)
+        clone.game_over_codes = list(self.game_over_codes)
+        return clone
+
+    def spawn_bodies(self) -> List[List[SnakeBodyBlock]]:
+        """Get the bodies of the snakes at the start of a game, on evenly spaced rows
+
+        Returns:
+            List[List[SnakeBodyBlock]]: bodies of two blocks ending at the center column
+        """
+        cell_size = self.cell_size
+        center_x = self.grid.cols // 2 * cell_size
+        bodies = []
+        for player in range(self.players):
+            y = (player + 1) * self.grid.rows // (self.players + 1) * cell_size
+            color = self.player_colors[player % len(self.player_colors)]
+            bodies.append(
+                [
+                    SnakeBodyBlock(
+                        pos=(center_x - cell_size, y),
+                        color=color,
+                        width=cell_size,
+                        height=cell_size,
+                    ),
+                    SnakeBodyBlock(
+                        pos=(center_x, y),
+                        color=color,
+                        width=cell_size,
+                        height=cell_size,
+                    ),
+                ]
+            )
+        return bodies
+
+    def is_alive(self, player: int) -> bool:
+        """Check if the snake of a player is still alive
+
+        Args:
+            player (int): index of the player
+
+        Returns:
+            bool: True until the snake collides
+        """
+        return self.game_over_codes[player] is None
+
+    def step(
+        self,
+        actions: Optional[List[Optional[Direction]]] = None,
+        dt: Optional[float] = None,
+    ) -> Tuple[List[int], bool]:
+        """Advance the game by one tick.
+
+        Args:
+            actions (Optional[List[Optional[Direction]]], optional): direction to turn to per player, None to keep going. Defaults to None (every snake keeps going).
+            dt (Optional[float], optional): seconds elapsed since the last tick. Defaults to None (one tick at the current snake speed).
+
+        Returns:
+            Tuple[List[int], bool]: score gained in this tick per player, whether the game is over
+        """
+        rewards = [0] * self.players
+        if self.done:
+            return rewards, True
+
+        grid = self.grid
+        food_controller = self.food_controller
+
+        moved = []
+        for player, snake in enumerate(self.snakes):
+            if self.game_over_codes[player] is not None:
+                continue
+
+            action = actions[player] if actions is not None else None
+            if (
+                action is not None
+                and action != OPPOSITE_DIRECTION[snake.get_direction()]
+            ):
+                snake.set_direction(action)
+
+            snake_head_pos = snake.get_head_pos()
+            if grid.count(FOOD, snake_head_pos):
+                eaten_food = food_controller.get_at_pos(pos=snake_head_pos)[0]
+
+                rewards[player] = eaten_food.get_score()
+                self.scores[player] += rewards[player]
+                snake.grow(color=eaten_food.color)
+
+                food_controller.remove_food(eaten_food)
+            else:
+                snake.move()
+            moved.append(player)
+
+        self.score = sum(self.scores)
+        self.ticks += 1
+        self.time_played += 1 / self.snake_speed if dt is None else dt
+        if self.profiler is not None:
+            self.profiler.mark("move")
+
+        # every snake moved before any check, so a tail that left a cell this tick
+        # is already gone from the grid
+        heads: Dict[Position, int] = {}
+        for player in moved:
+            snake_head_pos = self.snakes[player].get_head_pos()
+            heads[snake_head_pos] = heads.get(snake_head_pos, 0) + 1
+
+        for player in moved:
+            snake_head_pos = self.snakes[player].get_head_pos()
+            if not (
+                0 <= snake_head_pos[0] <= self.width - self.cell_size
+                and 0 <= snake_head_pos[1] <= self.height - self.cell_size
+            ):
+                code = COLLISION_BORDER
+            elif heads[snake_head_pos] > 1:
+                code = COLLISION_HEAD
+            elif grid.count(SNAKE, snake_head_pos) > 1:
+                # the head itself is one of the snake cells
+                code = COLLISION_BODY
+            elif grid.count(WALL, snake_head_pos):
+                code = COLLISION_WALL
+            else:
+                continue
+            self.game_over_codes[player] = code
+            if None not in self.game_over_codes:
+                self.game_over_code = code
+        if self.profiler is not None:
+            self.profiler.mark("collision")
+
+        if not self.done:
+            self.refill()
+            if self.profiler is not None:
+                self.profiler.mark("spawn")
+
+        return rewards, self.done
@@ -0,0 +1,604 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Set, Deque
+import argparse
+import asyncio
+import collections
+import random
+import struct
+import time
+import traceback
+
+from colors import *
+from controls import QueuedInput
+from config import *
+from engine import GameState, OPPOSITE_DIRECTION
+from snake import DIRECTION_DELTA
+from replay import DIRECTIONS, DIRECTION_CODE, write_varint, read_varint
+from type_alias import *
+
+# message types, every message is a varint length followed by the type and its body
+MSG_SNAPSHOT = 1  # server: the whole game, when a client joins or a game restarts
+MSG_TICK = 2  # server: what changed in one tick
+MSG_TURN = 3  # client: the direction to turn to
+
+# flags of a tick message
+TICK_TAIL_REMOVED = 1  # the snake moved, instead of growing
+TICK_GAME_OVER = 2  # the game over code and score follow
+TICK_HEAD_OFF_BOARD = 4  # the head left the board, no head cell follows
+
+# server ticks per second
+TICK_RATE = 10
+
+# a client is disconnected when this many bytes wait to be sent to it
+MAX_WRITE_BUFFER = 1 << 16
+
+DIRECTION_OF_STEP = {delta: direction for direction, delta in DIRECTION_DELTA.items()}
+
+# header of a tick message: tick and server time, for the latency of clients
+TICK_HEADER = struct.Struct("<Id")
+
+
+def encode_frame(body: bytearray) -> bytes:
+    """Prefix a message with its length
+
+    Args:
+        body (bytearray): the message type and body
+
+    Returns:
+        bytes: the frame to send
+    """
+    frame = bytearray()
+    write_varint(frame, len(body))
+    return bytes(frame + body)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """Read a message written by encode_frame
+
+    Args:
+        reader (asyncio.StreamReader): the connection
+
+    Raises:
+        asyncio.IncompleteReadError: if the connection is closed
+
+    Returns:
+        bytes: the message type and body
+    """
+    length = 0
+    shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return await reader.readexactly(length)
+
+
+def write_cell(buf: bytearray, pos: Position, cell_size: int) -> None:
+    """Append the column and row of a position
+
+    Args:
+        buf (bytearray): the buffer to write to
+        pos (Position): the position (px)
+        cell_size (int): size of a cell (px)
+    """
+    write_varint(buf, pos[0] // cell_size)
+    write_varint(buf, pos[1] // cell_size)
+
+
+class Session:
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        seed: int,
+        width: int,
+        height: int,
+        cell_size: int,
+    ):
+        """A client connected to the server and its authoritative game
+
+        Args:
+            writer (asyncio.StreamWriter): the connection to the client
+            seed (int): seed of the first game
+            width (int): width of the board (px)
+            height (int): height of the board (px)
+            cell_size (int): size of a cell (px)
+        """
+        self.writer = writer
+        self.state = GameState(
+            width=width, height=height, seed=seed, cell_size=cell_size
+        )
+        # turns of the client, handed to the game one per tick
+        self.input = QueuedInput()
+        self.bytes_sent = 0
+
+        # what the client already knows, to send only the changes
+        self.known_food: Set[Position] = set()
+        self.known_walls = 0
+
+    def send(self, body: bytearray) -> None:
+        """Queue a message to the client, without waiting
+
+        Args:
+            body (bytearray): the message type and body
+        """
+        frame = encode_frame(body)
+        self.writer.write(frame)
+        self.bytes_sent += len(frame)
+
+    def snapshot(self) -> bytearray:
+        """Encode the whole game and remember it as known by the client
+
+        Returns:
+            bytearray: the snapshot message
+        """
+        state = self.state
+        cell_size = state.cell_size
+        buf = bytearray([MSG_SNAPSHOT])
+        for value in (state.grid.cols, state.grid.rows, cell_size):
+            write_varint(buf, value)
+        buf += TICK_HEADER.pack(state.ticks, time.time())
+        write_varint(buf, state.score)
+
+        buf.append(DIRECTION_CODE[state.snake.get_direction()])
+        write_varint(buf, state.snake.get_length())
+        for pos, color in state.snake.iter_blocks():
+            write_cell(buf, pos, cell_size)
+            buf += bytes(color)
+
+        foods = state.food_controller.get()
+        write_varint(buf, len(foods))
+        for food in foods:
+            write_cell(buf, food.pos, cell_size)
+            buf += bytes(food.color)
+
+        walls = state.wall_controller.get()
+        write_varint(buf, len(walls))
+        for wall in walls:
+            write_cell(buf, wall.pos, cell_size)
+            buf.append(wall.orientation == "Vertical")
+
+        self.known_food = set(state.food_controller.get_pos())
+        self.known_walls = len(walls)
+        return buf
+
+    def tick(self, dt: float) -> None:
+        """Advance the game by one tick and send the changes to the client
+
+        A finished game is restarted with the next seed and sent as a snapshot.
+
+        Args:
+            dt (float): seconds of a tick
+        """
+        state = self.state
+        if state.done:
+            state.reset(state.seed + 1)
+            self.input.clear()
+            self.send(self.snapshot())
+            return
+
+        length = state.snake.get_length()
+        state.step(self.input.next_action(state), dt)
+        cell_size = state.cell_size
+
+        buf = bytearray([MSG_TICK])
+        buf += TICK_HEADER.pack(state.ticks, time.time())
+        flags = 0
+        if state.snake.get_length() == length:
+            flags |= TICK_TAIL_REMOVED
+        if state.done:
+            flags |= TICK_GAME_OVER
+        # a snake dying on the border has its head outside the board, which has
+        # no cell to send, the game over code tells the client what happened
+        head = state.snake.get_head_pos()
+        if state.grid.index(head) < 0:
+            flags |= TICK_HEAD_OFF_BOARD
+        buf.append(flags)
+        if not flags & TICK_HEAD_OFF_BOARD:
+            write_cell(buf, head, cell_size)
+
+        foods = state.food_controller.get()
+        food_pos = {food.pos for food in foods}
+        eaten = self.known_food - food_pos
+        write_varint(buf, len(eaten))
+        for pos in eaten:
+            write_cell(buf, pos, cell_size)
+        spawned = [food for food in foods if food.pos not in self.known_food]
+        write_varint(buf, len(spawned))
+        for food in spawned:
+            write_cell(buf, food.pos, cell_size)
+            buf += bytes(food.color)
+        self.known_food = food_pos
+
+        walls = state.wall_controller.get()
+        write_varint(buf, len(walls) - self.known_walls)
+        for wall in walls[self.known_walls :]:
+            write_cell(buf, wall.pos, cell_size)
+            buf.append(wall.orientation == "Vertical")
+        self.known_walls = len(walls)
+
+        if state.done:
+            write_varint(buf, state.game_over_code)
+            write_varint(buf, state.score)
+        self.send(buf)
+
+
+class GameServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        tick_rate: float = TICK_RATE,
+        width: int = GRID_COLS * CELL_SIZE,
+        height: int = GRID_ROWS * CELL_SIZE,
+        cell_size: int = CELL_SIZE,
+        seed: int = 0,
+    ):
+        """Authoritative server running one game per connected client
+
+        All games advance together at a fixed tick rate in a single loop, and each
+        client receives a snapshot of its game when it joins, then only the changes
+        of every tick: the new head (none once it left the board), whether the
+        tail was removed, the food eaten and spawned and the walls added. Clients
+        send the direction to turn to. A client sending anything else is dropped.
+
+        Args:
+            host (str, optional): address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port to listen on. Defaults to 8765.
+            tick_rate (float, optional): ticks per second of every game. Defaults to TICK_RATE.
+            width (int, optional): width of the boards (px). Defaults to GRID_COLS * CELL_SIZE.
+            height (int, optional): height of the boards (px). Defaults to GRID_ROWS * CELL_SIZE.
+            cell_size (int, optional): size of a cell (px). Defaults to CELL_SIZE.
+            seed (int, optional): seed of the first game, the following ones count up. Defaults to 0.
+        """
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.next_seed = seed
+
+        self.sessions: List[Session] = []
+        # seconds spent simulating and encoding each tick of all games
+        self.tick_times: Deque[float] = collections.deque(maxlen=1000)
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Start a game for a new client and apply its turns until it leaves
+
+        Args:
+            reader (asyncio.StreamReader): the connection, from the client
+            writer (asyncio.StreamWriter): the connection, to the client
+        """
+        session = Session(
+            writer, self.next_seed, self.width, self.height, self.cell_size
+        )
+        self.next_seed += 1
+        session.send(session.snapshot())
+        self.sessions.append(session)
+        try:
+            while True:
+                message = await read_frame(reader)
+                # anything but a well-formed turn drops the client
+                if (
+                    len(message) != 2
+                    or message[0] != MSG_TURN
+                    or message[1] >= len(DIRECTIONS)
+                ):
+                    break
+                session.input.push(DIRECTIONS[message[1]])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            writer.close()
+
+    async def start(self) -> None:
+        """Listen for clients"""
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port
+        )
+
+    async def run(self, duration: Optional[float] = None) -> None:
+        """Listen and tick every game at the tick rate
+
+        Args:
+            duration (Optional[float], optional): seconds to run for. Defaults to None (forever).
+        """
+        if self.server is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        end = None if duration is None else loop.time() + duration
+        next_tick = loop.time()
+        while end is None or next_tick < end:
+            start = time.perf_counter()
+            # a copy, failing sessions are removed while ticking
+            for session in list(self.sessions):
+                if session.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                    # too slow to follow, drop it instead of buffering without end,
+                    # aborting since closing would wait for the buffer to drain
+                    self.sessions.remove(session)
+                    session.writer.transport.abort()
+                    continue
+                try:
+                    session.tick(interval)
+                except Exception:
+                    # a bug in one game must not stop the games of everyone else
+                    traceback.print_exc()
+                    self.sessions.remove(session)
+                    session.writer.close()
+            self.tick_times.append(time.perf_counter() - start)
+
+            # fixed rate: late ticks are not made up for, the schedule moves on
+            next_tick = max(next_tick + interval, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class MirrorGame:
+    def __init__(self):
+        """A client's copy of its game, rebuilt from snapshots and tick messages"""
+        self.cols = self.rows = self.cell_size = 0
+        self.tick = 0
+        self.score = 0
+        self.direction: Direction = "RIGHT"
+        self.snake: Deque[Position] = collections.deque()
+        self.snake_cells: Set[Position] = set()
+        self.foods: Dict[Position, Color] = {}
+        self.walls: Set[Position] = set()
+        self.game_over_code: Optional[int] = None
+
+    def apply(self, message: bytes) -> float:
+        """Apply a message of the server
+
+        Args:
+            message (bytes): a snapshot or tick message
+
+        Returns:
+            float: the server time the message was sent at
+        """
+        if message[0] == MSG_SNAPSHOT:
+            return self.apply_snapshot(message)
+        return self.apply_tick(message)
+
+    def apply_snapshot(self, message: bytes) -> float:
+        """Replace the game by a snapshot
+
+        Args:
+            message (bytes): the snapshot message
+
+        Returns:
+            float: the server time the message was sent at
+        """
+        offset = 1
+        self.cols, offset = read_varint(message, offset)
+        self.rows, offset = read_varint(message, offset)
+        self.cell_size, offset = read_varint(message, offset)
+        self.tick, sent = TICK_HEADER.unpack_from(message, offset)
+        offset += TICK_HEADER.size
+        self.score, offset = read_varint(message, offset)
+        self.direction = DIRECTIONS[message[offset]]
+        offset += 1
+
+        self.snake.clear()
+        length, offset = read_varint(message, offset)
+        for _ in range(length):
+            pos, offset = self.read_cell(message, offset)
+            offset += 3
+            self.snake.append(pos)
+        self.snake_cells = set(self.snake)
+
+        self.foods.clear()
+        count, offset = read_varint(message, offset)
+        for _ in range(count):
+            pos, offset = self.read_cell(message, offset)
+            self.foods[pos] = tuple(message[offset : offset + 3])
+            offset += 3
+
+        self.walls.clear()
+        count, offset = read_varint(message, offset)
+        for _ in range(count):
+            pos, offset = self.read_cell(message, offset)
+            self.add_wall(pos, message[offset])
+            offset += 1
+        self.game_over_code = None
+        return sent
+
+    def apply_tick(self, message: bytes) -> float:
+        """Apply the changes of one tick
+
+        Args:
+            message (bytes): the tick message
+
+        Returns:
+            float: the server time the message was sent at
+        """
+        self.tick, sent = TICK_HEADER.unpack_from(message, 1)
+        offset = 1 + TICK_HEADER.size
+        flags = message[offset]
+        offset += 1
+
+        # a snake that died on the border keeps its body as it was
+        if not flags & TICK_HEAD_OFF_BOARD:
+            head, offset = self.read_cell(message, offset)
+            prev_col, prev_row = self.snake[-1]
+            self.direction = DIRECTION_OF_STEP.get(
+                (head[0] - prev_col, head[1] - prev_row), self.direction
+            )
+            if flags & TICK_TAIL_REMOVED:
+                self.snake_cells.discard(self.snake.popleft())
+            self.snake.append(head)
+            self.snake_cells.add(head)
+
+        count, offset = read_varint(message, offset)
+        for _ in range(count):
+            pos, offset = self.read_cell(message, offset)
+            del self.foods[pos]
+        count, offset = read_varint(message, offset)
+        for _ in range(count):
+            pos, offset = self.read_cell(message, offset)
+            self.foods[pos] = tuple(message[offset : offset + 3])
+            offset += 3
+        count, offset = read_varint(message, offset)
+        for _ in range(count):
+            pos, offset = self.read_cell(message, offset)
+            self.add_wall(pos, message[offset])
+            offset += 1
+
+        if flags & TICK_GAME_OVER:
+            self.game_over_code, offset = read_varint(message, offset)
+            self.score, offset = read_varint(message, offset)
+        return sent
+
+    def read_cell(self, message: bytes, offset: int) -> Tuple[Position, int]:
+        """Read the column and row of a cell"""
+        col, offset = read_varint(message, offset)
+        row, offset = read_varint(message, offset)
+        return (col, row), offset
+
+    def add_wall(self, pos: Position, vertical: int) -> None:
+        """Take the cells of a wall of the default length"""
+        col, row = pos
+        for i in range(5):
+            self.walls.add((col, row + i) if vertical else (col + i, row))
+
+    def safe_turn(self, rng: random.Random) -> Optional[Direction]:
+        """Pick a random direction that doesn't hit anything on the next tick
+
+        Args:
+            rng (random.Random): the random generator
+
+        Returns:
+            Optional[Direction]: the direction, None to keep going
+        """
+        if not self.snake:
+            return None
+        col, row = self.snake[-1]
+        directions = []
+        for direction, (dc, dr) in DIRECTION_DELTA.items():
+            cell = (col + dc, row + dr)
+            if (
+                direction != OPPOSITE_DIRECTION[self.direction]
+                and 0 <= cell[0] < self.cols
+                and 0 <= cell[1] < self.rows
+                and cell not in self.snake_cells
+                and cell not in self.walls
+            ):
+                directions.append(direction)
+        if self.direction in directions and rng.random() < 0.8:
+            return None
+        return rng.choice(directions) if directions else None
+
+
+async def run_client(
+    host: str, port: int, duration: float, seed: int, stats: Dict[str, List[float]]
+) -> None:
+    """Headless client mirroring its game and steering at random, for load tests
+
+    Args:
+        host (str): address of the server
+        port (int): port of the server
+        duration (float): seconds to play
+        seed (int): seed of the steering
+        stats (Dict[str, List[float]]): collects "latency" (s) per message and "bytes" per client
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    game = MirrorGame()
+    received = 0
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    try:
+        while loop.time() < end:
+            try:
+                message = await asyncio.wait_for(read_frame(reader), end - loop.time())
+            except asyncio.TimeoutError:
+                break
+            received += len(message) + 1
+            sent = game.apply(message)
+            stats["latency"].append(time.time() - sent)
+
+            direction = game.safe_turn(rng)
+            if direction is not None:
+                game.direction = direction
+                writer.write(
+                    encode_frame(bytearray([MSG_TURN, DIRECTION_CODE[direction]]))
+                )
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        stats["bytes"].append(received)
+        writer.close()
+
+
+async def load_test(args: argparse.Namespace) -> None:
+    """Run a server and many clients in this process and print their statistics
+
+    Args:
+        args (argparse.Namespace): parsed command line
+    """
+    server = GameServer(args.host, args.port, args.tick_rate)
+    await server.start()
+    server_task = asyncio.create_task(server.run(args.duration + 1))
+
+    stats: Dict[str, List[float]] = {"latency": [], "bytes": []}
+    await asyncio.gather(
+        *(
+            run_client(args.host, args.port, args.duration, i, stats)
+            for i in range(args.clients)
+        )
+    )
+    await server_task
+
+    latency = sorted(stats["latency"])
+    tick_times = sorted(server.tick_times)
+    print(f"{args.clients} clients, {args.tick_rate} ticks/s, {args.duration}s")
+    if latency:
+        print(
+            f"latency: p50 {latency[len(latency) // 2] * 1000:.2f} ms, "
+            f"p99 {latency[int(len(latency) * 0.99)] * 1000:.2f} ms"
+        )
+    if tick_times:
+        print(
+            f"server tick of all games: p50 {tick_times[len(tick_times) // 2] * 1000:.2f} ms, "
+            f"p99 {tick_times[int(len(tick_times) * 0.99)] * 1000:.2f} ms"
+        )
+    if stats["bytes"]:
+        print(
+            "bandwidth per client: "
+            f"{sum(stats['bytes']) / len(stats['bytes']) / args.duration:.0f} B/s"
+        )
+
+
+def main() -> None:
+    """Run the server or a load test from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Run the game server, or load test it with headless clients."
+    )
+    parser.add_argument("mode", choices=["server", "loadtest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE)
+    parser.add_argument(
+        "--clients", type=int, default=100, help="clients of the load test"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds of the load test"
+    )
+    args = parser.parse_args()
+
+    if args.mode == "server":
+        asyncio.run(GameServer(args.host, args.port, args.tick_rate).run())
+    else:
+        asyncio.run(load_test(args))
+
+
+if __name__ == "__main__":
+    main()
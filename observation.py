@@ -0,0 +1,315 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict
+import numpy as np
+
+from engine import GameState
+from food import Food
+from grid import OccupancyGrid
+from wall import Wall
+from type_alias import *
+
+# channels of the observations
+CHANNEL_BODY, CHANNEL_HEAD, CHANNEL_FOOD, CHANNEL_WALL = range(4)
+
+
+class ObservationEncoder:
+    def __init__(self, crop: Optional[int] = None):
+        """Board of a game as channels of a preallocated NumPy buffer, for agents
+
+        The channels, in int32, with the same order but not the same values as
+        vec_env.VecSnakeEnv.observe:
+        - CHANNEL_BODY: ticks until the cell is left, 1 at the tail up to the
+          length of the snake at the head, for every snake;
+        - CHANNEL_HEAD: 1 on the head of every snake;
+        - CHANNEL_FOOD: score // 10, the tier of the food;
+        - CHANNEL_WALL: 1 on walls, and on the border around the board.
+
+        The buffer is updated from one tick to the next instead of being built
+        again, writing only the cells that changed: the heads, the food eaten and
+        spawned and the new walls. Only the body values of a moving snake change
+        everywhere, as every segment gets a tick closer to being left: the cells
+        of every snake are kept in a ring, tail first, and a snake that moves
+        lowers them by one in a single vectorized subtraction, which clears its
+        tail. That costs the length of the snake, never the size of the board.
+
+        Snakes only overlap where a head killed them. There a body shows over
+        the heads that entered it, and a head hidden that way shows once the body
+        left the cell. Among heads on one cell the longest snake shows, then the
+        first player.
+
+        The observations are read-only views of the buffer, valid until the next
+        update. Per tick, only the cells of the moving snakes are gathered into
+        a temporary array.
+
+        Args:
+            crop (Optional[int], optional): side of the crop around the head returned by observe_egocentric (cells), odd. Defaults to None (full board only).
+        """
+        if crop is not None and crop % 2 == 0:
+            raise ValueError(f"Invalid crop {crop}. Must be odd.")
+        self.crop = crop
+        # cells of border around the board, so that any crop is a slice
+        self.pad = 0 if crop is None else crop // 2
+
+        self.grid: Optional[OccupancyGrid] = None
+        self.seed: Optional[int] = None
+        self.ticks = -1
+        self.walls: List[Wall] = []
+        # number of food in the list of the controller at the last update
+        self.food_cnt = 0
+        # cell of the head and length of every snake
+        self.heads: List[int] = []
+        self.lengths: List[int] = []
+        # flat indexes of the cells of every snake in a plane, tail first, in a
+        # ring of counts[player] cells starting at starts[player]
+        self.rings: List[np.ndarray] = []
+        self.starts: List[int] = []
+        self.counts: List[int] = []
+        # heads under a body by cell, as (length, -player) of the one to show
+        self.hidden: Dict[int, Tuple[int, int]] = {}
+
+    def __allocate(self, grid: OccupancyGrid) -> None:
+        """Allocate the buffers of a board"""
+        self.grid = grid
+        rows, cols, pad = grid.rows, grid.cols, self.pad
+        self.buffer = np.zeros((4, rows + 2 * pad, cols + 2 * pad), dtype=np.int32)
+        inner = (slice(pad, pad + rows), slice(pad, pad + cols))
+        self.board = self.buffer[(slice(None),) + inner]
+        # the channels as flat views, indexed by __flat
+        self.planes = self.buffer.reshape(4, -1)
+        self.body = self.planes[CHANNEL_BODY]
+
+        # snake whose body value each cell shows
+        self.owner = [0] * (rows * cols)
+
+        self.view = self.board.view()
+        self.view.flags.writeable = False
+
+    def __flat(self, idx: int) -> int:
+        """Get the index of a cell of the grid in a plane of the padded buffer"""
+        row, col = divmod(idx, self.grid.cols)
+        return (row + self.pad) * (self.grid.cols + 2 * self.pad) + col + self.pad
+
+    def __set(self, channel: int, idx: int, value: int) -> None:
+        """Write a cell of a channel"""
+        self.planes[channel, self.__flat(idx)] = value
+
+    def build(self, state: GameState) -> None:
+        """Encode a game from scratch
+
+        Args:
+            state (GameState): the game
+        """
+        grid = state.grid
+        if grid is not self.grid:
+            self.__allocate(grid)
+
+        self.buffer[:] = 0
+        # the border reads as walls
+        self.buffer[CHANNEL_WALL] = 1
+        self.board[CHANNEL_WALL] = 0
+
+        self.seed = state.seed
+        self.ticks = state.ticks
+        self.walls = []
+        self.food_cnt = 0
+        self.heads = []
+        self.lengths = []
+        self.rings = []
+        self.starts = []
+        self.counts = []
+        self.hidden = {}
+
+        heads = []
+        for player, snake in enumerate(state.snakes):
+            length = snake.get_length()
+            self.rings.append(np.zeros(max(16, 2 * length), dtype=np.int64))
+            self.starts.append(0)
+            self.counts.append(0)
+            self.lengths.append(length)
+            # the body first, the heads go on top where no body is
+            cells = [grid.index(pos) for pos in snake.get_all_pos()]
+            for value, idx in enumerate(cells[:-1], 1):
+                if idx >= 0:
+                    self.__push(player, idx)
+                    self.__set(CHANNEL_BODY, idx, value)
+                    self.owner[idx] = player
+            self.heads.append(cells[-1])
+            heads.append((player, cells[-1], length))
+
+        for player, head, length in heads:
+            if head >= 0:
+                self.__push(player, head)
+                self.__set(CHANNEL_HEAD, head, 1)
+                self.__place_head(player, head, length)
+
+        self.__update_walls(state.wall_controller.walls)
+        for food in state.food_controller.get_food():
+            self.__add_food(food)
+        self.food_cnt = state.food_controller.count()
+
+    def update(self, state: GameState) -> None:
+        """Bring the buffer up to date with the game, incrementally after a single tick
+
+        Args:
+            state (GameState): the game
+        """
+        walls = state.wall_controller.walls
+        known = len(self.walls)
+        if state.grid is self.grid and state.seed == self.seed:
+            if state.ticks == self.ticks:
+                return
+            incremental = (
+                state.ticks == self.ticks + 1
+                and len(walls) >= known
+                and all(walls[i] is self.walls[i] for i in range(known))
+            )
+        else:
+            incremental = False
+        if not incremental:
+            # another game, a reset, a removed wall or skipped ticks
+            self.build(state)
+            return
+        self.ticks = state.ticks
+
+        # every snake moves before any head is written, as in MultiGameState.step,
+        # so a head may enter the cell a tail left in the same tick
+        grid = self.grid
+        eaten = 0
+        moved = []
+        for player, snake in enumerate(state.snakes):
+            head = grid.index(snake.get_head_pos())
+            length = snake.get_length()
+            if head == self.heads[player] and length == self.lengths[player]:
+                # a dead snake stays as it is
+                continue
+            if length == self.lengths[player]:
+                self.__shift(player)
+            elif self.heads[player] >= 0:
+                # the snake grew from the food under its head
+                self.__set(CHANNEL_FOOD, self.heads[player], 0)
+                eaten += 1
+            if self.heads[player] >= 0:
+                self.__set(CHANNEL_HEAD, self.heads[player], 0)
+            self.heads[player] = head
+            self.lengths[player] = length
+            moved.append(player)
+
+        if self.hidden:
+            body = self.body
+            for idx in [idx for idx in self.hidden if not body[self.__flat(idx)]]:
+                # the body left, the head under it shows
+                length, neg_player = self.hidden.pop(idx)
+                self.__place_head(-neg_player, idx, length)
+
+        for player in moved:
+            head = self.heads[player]
+            if head >= 0:
+                self.__push(player, head)
+                self.__set(CHANNEL_HEAD, head, 1)
+                self.__place_head(player, head, self.lengths[player])
+
+        self.__update_walls(walls[known:])
+
+        # the controller removes food by moving its last one in its place and adds
+        # food at the end, the food after the ones left is new
+        foods = state.food_controller.get_food()
+        for i in range(self.food_cnt - eaten, len(foods)):
+            self.__add_food(foods[i])
+        self.food_cnt = len(foods)
+
+    def __push(self, player: int, idx: int) -> None:
+        """Append a cell to the ring of a snake, doubling the ring when full"""
+        ring = self.rings[player]
+        start, count = self.starts[player], self.counts[player]
+        if count == len(ring):
+            grown = np.zeros(2 * len(ring), dtype=np.int64)
+            grown[: count - start] = ring[start:]
+            grown[count - start : count] = ring[:start]
+            ring = self.rings[player] = grown
+            start = self.starts[player] = 0
+        ring[(start + count) % len(ring)] = self.__flat(idx)
+        self.counts[player] = count + 1
+
+    def __shift(self, player: int) -> None:
+        """Lower the body of a snake that moved by one, which clears its tail"""
+        ring = self.rings[player]
+        start, count = self.starts[player], self.counts[player]
+        if not count:
+            return
+        # the cells of a snake are distinct, so a fancy index subtraction is exact
+        end = start + count
+        if end <= len(ring):
+            self.body[ring[start:end]] -= 1
+        else:
+            self.body[ring[start:]] -= 1
+            self.body[ring[: end - len(ring)]] -= 1
+        self.starts[player] = (start + 1) % len(ring)
+        self.counts[player] = count - 1
+
+    def __place_head(self, player: int, idx: int, length: int) -> None:
+        """Write the body value of a head, unless the cell shows a body or a longer head"""
+        flat = self.__flat(idx)
+        shown = self.body[flat]
+        if shown:
+            other = self.owner[idx]
+            is_head = self.heads[other] == idx and shown == self.lengths[other]
+            if not is_head or (length, -player) <= (shown, -other):
+                if (length, -player) > self.hidden.get(idx, (0, 0)):
+                    self.hidden[idx] = (length, -player)
+                return
+        self.body[flat] = length
+        self.owner[idx] = player
+
+    def __update_walls(self, walls: List[Wall]) -> None:
+        """Write new walls"""
+        grid = self.grid
+        for wall in walls:
+            self.walls.append(wall)
+            for pos in wall.get_collision_detect_pos():
+                idx = grid.index(pos)
+                if idx >= 0:
+                    self.__set(CHANNEL_WALL, idx, 1)
+
+    def __add_food(self, food: Food) -> None:
+        """Write a food"""
+        idx = self.grid.index(food.get_pos())
+        if idx >= 0:
+            self.__set(CHANNEL_FOOD, idx, food.get_score() // 10)
+
+    def observe(self, state: GameState) -> np.ndarray:
+        """Get the whole board
+
+        Args:
+            state (GameState): the game, updated every tick for the update to be incremental
+
+        Returns:
+            np.ndarray: int32 (4, rows, cols), read-only view of the buffer
+        """
+        self.update(state)
+        return self.view
+
+    def observe_egocentric(self, state: GameState, player: int = 0) -> np.ndarray:
+        """Get the cells around the head of a snake, the border reads as walls
+
+        Args:
+            state (GameState): the game, updated every tick for the update to be incremental
+            player (int, optional): index of the snake. Defaults to 0.
+
+        Raises:
+            ValueError: if the encoder was built without a crop
+
+        Returns:
+            np.ndarray: int32 (4, crop, crop) centered on the head, read-only view of the buffer
+        """
+        if self.crop is None:
+            raise ValueError("The encoder was built without a crop.")
+        self.update(state)
+
+        grid = self.grid
+        head_x, head_y = state.snakes[player].get_head_pos()
+        # a head out of the board is shown at the closest cell of the border
+        col = min(max(head_x // grid.cell_size, 0), grid.cols - 1)
+        row = min(max(head_y // grid.cell_size, 0), grid.rows - 1)
+        # the crop of the padded buffer starting at the head is centered on it
+        view = self.buffer[:, row : row + self.crop, col : col + self.crop]
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,203 @@
+from typing import List, Tuple, Union, Literal, Optional
+from array import array
+import functools
+import math
+import random
+
+from grid import OccupancyGrid
+from type_alias import *
+
+# resolution of the per axis weights, the weight of a cell is the product of two of them
+WEIGHT_SCALE = 1 << 20
+
+# draws in a row a controller may reject before it gives up placing an entity
+MAX_PLACEMENT_ATTEMPTS = 100
+
+
+class PlacementError(Exception):
+    """Raised when a new food or wall could not be placed
+
+    A controller gives up after MAX_PLACEMENT_ATTEMPTS rejected draws, which does
+    not mean the board is full: a wall of several cells may still fit elsewhere.
+    """
+
+
+class BoardFullError(PlacementError):
+    """Raised when there is no free cell left on the board"""
+
+
+def axis_weights(
+    size: int, cells: int, cell_size: int, std_dev_factor: float
+) -> List[int]:
+    """Integer weights of the cells along one axis, matching utils.generate_position
+
+    generate_position draws a clamped normal sample and rounds it down to the cell,
+    so a cell weighs the normal probability mass over its span, and the first and
+    last cells also take the tails. Every cell weighs at least 1 so that any free
+    cell can still be drawn.
+
+    Args:
+        size (int): size of the board along the axis (px)
+        cells (int): number of cells along the axis
+        cell_size (int): size of a cell (px)
+        std_dev_factor (float): the standard deviation factor for the normal distribution
+
+    Returns:
+        List[int]: weight of each cell
+    """
+    mean = size / 2
+    std_dev = size * std_dev_factor
+
+    def cdf(x: float) -> float:
+        return 0.5 * (1 + math.erf((x - mean) / (std_dev * math.sqrt(2))))
+
+    weights = []
+    for cell in range(cells):
+        low = 0.0 if cell == 0 else cdf(cell * cell_size)
+        high = 1.0 if cell == cells - 1 else cdf((cell + 1) * cell_size)
+        weights.append(max(1, round((high - low) * WEIGHT_SCALE)))
+    return weights
+
+
+@functools.lru_cache(maxsize=8)
+def empty_board_tree(
+    width: int, height: int, cell_size: int, std_dev_factor: float
+) -> Tuple[array, array, int]:
+    """Cell weights and Fenwick tree of an empty board, cached since every game starts from one
+
+    Args:
+        width (int): width of the board (px)
+        height (int): height of the board (px)
+        cell_size (int): size of a cell (px)
+        std_dev_factor (float): the standard deviation factor for the normal distribution
+
+    Returns:
+        Tuple[array, array, int]: weight of each cell, Fenwick tree (1-based), total weight
+    """
+    weights_x = axis_weights(width, width // cell_size, cell_size, std_dev_factor)
+    weights_y = axis_weights(height, height // cell_size, cell_size, std_dev_factor)
+    weights = array("q", (wy * wx for wy in weights_y for wx in weights_x))
+
+    size = len(weights)
+    tree = array("q", bytes(8 * (size + 1)))
+    for i in range(1, size + 1):
+        tree[i] += weights[i - 1]
+        parent = i + (i & -i)
+        if parent <= size:
+            tree[parent] += tree[i]
+
+    return weights, tree, sum(weights)
+
+
+class FreeCellSampler:
+    def __init__(
+        self,
+        grid: OccupancyGrid,
+        std_dev_factor: float = 0.15,
+        rng: Optional[random.Random] = None,
+    ):
+        """Draws free cells of a board with the Gaussian bias of utils.generate_position
+
+        The weights of the free cells live in a Fenwick tree which follows the
+        occupancy grid through its listeners, so a draw is O(log cells) however
+        full the board is, instead of an unbounded rejection loop.
+
+        Args:
+            grid (OccupancyGrid): occupancy grid of the board
+            std_dev_factor (float, optional): the standard deviation factor for the normal distribution. Defaults to 0.15.
+            rng (Optional[random.Random], optional): the random generator. Defaults to None (the global random module).
+        """
+        self.grid = grid
+        self.std_dev_factor = std_dev_factor
+        self.rng = random if rng is None else rng
+        self.build()
+
+        grid.listeners.append(self.on_cell_change)
+
+    def build(self) -> None:
+        """Rebuild the Fenwick tree from the grid"""
+        grid = self.grid
+        self.weights, tree, self.total = empty_board_tree(
+            grid.width, grid.height, grid.cell_size, self.std_dev_factor
+        )
+        self.tree = array("q", tree)
+        self.size = len(self.weights)
+        self.top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+        if grid.free_cnt < self.size:
+            for idx, cnt in enumerate(grid.taken):
+                if cnt:
+                    self.on_cell_change(idx, True)
+
+    def copy(
+        self, grid: OccupancyGrid, rng: Optional[random.Random] = None
+    ) -> "FreeCellSampler":
+        """Get a sampler of a copy of the grid, without rebuilding the tree
+
+        Args:
+            grid (OccupancyGrid): the copy of the grid, see OccupancyGrid.copy
+            rng (Optional[random.Random], optional): the random generator of the copy. Defaults to None (the generator of this sampler).
+
+        Returns:
+            FreeCellSampler: the copy, following the grid copy
+        """
+        sampler = FreeCellSampler.__new__(FreeCellSampler)
+        sampler.__dict__.update(self.__dict__)
+        sampler.grid = grid
+        if rng is not None:
+            sampler.rng = rng
+        # the weights are shared, they never change
+        sampler.tree = self.tree[:]
+
+        grid.listeners.append(sampler.on_cell_change)
+        return sampler
+
+    def on_cell_change(self, idx: int, taken: bool) -> None:
+        """Grid listener, removes or restores the weight of a cell
+
+        Args:
+            idx (int): index of the cell
+            taken (bool): whether the cell has just been taken or freed
+        """
+        delta = -self.weights[idx] if taken else self.weights[idx]
+        self.total += delta
+
+        tree, size = self.tree, self.size
+        i = idx + 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def count(self) -> int:
+        """Get the number of free cells
+
+        Returns:
+            int: number of free cells
+        """
+        return self.grid.free_cnt
+
+    def sample(self) -> Position:
+        """Draw a free cell
+
+        Raises:
+            BoardFullError: if no cell is free
+
+        Returns:
+            Position: position of the cell (px)
+        """
+        if self.grid.free_cnt == 0:
+            raise BoardFullError("No free cell left on the board")
+
+        # find the cell where the running sum of weights passes the target
+        target = self.rng.randrange(self.total)
+        tree, size = self.tree, self.size
+        idx = 0
+        bit = self.top_bit
+        while bit:
+            nxt = idx + bit
+            if nxt <= size and tree[nxt] <= target:
+                target -= tree[nxt]
+                idx = nxt
+            bit >>= 1
+
+        return self.grid.position(idx)
@@ -0,0 +1,101 @@
+from typing import List, Tuple, Union, Literal, Optional, Callable, Dict
+import importlib
+import random
+
+from autopilot import Autopilot
+from engine import GameState, OPPOSITE_DIRECTION
+from grid import SNAKE, FOOD, WALL
+from hamilton import HamiltonianSolver
+from snake import DIRECTION_DELTA
+from type_alias import *
+
+# a policy picks the action of the next tick, None keeps the current direction
+Policy = Callable[[GameState], Optional[Direction]]
+
+
+def safe_directions(state: GameState) -> List[Direction]:
+    """Get the directions that don't hit the border, a wall or the body on the next tick
+
+    Args:
+        state (GameState): the game
+
+    Returns:
+        List[Direction]: the safe directions, possibly empty
+    """
+    grid = state.grid
+    snake = state.snake
+    head_x, head_y = snake.get_head_pos()
+    # the tail moves away in the same tick, unless the head is on food and the snake grows
+    tail_pos = None if grid.count(FOOD, snake.get_head_pos()) else snake.get_tail_pos()
+
+    directions = []
+    for direction, (dx, dy) in DIRECTION_DELTA.items():
+        if direction == OPPOSITE_DIRECTION[snake.get_direction()]:
+            continue
+        pos = (head_x + dx * grid.cell_size, head_y + dy * grid.cell_size)
+        if grid.index(pos) < 0 or grid.count(WALL, pos):
+            continue
+        if grid.count(SNAKE, pos) and pos != tail_pos:
+            continue
+        directions.append(direction)
+    return directions
+
+
+def straight_policy(state: GameState) -> Optional[Direction]:
+    """Never turn"""
+    return None
+
+
+def random_policy(state: GameState) -> Optional[Direction]:
+    """Turn to a random safe direction, or keep going when none is safe"""
+    directions = safe_directions(state)
+    return random.choice(directions) if directions else None
+
+
+def greedy_policy(state: GameState) -> Optional[Direction]:
+    """Turn to the safe direction closest to the nearest food"""
+    directions = safe_directions(state)
+    if not directions:
+        return None
+
+    cell_size = state.grid.cell_size
+    head_x, head_y = state.snake.get_head_pos()
+    foods = state.food_controller.get_pos()
+    if not foods:
+        return directions[0]
+
+    def distance(direction: Direction) -> int:
+        dx, dy = DIRECTION_DELTA[direction]
+        x, y = head_x + dx * cell_size, head_y + dy * cell_size
+        return min(abs(x - fx) + abs(y - fy) for fx, fy in foods)
+
+    return min(directions, key=distance)
+
+
+POLICIES: Dict[str, Policy] = {
+    "straight": straight_policy,
+    "random": random_policy,
+    "greedy": greedy_policy,
+    # without a time budget, so that a seed always plays the same game
+    "autopilot": Autopilot(budget=None),
+    "hamilton": HamiltonianSolver(),
+}
+
+
+def get_policy(name: str) -> Policy:
+    """Get a policy by name, or import it from "module:function"
+
+    Args:
+        name (str): name of a built-in policy or "module:function"
+
+    Returns:
+        Policy: the policy
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    if ":" not in name:
+        raise ValueError(
+            f"Unknown policy {name!r}. Must be one of {sorted(POLICIES)} or 'module:function'."
+        )
+    module_name, attr = name.split(":", 1)
+    return getattr(importlib.import_module(module_name), attr)
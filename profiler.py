@@ -0,0 +1,188 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Deque, TYPE_CHECKING
+import collections
+import time
+
+from colors import *
+from type_alias import *
+
+if TYPE_CHECKING:
+    import pygame
+
+# phases of a frame of main.game_loop, in order: "update" is the input and tick
+# scheduling, "move", "collision" and "spawn" are marked by GameState.step
+FRAME_PHASES = [
+    "events",
+    "update",
+    "move",
+    "collision",
+    "spawn",
+    "info",
+    "render",
+    "wait",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Get a percentile by the nearest rank
+
+    Args:
+        sorted_values (List[float]): the values, sorted ascending and not empty
+        q (float): the percentile, between 0 and 100
+
+    Returns:
+        float: the value below which q percent of the values fall
+    """
+    rank = min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))
+    return sorted_values[rank]
+
+
+class FrameProfiler:
+    def __init__(
+        self,
+        phases: List[str] = FRAME_PHASES,
+        window: int = 240,
+        dump_path: Optional[str] = None,
+        enabled: bool = True,
+    ):
+        """Timer of the phases of every frame
+
+        A frame is opened with `start_frame`, every `mark` closes the phase that ran
+        since the previous mark and `end_frame` stores the frame. Only perf_counter
+        calls and appends happen per frame, the percentiles are computed when the
+        overlay is refreshed.
+
+        Args:
+            phases (List[str], optional): names of the phases, in order. Defaults to FRAME_PHASES.
+            window (int, optional): number of recent frames the statistics cover. Defaults to 240.
+            dump_path (Optional[str], optional): CSV file to write the timings of every frame to. Defaults to None.
+            enabled (bool, optional): whether to time anything, a disabled profiler costs a method call per mark. Defaults to True.
+        """
+        self.phases = phases
+        self.enabled = enabled
+        self.frame = 0
+        self.times: Dict[str, Deque[float]] = {
+            phase: collections.deque(maxlen=window) for phase in phases
+        }
+        self.frame_times: Deque[float] = collections.deque(maxlen=window)
+
+        self.current: Dict[str, float] = {}
+        self.frame_start = 0.0
+        self.last_mark = 0.0
+
+        self.dump_file = None
+        if enabled and dump_path is not None:
+            self.dump_file = open(dump_path, "w")
+            self.dump_file.write(",".join(["frame", *phases, "total"]) + "\n")
+
+        # overlay text, refreshed a few times per second to stay readable
+        self.overlay_lines: List[str] = []
+        self.overlay_updated = 0.0
+
+    def start_frame(self) -> None:
+        """Start timing a new frame"""
+        if not self.enabled:
+            return
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current = dict.fromkeys(self.phases, 0.0)
+
+    def mark(self, phase: str) -> None:
+        """Attribute the time since the previous mark to a phase
+
+        Args:
+            phase (str): the phase that just ended
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self) -> None:
+        """Store the timings of the frame"""
+        if not self.enabled:
+            return
+        total = self.last_mark - self.frame_start
+        for phase, seconds in self.current.items():
+            self.times[phase].append(seconds)
+        self.frame_times.append(total)
+
+        if self.dump_file is not None:
+            self.dump_file.write(
+                f"{self.frame},"
+                + ",".join(f"{self.current[phase] * 1000:.4f}" for phase in self.phases)
+                + f",{total * 1000:.4f}\n"
+            )
+        self.frame += 1
+
+    def stats(self) -> Dict[str, Tuple[float, float]]:
+        """Get the p50 and p99 of every phase over the window, in milliseconds
+
+        Returns:
+            Dict[str, Tuple[float, float]]: p50 and p99 per phase, and of the whole frame as "total"
+        """
+        stats = {}
+        for phase, values in [*self.times.items(), ("total", self.frame_times)]:
+            if values:
+                values = sorted(values)
+                stats[phase] = (
+                    percentile(values, 50) * 1000,
+                    percentile(values, 99) * 1000,
+                )
+        return stats
+
+    def fps(self) -> float:
+        """Get the frames per second over the window
+
+        Returns:
+            float: the mean frame rate
+        """
+        total = sum(self.frame_times)
+        return len(self.frame_times) / total if total > 0 else 0.0
+
+    def overlays(
+        self,
+        screen_size: Tuple[int, int],
+        snake_length: int,
+        refresh_interval: float = 0.5,
+        color: Color = GREEN,
+    ) -> List[Tuple["pygame.Surface", "pygame.Rect"]]:
+        """Render the statistics in the lower left corner, without drawing them
+
+        Args:
+            screen_size (Tuple[int, int]): the width and height of the screen
+            snake_length (int): the length of the snake
+            refresh_interval (float, optional): seconds between updates of the text. Defaults to 0.5.
+            color (Color, optional): color of the text. Defaults to GREEN.
+
+        Returns:
+            List[Tuple[pygame.Surface, pygame.Rect]]: the text surfaces and where to blit them
+        """
+        if not self.enabled:
+            return []
+        from fonts import render_text
+
+        now = time.perf_counter()
+        if now - self.overlay_updated >= refresh_interval:
+            self.overlay_updated = now
+            self.overlay_lines = [
+                f"{self.fps():.0f} fps, length {snake_length}",
+                *(
+                    f"{phase}: p50 {p50:.2f} ms, p99 {p99:.2f} ms"
+                    for phase, (p50, p99) in self.stats().items()
+                ),
+            ]
+
+        overlays = []
+        bottom = screen_size[1] - 10
+        for line in reversed(self.overlay_lines):
+            surface = render_text(line, 16, color)
+            rect = surface.get_rect(bottomleft=(10, bottom))
+            overlays.append((surface, rect))
+            bottom -= rect.height
+        return overlays
+
+    def close(self) -> None:
+        """Close the dump file"""
+        if self.dump_file is not None:
+            self.dump_file.close()
+            self.dump_file = None
@@ -0,0 +1,495 @@
+from typing import List, Tuple, Union, Literal, Optional, Set, Dict, TYPE_CHECKING
+import itertools
+import pygame
+
+from camera import Camera
+from colors import *
+from engine import GameState
+from grid import FOOD, WALL
+from snake import Snake
+from type_alias import *
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# a text surface and where to blit it, drawn on top of the board
+Overlay = Tuple[pygame.Surface, pygame.Rect]
+
+# share of the screen above which DirtyRectRenderer flips instead of updating rects
+FLIP_AREA_FRACTION = 0.5
+
+
+def draw_board(screen: pygame.Surface, state: GameState) -> None:
+    """Draw the food, walls and snakes of a game in the original order
+
+    Args:
+        screen (pygame.Surface): the surface to draw on
+        state (GameState): the game to draw
+    """
+    state.food_controller.draw(screen=screen)
+    state.wall_controller.draw(screen=screen)
+    for snake in state.snakes:
+        snake.draw(screen=screen)
+
+
+class FullRenderer:
+    def __init__(self, screen: pygame.Surface, background: Color = BLACK):
+        """Renderer clearing and redrawing the whole screen every frame
+
+        Args:
+            screen (pygame.Surface): the display surface
+            background (Color, optional): color of the empty cells. Defaults to BLACK.
+        """
+        self.screen = screen
+        self.background = background
+
+        # what the last frame showed, to skip frames without any change
+        self.state: Optional[GameState] = None
+        self.rendered_tick = -1
+        self.prev_overlays: List[Overlay] = []
+
+    def invalidate(self) -> None:
+        """Request a redraw on the next frame, e.g. when the window was exposed"""
+        self.state = None
+
+    def render(self, state: GameState, overlays: List[Overlay]) -> None:
+        """Draw a frame and show it, unless nothing changed since the last one
+
+        Args:
+            state (GameState): the game to draw
+            overlays (List[Overlay]): text drawn on top of the board
+        """
+        if (
+            state is self.state
+            and state.ticks == self.rendered_tick
+            and overlays == self.prev_overlays
+        ):
+            return
+        self.state = state
+        self.rendered_tick = state.ticks
+        self.prev_overlays = list(overlays)
+
+        self.clear(state)
+        self.draw(state)
+        for surface, rect in overlays:
+            self.screen.blit(surface, rect)
+        pygame.display.flip()
+
+    def clear(self, state: GameState) -> None:
+        """Fill the screen with the background before drawing the board
+
+        Args:
+            state (GameState): the game to draw
+        """
+        self.screen.fill(self.background)
+
+    def draw(self, state: GameState) -> None:
+        """Draw the board of a game on the cleared screen
+
+        Args:
+            state (GameState): the game to draw
+        """
+        draw_board(self.screen, state)
+
+
+class ViewportRenderer(FullRenderer):
+    def __init__(self, screen: pygame.Surface, background: Color = BLACK):
+        """Renderer of a board larger than the window, drawing only the part in view
+
+        The camera follows the head of the snake. Food and walls are looked up in the
+        chunks of their spatial indexes that the view overlaps, and snake blocks out of
+        view are skipped, so the drawing cost depends on the size of the window rather
+        than the size of the board.
+
+        Args:
+            screen (pygame.Surface): the display surface
+            background (Color, optional): color of the empty cells. Defaults to BLACK.
+        """
+        super().__init__(screen, background)
+        self.camera: Optional[Camera] = None
+
+    def draw(self, state: GameState) -> None:
+        """Draw the part of the board in view on the cleared screen
+
+        Args:
+            state (GameState): the game to draw
+        """
+        screen = self.screen
+        camera = self.camera
+        if camera is None or (camera.world_width, camera.world_height) != (
+            state.width,
+            state.height,
+        ):
+            camera = self.camera = Camera(
+                screen.get_width(), screen.get_height(), state.width, state.height
+            )
+        camera.follow(state.snake.get_head_pos(), state.cell_size)
+        left, top = camera.x, camera.y
+        is_visible = camera.is_visible
+        draw_rect = pygame.draw.rect
+
+        view = camera.get_rect()
+        for food in state.food_controller.get_in_rect(*view):
+            x, y = food.pos
+            if is_visible(x, y, food.width, food.height):
+                draw_rect(
+                    screen, food.color, (x - left, y - top, food.width, food.height)
+                )
+        for wall in state.wall_controller.get_in_rect(*view):
+            x, y = wall.pos
+            if is_visible(x, y, wall.width, wall.height):
+                draw_rect(
+                    screen, wall.color, (x - left, y - top, wall.width, wall.height)
+                )
+
+        for snake in state.snakes:
+            width, height = snake.block_width, snake.block_height
+            for (x, y), color in snake.iter_blocks():
+                if is_visible(x, y, width, height):
+                    draw_rect(screen, color, (x - left, y - top, width, height))
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen: pygame.Surface, background: Color = BLACK):
+        """Renderer drawing and uploading only the parts of the screen that changed
+
+        Cells that the snake, food or walls take or free are collected from the
+        occupancy grid of the game. The snake is always redrawn because its colors
+        flow along its body every tick. Overlays are restored only when their text
+        changes or something was drawn under them. Only these regions are passed to
+        pygame.display.update instead of flipping the whole window, each snake as
+        the single rect around it, and the window is flipped when they add up to
+        more than FLIP_AREA_FRACTION of it.
+
+        Args:
+            screen (pygame.Surface): the display surface
+            background (Color, optional): color of the empty cells. Defaults to BLACK.
+        """
+        self.screen = screen
+        self.background = background
+
+        self.state: Optional[GameState] = None
+        self.dirty_cells: Set[int] = set()
+        self.full_redraw = True
+        self.rendered_tick = -1
+        self.prev_overlays: List[Overlay] = []
+
+    def on_cell_change(self, idx: int, taken: bool) -> None:
+        """Grid listener, marks a cell for redrawing
+
+        Args:
+            idx (int): index of the cell
+            taken (bool): whether the cell has just been taken or freed
+        """
+        self.dirty_cells.add(idx)
+
+    def attach(self, state: GameState) -> None:
+        """Follow the grid of a (new) game, starting with a full redraw
+
+        Args:
+            state (GameState): the game to draw
+        """
+        if self.state is not None and self.on_cell_change in self.state.grid.listeners:
+            self.state.grid.listeners.remove(self.on_cell_change)
+        self.state = state
+        state.grid.listeners.append(self.on_cell_change)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Request a full redraw on the next frame, e.g. when the window was exposed"""
+        self.full_redraw = True
+
+    def _restore(self, area: pygame.Rect) -> None:
+        """Redraw the board inside an area, erasing what was drawn on top of it
+
+        Args:
+            area (pygame.Rect): the area to restore
+        """
+        self.screen.set_clip(area)
+        self.screen.fill(self.background)
+        draw_board(self.screen, self.state)
+        self.screen.set_clip(None)
+
+    def render(self, state: GameState, overlays: List[Overlay]) -> None:
+        """Draw a frame and show the parts that changed
+
+        Args:
+            state (GameState): the game to draw
+            overlays (List[Overlay]): text drawn on top of the board
+        """
+        if state is not self.state:
+            self.attach(state)
+
+        # frames are drawn more often than the game ticks, skip the ones without change
+        if (
+            not self.full_redraw
+            and state.ticks == self.rendered_tick
+            and overlays == self.prev_overlays
+        ):
+            return
+        self.rendered_tick = state.ticks
+
+        screen = self.screen
+        if self.full_redraw:
+            screen.fill(self.background)
+            draw_board(screen, state)
+            for surface, rect in overlays:
+                screen.blit(surface, rect)
+            pygame.display.flip()
+
+            self.dirty_cells.clear()
+            self.prev_overlays = list(overlays)
+            self.full_redraw = False
+            return
+
+        grid = state.grid
+        food_controller = state.food_controller
+        cell_size = grid.cell_size
+        rects = []
+
+        # cells taken or freed since the last frame
+        for idx in self.dirty_cells:
+            pos = grid.position(idx)
+            rect = pygame.Rect(pos[0], pos[1], cell_size, cell_size)
+            screen.fill(self.background, rect)
+            rects.append(rect)
+
+            if grid.layers[FOOD][idx]:
+                for food in food_controller.get_at_pos(pos):
+                    food.draw(screen)
+            if grid.layers[WALL][idx]:
+                for wall in state.wall_controller.get_at_pos(pos):
+                    wall.draw(screen)
+                    rects.append(
+                        pygame.Rect(wall.pos[0], wall.pos[1], wall.width, wall.height)
+                    )
+        self.dirty_cells.clear()
+
+        # the colors of the snakes move along their body every tick, each snake
+        # is uploaded as the one rect around its blocks
+        for snake in state.snakes:
+            width, height = snake.block_width, snake.block_height
+            blocks = [
+                pygame.draw.rect(screen, color, (pos[0], pos[1], width, height))
+                for pos, color in snake.iter_blocks()
+            ]
+            rects.append(blocks[0].unionall(blocks[1:]))
+
+        # overlays are restored when their text changed or the board was drawn over them
+        overlay_rects = [rect for _, rect in overlays]
+        prev_overlay_rects = [rect for _, rect in self.prev_overlays]
+        changed = [surface for surface, _ in overlays] != [
+            surface for surface, _ in self.prev_overlays
+        ] or overlay_rects != prev_overlay_rects
+        if changed or any(rect.collidelist(rects) != -1 for rect in prev_overlay_rects):
+            for rect in prev_overlay_rects:
+                self._restore(rect)
+            for surface, rect in overlays:
+                screen.blit(surface, rect)
+            rects.extend(prev_overlay_rects)
+            rects.extend(overlay_rects)
+        self.prev_overlays = list(overlays)
+
+        # past a point one upload of the whole window is cheaper than many rects
+        area = sum(rect.width * rect.height for rect in rects)
+        if area > FLIP_AREA_FRACTION * screen.get_width() * screen.get_height():
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+
+class PaletteRenderer(FullRenderer):
+    def __init__(self, screen: pygame.Surface, background: Color = BLACK):
+        """Renderer keeping the board as an 8-bit surface of one pixel per cell
+
+        Every color of the board gets an entry of the palette of the surface, the
+        colors of COLOR_LIST and of the food first. Cells that the food and walls
+        take or free are collected from the occupancy grid and written alone. The
+        colors of a snake flow along its body every tick, so every cell of every
+        snake changes and is written each frame, as one vectorized write of its
+        cells and palette entries from its position rings. The frame is then a
+        single conversion of the cells to the format of the screen and a scale
+        into the board area of the screen, which costs the same however long the
+        snakes get. The board must fit in the screen, see ViewportRenderer
+        otherwise.
+
+        Args:
+            screen (pygame.Surface): the display surface
+            background (Color, optional): color of the empty cells, palette entry 0. Defaults to BLACK.
+        """
+        super().__init__(screen, background)
+
+        # the game the cells follow, built again on the next frame when None
+        self.board_state: Optional[GameState] = None
+        self.dirty_cells: Set[int] = set()
+        self.palette: Dict[Color, int] = {}
+        # palette entry of every block of every snake, from the tail
+        self.snake_colors: List["np.ndarray"] = []
+
+    def on_cell_change(self, idx: int, taken: bool) -> None:
+        """Grid listener, marks a cell for writing
+
+        Args:
+            idx (int): index of the cell
+            taken (bool): whether the cell has just been taken or freed
+        """
+        self.dirty_cells.add(idx)
+
+    def invalidate(self) -> None:
+        """Request a full redraw on the next frame, e.g. when the window was exposed or the game restarted"""
+        super().invalidate()
+        self.board_state = None
+
+    def attach(self, state: GameState) -> None:
+        """Build the cells of a (new) game and follow its grid
+
+        Args:
+            state (GameState): the game to draw
+        """
+        if self.board_state is not None:
+            listeners = self.board_state.grid.listeners
+            if self.on_cell_change in listeners:
+                listeners.remove(self.on_cell_change)
+        self.board_state = state
+        grid = state.grid
+        if self.on_cell_change not in grid.listeners:
+            grid.listeners.append(self.on_cell_change)
+
+        self.cells = pygame.Surface((grid.cols, grid.rows), depth=8)
+        # the cells in the format of the screen, scaled straight into the board
+        # area of the screen
+        self.rgb_cells = pygame.Surface((grid.cols, grid.rows), 0, self.screen)
+        self.target = self.screen.subsurface(
+            (0, 0, grid.cols * grid.cell_size, grid.rows * grid.cell_size)
+        )
+        self.palette = {}
+        self.palette_entry(self.background)
+        for color in COLOR_LIST + list(state.food_controller.color_list):
+            self.palette_entry(color)
+
+        pixels = pygame.surfarray.pixels2d(self.cells)
+        pixels[:] = 0
+        for food in state.food_controller.get_food():
+            col, row = food.pos[0] // grid.cell_size, food.pos[1] // grid.cell_size
+            pixels[col, row] = self.palette_entry(food.color)
+        for wall in state.wall_controller.walls:
+            entry = self.palette_entry(wall.color)
+            for pos in wall.get_collision_detect_pos():
+                idx = grid.index(pos)
+                if idx >= 0:
+                    row, col = divmod(idx, grid.cols)
+                    pixels[col, row] = entry
+        del pixels
+        self.dirty_cells.clear()
+
+        self.snake_colors = [self.__entries(snake) for snake in state.snakes]
+
+    def __entries(self, snake: Snake, count: Optional[int] = None) -> "np.ndarray":
+        """Get the palette entries of the blocks of a snake from the tail, all or the first count"""
+        import numpy as np
+
+        blocks = snake.iter_blocks()
+        if count is not None:
+            blocks = itertools.islice(blocks, count)
+        return np.array(
+            [self.palette_entry(color) for _, color in blocks], dtype=np.uint8
+        )
+
+    def palette_entry(self, color: Color) -> int:
+        """Get the palette entry of a color, adding it to the palette if needed
+
+        Args:
+            color (Color): the color
+
+        Raises:
+            ValueError: if the 256 entries are taken
+
+        Returns:
+            int: the entry
+        """
+        color = tuple(color)
+        entry = self.palette.get(color)
+        if entry is None:
+            entry = len(self.palette)
+            if entry > 255:
+                raise ValueError("More than 256 colors on the board.")
+            self.palette[color] = entry
+            self.cells.set_palette_at(entry, color)
+        return entry
+
+    def clear(self, state: GameState) -> None:
+        """Fill only the screen around the board, the board is drawn over entirely
+
+        Args:
+            state (GameState): the game to draw
+        """
+        screen = self.screen
+        width = state.grid.cols * state.cell_size
+        height = state.grid.rows * state.cell_size
+        if width < screen.get_width():
+            screen.fill(self.background, (width, 0, screen.get_width() - width, height))
+        if height < screen.get_height():
+            screen.fill(
+                self.background,
+                (0, height, screen.get_width(), screen.get_height() - height),
+            )
+
+    def draw(self, state: GameState) -> None:
+        """Write the food and wall cells that changed and every snake cell, then draw them scaled to the board size
+
+        Args:
+            state (GameState): the game to draw
+        """
+        import numpy as np
+
+        if state is not self.board_state:
+            self.attach(state)
+
+        grid = state.grid
+        cell_size = grid.cell_size
+        pixels = pygame.surfarray.pixels2d(self.cells)
+
+        # food and walls from the grid, the snakes are written on top after
+        for idx in self.dirty_cells:
+            row, col = divmod(idx, grid.cols)
+            entry = 0
+            if grid.layers[WALL][idx]:
+                walls = state.wall_controller.get_at_pos(grid.position(idx))
+                entry = self.palette_entry(walls[-1].color)
+            elif grid.layers[FOOD][idx]:
+                foods = state.food_controller.get_at_pos(grid.position(idx))
+                entry = self.palette_entry(foods[-1].color)
+            pixels[col, row] = entry
+        self.dirty_cells.clear()
+
+        for player, snake in enumerate(state.snakes):
+            xs, ys, start, length = snake.get_rings()
+            colors = self.snake_colors[player]
+            grown = length - len(colors)
+            if grown > 0:
+                # the food colors of a growing snake are added at its tail
+                colors = np.concatenate([self.__entries(snake, grown), colors])
+                self.snake_colors[player] = colors
+            elif grown < 0:
+                # a new game
+                colors = self.snake_colors[player] = self.__entries(snake)
+
+            # a head out of the board after a collision with the border is not drawn
+            if grid.index(snake.get_head_pos()) < 0:
+                length -= 1
+            order = np.arange(start, start + length) % len(xs)
+            cols = np.frombuffer(xs, dtype=np.intc)[order] // cell_size
+            rows = np.frombuffer(ys, dtype=np.intc)[order] // cell_size
+            pixels[cols, rows] = colors[:length]
+        del pixels
+
+        self.rgb_cells.blit(self.cells, (0, 0))
+        pygame.transform.scale(self.rgb_cells, self.target.get_size(), self.target)
+
+
+# renderers by RENDER_MODE, see config
+RENDERERS = {
+    "full": FullRenderer,
+    "dirty": DirtyRectRenderer,
+    "palette": PaletteRenderer,
+}
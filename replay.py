@@ -0,0 +1,358 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Iterator
+import argparse
+import asyncio
+import struct
+import sys
+import time
+
+from colors import *
+from config import *
+from engine import GameState
+from type_alias import *
+
+# magic, version, seed, width, height, max_food_cnt, max_wall_cnt,
+# generate_wall_interval, initial_snake_speed and, since version 2, cell_size
+HEADER_FORMATS = {1: "<4sBQHHBBdd", 2: "<4sBQIIHHddH"}
+MAGIC = b"SNKR"
+VERSION = 2
+
+# a turn is stored in 2 bits next to its tick delta
+DIRECTIONS: List[Direction] = ["UP", "DOWN", "LEFT", "RIGHT"]
+DIRECTION_CODE = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+def write_varint(buf: bytearray, value: int) -> None:
+    """Append a non-negative integer in LEB128, 7 bits per byte
+
+    Args:
+        buf (bytearray): the buffer to write to
+        value (int): the integer
+    """
+    while value >= 0x80:
+        buf.append(value & 0x7F | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Read a LEB128 integer
+
+    Args:
+        data (bytes): the encoded data
+        offset (int): where the integer starts
+
+    Returns:
+        Tuple[int, int]: the integer, the offset after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayRecorder:
+    def __init__(self, state: GameState):
+        """Recorder of the seed, settings and direction changes of a game
+
+        A replay only needs these to rebuild the whole game, as the game draws its
+        food and walls from its own seeded generator. The recorder attaches itself to
+        the game, which reports every actual turn through `record_turn`.
+
+        Args:
+            state (GameState): the game to record, before its first tick
+        """
+        self.state = state
+        self.turns: List[Tuple[int, Direction]] = []
+        state.recorder = self
+
+    def record_turn(self, tick: int, direction: Direction) -> None:
+        """Store a turn of the snake
+
+        Args:
+            tick (int): the tick the turn happened in
+            direction (Direction): the new direction
+        """
+        self.turns.append((tick, direction))
+
+    def to_bytes(self) -> bytes:
+        """Encode the replay
+
+        The header is followed by one varint per turn holding the ticks since the
+        previous turn and the direction, and a 0 byte, the ticks and the score of
+        the game to verify a playback against.
+
+        Returns:
+            bytes: the encoded replay
+        """
+        state = self.state
+        buf = bytearray(
+            struct.pack(
+                HEADER_FORMATS[VERSION],
+                MAGIC,
+                VERSION,
+                state.seed,
+                state.width,
+                state.height,
+                state.max_food_cnt,
+                state.max_wall_cnt,
+                state.generate_wall_interval,
+                state.initial_snake_speed,
+                state.cell_size,
+            )
+        )
+        # at most one turn per tick, so the delta is at least 1 and 0 ends the turns
+        prev_tick = -1
+        for tick, direction in self.turns:
+            write_varint(buf, (tick - prev_tick) << 2 | DIRECTION_CODE[direction])
+            prev_tick = tick
+        buf.append(0)
+        write_varint(buf, state.ticks)
+        write_varint(buf, state.score)
+        return bytes(buf)
+
+    def save(self, path: str) -> None:
+        """Write the replay to a file
+
+        Args:
+            path (str): the file path
+        """
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+
+class Replay:
+    def __init__(
+        self,
+        seed: int,
+        settings: Dict[str, Union[int, float]],
+        turns: List[Tuple[int, Direction]],
+        ticks: int,
+        score: int,
+    ):
+        """A recorded game
+
+        Args:
+            seed (int): seed of the game
+            settings (Dict[str, Union[int, float]]): GameState arguments of the game
+            turns (List[Tuple[int, Direction]]): the tick and new direction of every turn
+            ticks (int): ticks played until the recording stopped
+            score (int): score at the end of the recording
+        """
+        self.seed = seed
+        self.settings = settings
+        self.turns = turns
+        self.ticks = ticks
+        self.score = score
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Replay":
+        """Decode a replay
+
+        Args:
+            data (bytes): the encoded replay
+
+        Returns:
+            Replay: the replay
+        """
+        magic, version = struct.unpack_from("<4sB", data)
+        if magic != MAGIC:
+            raise ValueError("Not a replay file")
+        if version not in HEADER_FORMATS:
+            raise ValueError(f"Unsupported replay version {version}")
+
+        header_format = HEADER_FORMATS[version]
+        (
+            _,
+            _,
+            seed,
+            width,
+            height,
+            max_food_cnt,
+            max_wall_cnt,
+            generate_wall_interval,
+            initial_snake_speed,
+            *cell_size,
+        ) = struct.unpack_from(header_format, data)
+        # version 1 replays were recorded on 10px cells
+        cell_size = cell_size[0] if cell_size else 10
+
+        turns = []
+        offset = struct.calcsize(header_format)
+        tick = -1
+        while True:
+            value, offset = read_varint(data, offset)
+            if value == 0:
+                break
+            tick += value >> 2
+            turns.append((tick, DIRECTIONS[value & 3]))
+        ticks, offset = read_varint(data, offset)
+        score, offset = read_varint(data, offset)
+
+        settings = {
+            "width": width,
+            "height": height,
+            "max_food_cnt": max_food_cnt,
+            "max_wall_cnt": max_wall_cnt,
+            "generate_wall_interval": generate_wall_interval,
+            "initial_snake_speed": initial_snake_speed,
+            "cell_size": cell_size,
+        }
+        return cls(seed, settings, turns, ticks, score)
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        """Read a replay file
+
+        Args:
+            path (str): the file path
+
+        Returns:
+            Replay: the replay
+        """
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def new_state(self) -> GameState:
+        """Create the game of the replay before its first tick
+
+        Returns:
+            GameState: the game
+        """
+        return GameState(seed=self.seed, **self.settings)
+
+    def actions(self) -> Iterator[Optional[Direction]]:
+        """Get the action of every recorded tick
+
+        Yields:
+            Optional[Direction]: the direction to turn to, None to keep going
+        """
+        turns = iter(self.turns)
+        next_turn = next(turns, None)
+        for tick in range(self.ticks):
+            if next_turn is not None and next_turn[0] == tick:
+                yield next_turn[1]
+                next_turn = next(turns, None)
+            else:
+                yield None
+
+    def play(self) -> GameState:
+        """Replay the game headless, as fast as possible
+
+        Returns:
+            GameState: the game after the last recorded tick
+        """
+        state = self.new_state()
+        step = state.step
+        for action in self.actions():
+            step(action)
+        return state
+
+    def verify(self) -> bool:
+        """Check that a playback reaches the recorded ticks and score
+
+        Returns:
+            bool: whether the replay is genuine
+        """
+        state = self.play()
+        return state.ticks == self.ticks and state.score == self.score
+
+
+async def play_on_screen(replay: Replay, speedup: float = 1.0) -> GameState:
+    """Replay a game in a window at the speed of the snake
+
+    Args:
+        replay (Replay): the replay
+        speedup (float, optional): factor on the speed of the snake. Defaults to 1.0.
+
+    Returns:
+        GameState: the game after the last recorded tick
+    """
+    import pygame
+
+    from controls import ReplayInput
+    from render import FullRenderer
+    from utils import layout_info
+
+    pygame.init()
+    pygame.font.init()
+
+    state = replay.new_state()
+    screen = pygame.display.set_mode((state.width, state.height))
+    pygame.display.set_caption(f"Replay {replay.seed}")
+    renderer = FullRenderer(screen, background=BLACK)
+
+    fps = pygame.time.Clock()
+    accumulator = 0.0
+    source = ReplayInput(replay.actions())
+    while state.ticks < replay.ticks and not state.done:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return state
+            elif event.type == pygame.WINDOWEXPOSED:
+                renderer.invalidate()
+
+        accumulator += fps.get_time() / 1000 * speedup
+        while state.ticks < replay.ticks and accumulator >= 1 / state.snake_speed:
+            accumulator -= 1 / state.snake_speed
+            state.step(source.next_action(state))
+
+        renderer.render(
+            state,
+            layout_info(
+                screen.get_size(),
+                place="upperright",
+                score=state.score,
+                time_played=state.time_played,
+            ),
+        )
+        fps.tick(RENDER_FPS)
+        await asyncio.sleep(0)
+
+    pygame.quit()
+    return state
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Verify or watch replay files
+
+    Args:
+        argv (Optional[List[str]], optional): arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description="Verify or watch recorded games.")
+    parser.add_argument("replays", nargs="+", help="replay files")
+    parser.add_argument(
+        "--display", action="store_true", help="watch the games instead of verifying"
+    )
+    parser.add_argument(
+        "--speedup", type=float, default=1.0, help="playback speed factor of --display"
+    )
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.replays:
+        replay = Replay.load(path)
+        start_time = time.time()
+        if args.display:
+            state = asyncio.run(play_on_screen(replay, args.speedup))
+        else:
+            state = replay.play()
+        elapsed = time.time() - start_time
+
+        ok = state.ticks == replay.ticks and state.score == replay.score
+        failed += not ok
+        print(
+            f"{path}: seed {replay.seed}, {replay.ticks} ticks, score {replay.score}, "
+            f"replayed {state.ticks} ticks, score {state.score} in {elapsed:.2f}s "
+            f"{'OK' if ok else 'MISMATCH'}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
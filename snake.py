@@ -1,12 +1,18 @@
-from typing import List, Tuple, Union, Literal
-import pygame
+from typing import List, Tuple, Union, Literal, Optional, Iterator, TYPE_CHECKING
+from array import array
 
 from base_class import Block
+from grid import OccupancyGrid, SNAKE
 from colors import *
 from type_alias import *
 
+if TYPE_CHECKING:
+    import pygame
+
 
 class SnakeBodyBlock:
+    __slots__ = ("pos", "color", "width", "height")
+
     def __init__(self, pos: Position, color: Color, width: int, height: int):
         """Body block of the snake
 
@@ -21,13 +27,15 @@ class SnakeBodyBlock:
         self.width = width
         self.height = height
 
-    def draw(self: "Block", screen: pygame.Surface):
+    def draw(self: "Block", screen: "pygame.Surface"):
         """Draw the block on the screen
 
         Args:
             self (Block): block
             screen (pygame.Surface): screen to draw the block
         """
+        import pygame
+
         pygame.draw.rect(
             screen,
             self.color,
@@ -35,25 +43,129 @@ class SnakeBodyBlock:
         )
 
 
+# unit step of each direction
+DIRECTION_DELTA = {"UP": (0, -1), "DOWN": (0, 1), "LEFT": (-1, 0), "RIGHT": (1, 0)}
+
+
 class Snake:
     def __init__(
         self,
         body: List[SnakeBodyBlock],
         direction: Direction,
+        grid: Optional[OccupancyGrid] = None,
     ):
         """__init__ method for Snake Class
 
+        The body is stored as a ring buffer of x/y coordinates (tail to head) and a
+        parallel ring of colors indexed by offset from the tail, so moving and
+        growing are O(1) whatever the length of the snake.
+
         Args:
-            body (List[SnakeBodyBlock]): the body of the snake
+            body (List[SnakeBodyBlock]): the body of the snake, from tail to head
             direction (Direction): the direction of the snake
+            grid (Optional[OccupancyGrid], optional): occupancy grid to keep up to date. Defaults to None.
         """
-        self.body = body
-        self.direction = direction
+        self.block_width = body[0].width
+        self.block_height = body[0].height
+
+        capacity = max(16, 2 * len(body))
+        self._xs = array("i", bytes(4 * capacity))
+        self._ys = array("i", bytes(4 * capacity))
+        self._colors: List[Optional[Color]] = [None] * capacity
+        self._capacity = capacity
+        self._length = 0
+        self._pos_start = 0
+        self._color_start = 0
+
+        self.grid = grid
+        self.reset(body, direction)
+
+    def reset(self: "Snake", body: List[SnakeBodyBlock], direction: Direction) -> None:
+        """Replace the body and direction of the snake, e.g. for a new game
+
+        The rings keep their capacity, so a snake restarting after a long game
+        does not allocate them again while it grows back.
+
+        Args:
+            self (Snake): Snake object
+            body (List[SnakeBodyBlock]): the new body of the snake, from tail to head
+            direction (Direction): the new direction of the snake
+        """
+        if self.grid is not None:
+            for pos in self.get_all_pos():
+                self.grid.remove(SNAKE, pos)
+
+        self._length = 0
+        # ring index of the tail in the position ring and in the color ring
+        self._pos_start = 0
+        self._color_start = 0
+        if self._capacity < len(body):
+            capacity = 2 * len(body)
+            self._xs = array("i", bytes(4 * capacity))
+            self._ys = array("i", bytes(4 * capacity))
+            self._colors = [None] * capacity
+            self._capacity = capacity
 
-        self.head_pos = self.body[-1].pos
+        for i, block in enumerate(body):
+            self._xs[i] = block.pos[0]
+            self._ys[i] = block.pos[1]
+            self._colors[i] = block.color
+        self._length = len(body)
+
+        if self.grid is not None:
+            for block in body:
+                self.grid.add(SNAKE, block.pos)
+
+        self.direction = direction
+        self.head_pos = body[-1].pos
 
         self.isGrowing = False
 
+    def copy(self: "Snake", grid: Optional[OccupancyGrid] = None) -> "Snake":
+        """Get an independent copy of the snake, e.g. for a fork of the game
+
+        The rings are copied flat, which is a memory copy whatever the length.
+
+        Args:
+            self (Snake): Snake object
+            grid (Optional[OccupancyGrid], optional): the copy of the grid to keep up to date, which already holds the body. Defaults to None.
+
+        Returns:
+            Snake: the copy
+        """
+        snake = Snake.__new__(Snake)
+        snake.__dict__.update(self.__dict__)
+        snake._xs = self._xs[:]
+        snake._ys = self._ys[:]
+        snake._colors = self._colors[:]
+        snake.grid = grid
+        return snake
+
+    def _reserve(self: "Snake") -> None:
+        """Double the capacity of the rings when they are full, keeping the tail at index 0"""
+        if self._length < self._capacity:
+            return
+
+        capacity, length = self._capacity, self._length
+        pos_order = [(self._pos_start + i) % capacity for i in range(length)]
+        color_order = [(self._color_start + i) % capacity for i in range(length)]
+
+        padding = array("i", bytes(4 * capacity))
+        self._xs = array("i", (self._xs[i] for i in pos_order)) + padding
+        self._ys = array("i", (self._ys[i] for i in pos_order)) + padding
+        self._colors = [self._colors[i] for i in color_order] + [None] * capacity
+        self._capacity = 2 * capacity
+        self._pos_start = 0
+        self._color_start = 0
+
+    @property
+    def body(self: "Snake") -> List[SnakeBodyBlock]:
+        """Snapshot of the body as blocks from tail to head, O(n), prefer get_all_pos or iter_blocks"""
+        return [
+            SnakeBodyBlock(pos, color, self.block_width, self.block_height)
+            for pos, color in self.iter_blocks()
+        ]
+
     def get_direction(self: "Snake") -> Direction:
         """Get the direction of the snake
 
@@ -74,40 +186,48 @@ class Snake:
         """
         self.direction = direction
 
-    def move(self: "Snake", distance: int = 10):
+    def move(self: "Snake", distance: Optional[int] = None):
         """Move the snake in the current direction
 
         Args:
             self (Snake): Snake object
-            distance (int, optional): distance to move. Defaults to 10.
-        """
-        self.head_pos = self.body[-1].pos
-        if self.direction == "UP":
-            self.head_pos = (self.head_pos[0], self.head_pos[1] - distance)
-        elif self.direction == "DOWN":
-            self.head_pos = (self.head_pos[0], self.head_pos[1] + distance)
-        elif self.direction == "LEFT":
-            self.head_pos = (self.head_pos[0] - distance, self.head_pos[1])
-        elif self.direction == "RIGHT":
-            self.head_pos = (self.head_pos[0] + distance, self.head_pos[1])
-
-        new_snake_head = SnakeBodyBlock(
-            pos=self.head_pos,
-            color=WHITE,
-            width=10,
-            height=10,
-        )
-        self.body.append(new_snake_head)
+            distance (Optional[int], optional): distance to move (px). Defaults to None (one block).
+        """
+        if self.isGrowing:
+            self._reserve()
 
-        # move the color of the snake to the next block
-        for idx in range(len(self.body) - 1, 0, -1):
-            self.body[idx].color = self.body[idx - 1].color
+        capacity = self._capacity
+        dx, dy = DIRECTION_DELTA[self.direction]
+        if distance is None:
+            head_x = self.head_pos[0] + dx * self.block_width
+            head_y = self.head_pos[1] + dy * self.block_height
+        else:
+            head_x = self.head_pos[0] + dx * distance
+            head_y = self.head_pos[1] + dy * distance
+        self.head_pos = (head_x, head_y)
 
+        # the head goes into the slot after the current head,
+        # which is the freed tail slot unless the snake grows
+        head_idx = (self._pos_start + self._length) % capacity
         if not self.isGrowing:
-            self.body.pop(0)
+            tail_idx = self._pos_start
+            if self.grid is not None:
+                self.grid.remove(SNAKE, (self._xs[tail_idx], self._ys[tail_idx]))
+            self._pos_start = (tail_idx + 1) % capacity
         else:
+            # colors stay attached to their offset from the tail,
+            # a growing snake repeats its tail color at the new tail
+            tail_color = self._colors[self._color_start]
+            self._color_start = (self._color_start - 1) % capacity
+            self._colors[self._color_start] = tail_color
+            self._length += 1
             self.isGrowing = False
 
+        self._xs[head_idx] = head_x
+        self._ys[head_idx] = head_y
+        if self.grid is not None:
+            self.grid.add(SNAKE, self.head_pos)
+
     def get_head_pos(self: "Snake") -> Position:
         """Get the position of the snake's head
 
@@ -119,6 +239,28 @@ class Snake:
         """
         return self.head_pos
 
+    def get_tail_pos(self: "Snake") -> Position:
+        """Get the position of the snake's tail
+
+        Args:
+            self (Snake): Snake object
+
+        Returns:
+            Position: position of the snake's tail
+        """
+        return (self._xs[self._pos_start], self._ys[self._pos_start])
+
+    def get_length(self: "Snake") -> int:
+        """Get the number of blocks in the snake's body
+
+        Args:
+            self (Snake): Snake object
+
+        Returns:
+            int: length of the snake
+        """
+        return self._length
+
     def get_all_pos(self: "Snake") -> List[Position]:
         """Get the positions of all blocks in the snake's body
 
@@ -126,9 +268,36 @@ class Snake:
             self (Snake): Snake object
 
         Returns:
-            List[Position]: list of positions of all blocks in the snake's body
+            List[Position]: list of positions of all blocks in the snake's body, from tail to head
+        """
+        return [pos for pos, _ in self.iter_blocks()]
+
+    def get_rings(self: "Snake") -> Tuple[array, array, int, int]:
+        """Get the position rings of the body, for readers working on whole arrays
+
+        Args:
+            self (Snake): Snake object
+
+        Returns:
+            Tuple[array, array, int, int]: x and y rings (px, shared, must not be modified), ring index of the tail, length. Block i from the tail is at index (start + i) % len(ring).
         """
-        return [block.pos for block in self.body]
+        return self._xs, self._ys, self._pos_start, self._length
+
+    def iter_blocks(self: "Snake") -> Iterator[Tuple[Position, Color]]:
+        """Iterate over the blocks of the snake's body from tail to head
+
+        Args:
+            self (Snake): Snake object
+
+        Yields:
+            Tuple[Position, Color]: position and color of each block
+        """
+        xs, ys, colors = self._xs, self._ys, self._colors
+        capacity = self._capacity
+        pos_start, color_start = self._pos_start, self._color_start
+        for offset in range(self._length):
+            idx = (pos_start + offset) % capacity
+            yield (xs[idx], ys[idx]), colors[(color_start + offset) % capacity]
 
     def grow(self: "Snake", color: Color = WHITE, width: int = 10, height: int = 10):
         """Make the snake grow by adding a new block
@@ -141,14 +310,17 @@ class Snake:
         """
         self.isGrowing = True
         self.move()
-        self.body[0].color = color
+        self._colors[self._color_start] = color
 
-    def draw(self: "Snake", screen: pygame.Surface):
+    def draw(self: "Snake", screen: "pygame.Surface"):
         """Draw the snake on the screen
 
         Args:
             self (Snake): Snake object
             screen (pygame.Surface): screen to draw the snake
         """
-        for block in self.body:
-            block.draw(screen)
+        import pygame
+
+        width, height = self.block_width, self.block_height
+        for pos, color in self.iter_blocks():
+            pygame.draw.rect(screen, color, (pos[0], pos[1], width, height))
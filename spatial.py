@@ -0,0 +1,127 @@
+from typing import List, Tuple, Union, Literal, Dict, Any, Iterable
+
+from type_alias import *
+
+# side of a chunk in cells
+CHUNK_CELLS = 16
+
+
+class ChunkIndex:
+    def __init__(self, cell_size: int = 10, chunk_cells: int = CHUNK_CELLS):
+        """Spatial index of entities covering cells of the board, split in square chunks
+
+        Only chunks holding something exist, each maps a cell position to the
+        entities covering it. A point lookup touches one chunk and a region query
+        only the chunks the region overlaps, so both depend on the local density
+        of entities instead of their total number.
+
+        Args:
+            cell_size (int, optional): size of a cell (px). Defaults to 10.
+            chunk_cells (int, optional): side of a chunk in cells. Defaults to CHUNK_CELLS.
+        """
+        self.chunk_size = cell_size * chunk_cells
+        self.chunks: Dict[Tuple[int, int], Dict[Position, List[Any]]] = {}
+
+    def add(self, item: Any, cells: Iterable[Position]) -> None:
+        """Index an entity under the cells it covers
+
+        Args:
+            item (Any): the entity
+            cells (Iterable[Position]): positions of its cells (px)
+        """
+        chunk_size = self.chunk_size
+        for pos in cells:
+            key = (pos[0] // chunk_size, pos[1] // chunk_size)
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                chunk = self.chunks[key] = {}
+            items = chunk.get(pos)
+            if items is None:
+                chunk[pos] = [item]
+            else:
+                items.append(item)
+
+    def remove(self, item: Any, cells: Iterable[Position]) -> None:
+        """Remove an entity from the cells it was indexed under
+
+        Args:
+            item (Any): the entity
+            cells (Iterable[Position]): positions of its cells (px), as given to add
+        """
+        chunk_size = self.chunk_size
+        for pos in cells:
+            key = (pos[0] // chunk_size, pos[1] // chunk_size)
+            chunk = self.chunks[key]
+            items = chunk[pos]
+            # identity, entities may compare equal
+            for i, other in enumerate(items):
+                if other is item:
+                    del items[i]
+                    break
+            if not items:
+                del chunk[pos]
+                if not chunk:
+                    del self.chunks[key]
+
+    def at(self, pos: Position) -> List[Any]:
+        """Get the entities covering a cell
+
+        Args:
+            pos (Position): position of the cell (px)
+
+        Returns:
+            List[Any]: the entities, shared, must not be modified
+        """
+        chunk = self.chunks.get((pos[0] // self.chunk_size, pos[1] // self.chunk_size))
+        if chunk is None:
+            return []
+        return chunk.get(pos, [])
+
+    def query(self, x: int, y: int, width: int, height: int) -> List[Any]:
+        """Get the entities with a cell in the chunks a region overlaps
+
+        The result may include entities just outside the region, callers culling
+        what they draw still test the exact bounds.
+
+        Args:
+            x (int): left of the region (px)
+            y (int): top of the region (px)
+            width (int): width of the region (px)
+            height (int): height of the region (px)
+
+        Returns:
+            List[Any]: the entities, each once
+        """
+        chunk_size = self.chunk_size
+        chunks = self.chunks
+        seen = set()
+        result = []
+        for chunk_y in range(y // chunk_size, (y + height - 1) // chunk_size + 1):
+            for chunk_x in range(x // chunk_size, (x + width - 1) // chunk_size + 1):
+                chunk = chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    continue
+                for items in chunk.values():
+                    for item in items:
+                        if id(item) not in seen:
+                            seen.add(id(item))
+                            result.append(item)
+        return result
+
+    def copy(self) -> "ChunkIndex":
+        """Get an independent copy of the index, sharing the entities
+
+        Returns:
+            ChunkIndex: the copy
+        """
+        index = ChunkIndex.__new__(ChunkIndex)
+        index.chunk_size = self.chunk_size
+        index.chunks = {
+            key: {pos: list(items) for pos, items in chunk.items()}
+            for key, chunk in self.chunks.items()
+        }
+        return index
+
+    def clear(self) -> None:
+        """Remove every entity"""
+        self.chunks.clear()
@@ -1,20 +1,30 @@
-import pygame
-from typing import Union, Tuple, Literal, List
+from typing import Union, Tuple, Literal, List, Optional, TYPE_CHECKING
 import random
 
 from colors import *
 from type_alias import *
 
+if TYPE_CHECKING:
+    import pygame
 
-def generate_position(grid_width, grid_height, std_dev_factor=0.15) -> Position:
+
+def generate_position(
+    grid_width,
+    grid_height,
+    std_dev_factor=0.15,
+    rng: Optional[random.Random] = None,
+    cell_size: int = 10,
+) -> Position:
     """
     Generates a random position within the grid boundaries.
-    The position is a multiple of 10.
+    The position is a multiple of the cell size.
 
     Args:
         grid_width (int): The width of the grid.
         grid_height (int): The height of the grid.
         std_dev_factor (float): The standard deviation factor for the normal distribution.
+        rng (Optional[random.Random]): The random generator, None for the global random module.
+        cell_size (int): The size of a cell (px).
 
     Returns:
         Position: The generated position as a tuple of x and y coordinates.
@@ -27,64 +37,93 @@ def generate_position(grid_width, grid_height, std_dev_factor=0.15) -> Position:
 
     # Generate positions using a normal distribution
     # Ensure the generated positions are within the grid boundaries
-    x_position = min(max(int(random.gauss(mean_x, std_dev_x)), 0), grid_width - 1)
-    y_position = min(max(int(random.gauss(mean_y, std_dev_y)), 0), grid_height - 1)
+    rng = random if rng is None else rng
+    x_position = min(max(int(rng.gauss(mean_x, std_dev_x)), 0), grid_width - 1)
+    y_position = min(max(int(rng.gauss(mean_y, std_dev_y)), 0), grid_height - 1)
 
-    # the position should be a multiple of 10
-    x_position = x_position - (x_position % 10)
-    y_position = y_position - (y_position % 10)
+    # the position should be a multiple of the cell size
+    x_position = x_position - (x_position % cell_size)
+    y_position = y_position - (y_position % cell_size)
 
     return (x_position, y_position)
 
 
-def show_info(
-    screen: pygame.Surface,
+def layout_info(
+    screen_size: Tuple[int, int],
     score: int,
     time_played: int,
     place: displayPosition = "upperright",
     color: Tuple[int, int, int] = WHITE,
-) -> None:
+) -> List[Tuple["pygame.Surface", "pygame.Rect"]]:
     """
-    Displays the score and time played on the screen.
+    Renders the score and time played and places them on the screen, without drawing them.
 
     Args:
-        screen (pygame.Surface): The surface to display the information on.
+        screen_size (Tuple[int, int]): The width and height of the screen.
         score (int): The current score.
         time_played (int): The time played in seconds.
         place (displayPosition): The position to display the information.
         color (Tuple[int, int, int]): The color of the text.
+
+    Returns:
+        List[Tuple[pygame.Surface, pygame.Rect]]: The text surfaces and where to blit them.
     """
-    font = pygame.font.SysFont("times new roman", 20)
+    from fonts import render_text
 
+    screen_width, screen_height = screen_size
+
+    # the surfaces are cached, they are only rendered again when the text changes
     score_text = f"Score: {score}"
-    score_surface = font.render(score_text, True, color)
+    score_surface = render_text(score_text, 20, color)
     score_rect = score_surface.get_rect()
 
     time_text = f"Time Played: {time_played:.0f}s"
-    time_played_surface = font.render(time_text, True, color)
+    time_played_surface = render_text(time_text, 20, color)
     time_rect = time_played_surface.get_rect()
 
     # Position the text surfaces based on 'place'
     if place == "upperright":
-        score_rect.topright = (screen.get_width() - 10, 10)
-        time_rect.topright = (screen.get_width() - 10, 40)
+        score_rect.topright = (screen_width - 10, 10)
+        time_rect.topright = (screen_width - 10, 40)
     elif place == "upperleft":
         score_rect.topleft = (10, 10)
         time_rect.topleft = (10, 40)
     elif place == "lowerright":
-        score_rect.bottomright = (screen.get_width() - 10, screen.get_height() - 10)
-        time_rect.bottomright = (screen.get_width() - 10, screen.get_height() - 40)
+        score_rect.bottomright = (screen_width - 10, screen_height - 10)
+        time_rect.bottomright = (screen_width - 10, screen_height - 40)
     elif place == "lowerleft":
-        score_rect.bottomleft = (10, screen.get_height() - 10)
-        time_rect.bottomleft = (10, screen.get_height() - 40)
+        score_rect.bottomleft = (10, screen_height - 10)
+        time_rect.bottomleft = (10, screen_height - 40)
     else:
         # Default to upperright if place is not recognized
-        score_rect.topright = (screen.get_width() - 10, 10)
-        time_rect.topright = (screen.get_width() - 10, 40)
+        score_rect.topright = (screen_width - 10, 10)
+        time_rect.topright = (screen_width - 10, 40)
+
+    return [(score_surface, score_rect), (time_played_surface, time_rect)]
+
+
+def show_info(
+    screen: "pygame.Surface",
+    score: int,
+    time_played: int,
+    place: displayPosition = "upperright",
+    color: Tuple[int, int, int] = WHITE,
+) -> None:
+    """
+    Displays the score and time played on the screen.
 
+    Args:
+        screen (pygame.Surface): The surface to display the information on.
+        score (int): The current score.
+        time_played (int): The time played in seconds.
+        place (displayPosition): The position to display the information.
+        color (Tuple[int, int, int]): The color of the text.
+    """
     # Blit the text surfaces onto the screen
-    screen.blit(score_surface, score_rect)
-    screen.blit(time_played_surface, time_rect)
+    for surface, rect in layout_info(
+        screen.get_size(), score, time_played, place, color
+    ):
+        screen.blit(surface, rect)
 
 
 def check(*lists):
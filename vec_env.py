@@ -0,0 +1,331 @@
+from typing import List, Tuple, Union, Literal, Optional, Dict, Sequence
+import numpy as np
+
+from config import *
+
+# actions, same order as the directions of the game, NO_ACTION keeps the current one
+DIRECTIONS = ["UP", "DOWN", "LEFT", "RIGHT"]
+UP, DOWN, LEFT, RIGHT = range(4)
+NO_ACTION = -1
+
+DELTA_COL = np.array([0, 0, -1, 1])
+DELTA_ROW = np.array([-1, 1, 0, 0])
+OPPOSITE = np.array([DOWN, UP, RIGHT, LEFT])
+
+# observation channels
+BODY, HEAD, FOOD, WALL = range(4)
+
+# game over codes, see main.game_over, ALIVE while the game goes on
+ALIVE = -1
+COLLISION_BORDER = 0
+COLLISION_BODY = 1
+COLLISION_WALL = 2
+
+# entry tick of the cells the snake never visited
+NEVER = np.iinfo(np.int64).min // 2
+
+
+class VecSnakeEnv:
+    def __init__(
+        self,
+        num_envs: int,
+        cols: int = GRID_COLS,
+        rows: int = GRID_ROWS,
+        max_food_cnt: int = MAX_FOOD_CNT,
+        max_wall_cnt: int = MAX_WALL_CNT,
+        generate_wall_interval: float = GENERATE_WALL_INTERVAL,
+        initial_snake_speed: float = INITIAL_SNAKE_SPEED,
+        score_list: Sequence[int] = (10, 20, 30, 40, 50, 60),
+        std_dev_factor: float = 0.15,
+        wall_length: int = 5,
+        max_tries: int = 16,
+        seed: Optional[int] = None,
+    ):
+        """K snake games on NumPy arrays, all advanced by one vectorized `step`
+
+        Follows the rules of engine.GameState on a board of cells: the snake eats
+        the food under its head by growing, dies on the border (0), its body (1)
+        or a wall (2), food is respawned with the Gaussian bias of
+        utils.generate_position cycling through score_list, and a wall is added
+        every generate_wall_interval seconds of simulated time.
+
+        The snake body is not stored as a list: each cell remembers the tick the
+        head entered it, and a cell belongs to the body while that tick is within
+        the last `length` ticks, so moving never touches the tail.
+
+        Args:
+            num_envs (int): number of games K
+            cols (int, optional): width of the board (cells). Defaults to GRID_COLS.
+            rows (int, optional): height of the board (cells). Defaults to GRID_ROWS.
+            max_food_cnt (int, optional): number of food on each board. Defaults to MAX_FOOD_CNT.
+            max_wall_cnt (int, optional): number of walls at the start. Defaults to MAX_WALL_CNT.
+            generate_wall_interval (float, optional): seconds between new walls. Defaults to GENERATE_WALL_INTERVAL.
+            initial_snake_speed (float, optional): ticks per second at the start. Defaults to INITIAL_SNAKE_SPEED.
+            score_list (Sequence[int], optional): scores of the successive food. Defaults to (10, 20, 30, 40, 50, 60).
+            std_dev_factor (float, optional): the standard deviation factor for the normal distribution. Defaults to 0.15.
+            wall_length (int, optional): length of a wall (cells). Defaults to 5.
+            max_tries (int, optional): positions drawn per food or wall and per tick, a game that
+                found no room tries again on the next tick. Defaults to 16.
+            seed (Optional[int], optional): seed of the random generator. Defaults to None.
+        """
+        self.num_envs = num_envs
+        self.cols = cols
+        self.rows = rows
+        self.max_food_cnt = max_food_cnt
+        self.max_wall_cnt = max_wall_cnt
+        self.generate_wall_interval = generate_wall_interval
+        self.initial_snake_speed = initial_snake_speed
+        self.scores = np.asarray(score_list, dtype=np.int64)
+        self.std_dev_factor = std_dev_factor
+        self.wall_length = wall_length
+        self.max_tries = max_tries
+
+        self.rng = np.random.default_rng(seed)
+
+        k, n = num_envs, cols * rows
+        self.envs = np.arange(k)
+
+        # boards, one row of flat cells per game
+        self.entered = np.full((k, n), NEVER, dtype=np.int64)
+        self.food = np.zeros((k, n), dtype=np.int64)
+        self.wall = np.zeros((k, n), dtype=np.bool_)
+
+        self.head_col = np.zeros(k, dtype=np.int64)
+        self.head_row = np.zeros(k, dtype=np.int64)
+        self.direction = np.zeros(k, dtype=np.int64)
+        self.length = np.zeros(k, dtype=np.int64)
+        self.ticks = np.zeros(k, dtype=np.int64)
+        self.time_played = np.zeros(k, dtype=np.float64)
+        self.score = np.zeros(k, dtype=np.int64)
+        self.food_cnt = np.zeros(k, dtype=np.int64)
+        self.food_seq = np.zeros(k, dtype=np.int64)
+        self.wall_cnt = np.zeros(k, dtype=np.int64)
+
+        self.obs = np.zeros((k, 4, rows, cols), dtype=np.uint8)
+
+        self.reset()
+
+    @property
+    def snake_speed(self) -> np.ndarray:
+        """Current speed of each snake in ticks per second"""
+        return self.initial_snake_speed + 2 / 60 * np.maximum(0, self.time_played - 1)
+
+    def reset(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Start new games
+
+        Args:
+            mask (Optional[np.ndarray], optional): games to restart, bool (K,). Defaults to None (all).
+
+        Returns:
+            np.ndarray: observations (K, 4, rows, cols), see observe
+        """
+        envs = self.envs if mask is None else self.envs[mask]
+        if len(envs):
+            self.entered[envs] = NEVER
+            self.food[envs] = 0
+            self.wall[envs] = False
+            self.food_cnt[envs] = 0
+            self.food_seq[envs] = 0
+            self.wall_cnt[envs] = 0
+            self.score[envs] = 0
+            self.time_played[envs] = 0.0
+
+            # two blocks in the middle heading right, as in GameState.reset
+            row, col = self.rows // 2 - 1, self.cols // 2
+            self.ticks[envs] = 1
+            self.entered[envs, row * self.cols + col - 1] = 0
+            self.entered[envs, row * self.cols + col] = 1
+            self.head_row[envs] = row
+            self.head_col[envs] = col
+            self.direction[envs] = RIGHT
+            self.length[envs] = 2
+
+            for _ in range(self.max_food_cnt):
+                self._spawn_food(envs)
+            for _ in range(self.max_wall_cnt):
+                self._spawn_wall(envs)
+
+        return self.observe()
+
+    def _taken(self, envs: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        """Check which cells of some games are taken by the snake, a food or a wall
+
+        Args:
+            envs (np.ndarray): games (M,)
+            cells (np.ndarray): flat cells (M, T)
+
+        Returns:
+            np.ndarray: bool (M, T)
+        """
+        body_start = (self.ticks[envs] - self.length[envs] + 1)[:, None]
+        rows = envs[:, None]
+        return (
+            (self.entered[rows, cells] >= body_start)
+            | (self.food[rows, cells] > 0)
+            | self.wall[rows, cells]
+        )
+
+    def _draw_positions(self, m: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw max_tries positions per game like utils.generate_position
+
+        Args:
+            m (int): number of games
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: columns and rows (m, max_tries)
+        """
+        positions = []
+        for cells in (self.cols, self.rows):
+            size = cells * CELL_SIZE
+            px = self.rng.normal(
+                size / 2, size * self.std_dev_factor, (m, self.max_tries)
+            )
+            px = np.clip(np.trunc(px), 0, size - 1).astype(np.int64)
+            positions.append(px // CELL_SIZE)
+        return positions[0], positions[1]
+
+    def _spawn_food(self, envs: np.ndarray) -> None:
+        """Add one food to the games below max_food_cnt, if a free cell is drawn
+
+        Args:
+            envs (np.ndarray): candidate games
+        """
+        envs = envs[self.food_cnt[envs] < self.max_food_cnt]
+        if not len(envs):
+            return
+
+        cols, rows = self._draw_positions(len(envs))
+        cells = rows * self.cols + cols
+        free = ~self._taken(envs, cells)
+        found = free.any(axis=1)
+        first = free.argmax(axis=1)
+
+        envs, cells = envs[found], cells[found, first[found]]
+        self.food[envs, cells] = self.scores[self.food_seq[envs] % len(self.scores)]
+        self.food_seq[envs] += 1
+        self.food_cnt[envs] += 1
+
+    def _spawn_wall(self, envs: np.ndarray) -> None:
+        """Add one wall to each game, if a place with all cells free is drawn
+
+        Cells of a wall beyond the border are dropped, as in wall.Wall.
+
+        Args:
+            envs (np.ndarray): games
+        """
+        if not len(envs):
+            return
+
+        m, t = len(envs), self.max_tries
+        cols, rows = self._draw_positions(m)
+        horizontal = self.rng.integers(0, 2, (m, t)).astype(np.bool_)
+        steps = np.arange(self.wall_length)
+        wall_cols = cols[..., None] + np.where(horizontal[..., None], steps, 0)
+        wall_rows = rows[..., None] + np.where(horizontal[..., None], 0, steps)
+        inside = (wall_cols < self.cols) & (wall_rows < self.rows)
+        cells = np.where(inside, wall_rows * self.cols + wall_cols, 0)
+
+        taken = self._taken(envs, cells.reshape(m, -1)).reshape(m, t, -1)
+        fits = ~(taken & inside).any(axis=2)
+        found = fits.any(axis=1)
+        first = fits.argmax(axis=1)
+
+        envs = envs[found]
+        cells, inside = cells[found, first[found]], inside[found, first[found]]
+        rows_idx = np.broadcast_to(envs[:, None], cells.shape)
+        self.wall[rows_idx[inside], cells[inside]] = True
+        self.wall_cnt[envs] += 1
+
+    def step(
+        self, actions: Union[np.ndarray, Sequence[int]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Advance every game by one tick, restarting the games that end
+
+        Args:
+            actions (Union[np.ndarray, Sequence[int]]): UP, DOWN, LEFT, RIGHT or NO_ACTION per game (K,),
+                reversing the snake is ignored
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+                observations (K, 4, rows, cols), score gained (K,), whether the game ended (K,),
+                and the final "score", "length", "ticks" and "game_over_code" of every game (K,)
+                (ALIVE for the games that go on)
+        """
+        envs = self.envs
+        actions = np.asarray(actions, dtype=np.int64)
+
+        turn = (actions >= 0) & (actions != OPPOSITE[self.direction])
+        self.direction = np.where(turn, actions, self.direction)
+
+        # the food under the head is eaten by growing instead of moving
+        head = self.head_row * self.cols + self.head_col
+        rewards = self.food[envs, head].copy()
+        grow = rewards > 0
+        self.score += rewards
+        self.length += grow
+        self.food[envs[grow], head[grow]] = 0
+        self.food_cnt -= grow
+
+        self.head_col += DELTA_COL[self.direction]
+        self.head_row += DELTA_ROW[self.direction]
+        self.time_played += 1 / self.snake_speed
+        self.ticks += 1
+
+        # Game Over conditions
+        inside = (
+            (self.head_col >= 0)
+            & (self.head_col < self.cols)
+            & (self.head_row >= 0)
+            & (self.head_row < self.rows)
+        )
+        head = np.where(inside, self.head_row * self.cols + self.head_col, 0)
+        body = inside & (self.entered[envs, head] >= self.ticks - self.length + 1)
+        wall = inside & self.wall[envs, head]
+        game_over_code = np.select(
+            [~inside, body, wall],
+            [COLLISION_BORDER, COLLISION_BODY, COLLISION_WALL],
+            ALIVE,
+        )
+
+        alive = game_over_code == ALIVE
+        self.entered[envs[alive], head[alive]] = self.ticks[alive]
+
+        self._spawn_food(envs[alive])
+        self._spawn_wall(
+            envs[
+                alive & (self.time_played / self.generate_wall_interval > self.wall_cnt)
+            ]
+        )
+
+        dones = ~alive
+        info = {
+            "score": self.score.copy(),
+            "length": self.length.copy(),
+            "ticks": self.ticks - 1,
+            "game_over_code": game_over_code,
+        }
+        if dones.any():
+            self.reset(dones)
+        else:
+            self.observe()
+        return self.obs, rewards, dones, info
+
+    def observe(self) -> np.ndarray:
+        """Write the boards into the observation buffer
+
+        Returns:
+            np.ndarray: uint8 (K, 4, rows, cols), the same buffer on every call: 1 on the
+                body (head included) and the head, score // 10 on food, 1 on walls
+        """
+        k, n = self.num_envs, self.cols * self.rows
+        obs = self.obs.reshape(k, 4, n)
+
+        body_start = self.ticks - self.length + 1
+        np.greater_equal(
+            self.entered, body_start[:, None], out=obs[:, BODY].view(np.bool_)
+        )
+        obs[:, HEAD] = 0
+        obs[self.envs, HEAD, self.head_row * self.cols + self.head_col] = 1
+        np.floor_divide(self.food, 10, out=obs[:, FOOD], casting="unsafe")
+        obs[:, WALL] = self.wall
+        return self.obs
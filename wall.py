@@ -1,14 +1,25 @@
-from typing import List, Tuple, Union, Literal
+from typing import List, Tuple, Union, Literal, Optional, Dict, TYPE_CHECKING
 import random
-import pygame
 
 from base_class import Controller
+from grid import OccupancyGrid, WALL
 from colors import *
-from utils import generate_position, check
+from placement import FreeCellSampler, PlacementError, MAX_PLACEMENT_ATTEMPTS
+from spatial import ChunkIndex
+from utils import generate_position
 from type_alias import *
 
+if TYPE_CHECKING:
+    import pygame
+
+# transparent color of the cached wall layer, skipped if a wall uses it
+LAYER_COLORKEY = (255, 0, 255)
+
 
 class Wall:
+    # the cells of a wall are derived from its position instead of being stored
+    __slots__ = ("orientation", "pos", "width", "height", "color", "cell_size")
+
     def __init__(
         self,
         orientation: Orientation,
@@ -16,25 +27,28 @@ class Wall:
         width: int = None,
         height: int = None,
         color: Color = WHITE,
+        cell_size: int = 10,
     ):
         """__init__ method for Wall class
 
         Args:
             orientation (Horizontal or Vertical): orientation of the wall
             pos (Positon): position of the wall(x, y) in px
-            width (int, optional): width of the wall (px). Defaults to None.
-            height (int, optional): height of the wall (px). Defaults to None.
+            width (int, optional): width of the wall (px). Defaults to None (5 cells if horizontal, else 1).
+            height (int, optional): height of the wall (px). Defaults to None (5 cells if vertical, else 1).
             color (Color, optional): color of the wall. Defaults to WHITE.
+            cell_size (int, optional): size of a cell (px). Defaults to 10.
         """
         self.orientation = orientation
         self.pos = pos
+        self.cell_size = cell_size
 
         if self.orientation == "Horizontal":
-            self.width = width if width is not None else 50
-            self.height = height if height is not None else 10
+            self.width = width if width is not None else 5 * cell_size
+            self.height = height if height is not None else cell_size
         elif self.orientation == "Vertical":
-            self.width = width if width is not None else 10
-            self.height = height if height is not None else 50
+            self.width = width if width is not None else cell_size
+            self.height = height if height is not None else 5 * cell_size
         else:
             raise ValueError(
                 "Invalid orientation value. Must be 'Horizontal' or 'Vertical'."
@@ -42,34 +56,34 @@ class Wall:
 
         self.color = color
 
-        self.calc_collision_detect_pos()
+    def calc_collision_detect_pos(self) -> List[Position]:
+        """Calculate the collision detection positions of the wall
 
-    def calc_collision_detect_pos(self) -> None:
-        """Calculate the collision detection positions of the wall"""
+        Returns:
+            List[Position]: list of collision detection positions of the wall
+        """
         assert self.orientation in [
             "Horizontal",
             "Vertical",
         ], "Invalid orientation value"
 
-        self.collision_detect_pos = []
-
+        x, y = self.pos
         if self.orientation == "Horizontal":
-            for i in range(self.pos[0], self.pos[0] + self.width, 10):
-                self.collision_detect_pos.append((i, self.pos[1]))
-        elif self.orientation == "Vertical":
-            for i in range(self.pos[1], self.pos[1] + self.height, 10):
-                self.collision_detect_pos.append((self.pos[0], i))
+            return [(i, y) for i in range(x, x + self.width, self.cell_size)]
+        return [(x, i) for i in range(y, y + self.height, self.cell_size)]
 
     def get_collision_detect_pos(self) -> List[Position]:
-        """Get the collision detection positions of the wall
+        """Get the collision detection positions of the wall, computed on every call
 
         Returns:
             List[Position]: list of collision detection positions of the wall
         """
-        return self.collision_detect_pos
+        return self.calc_collision_detect_pos()
 
-    def draw(self: "Wall", screen: pygame.Surface):
+    def draw(self: "Wall", screen: "pygame.Surface"):
         """Draw the wall on the screen"""
+        import pygame
+
         pygame.draw.rect(
             screen,
             self.color,
@@ -78,17 +92,97 @@ class Wall:
 
 
 class WallController(Controller):
-    def __init__(self, walls: Union[List[Wall], None], width: int, height: int):
+    def __init__(
+        self,
+        walls: Union[List[Wall], None],
+        width: int,
+        height: int,
+        verbose: bool = True,
+        grid: Optional[OccupancyGrid] = None,
+        sampler: Optional[FreeCellSampler] = None,
+        rng: Optional[random.Random] = None,
+        cell_size: int = 10,
+    ):
         """WallController class to manage all the walls in the game
 
         Args:
             walls (Union[List[Wall], None]): list of walls
             width (int): width of the game window
             height (int): height of the game window
+            verbose (bool, optional): whether to log every added wall. Defaults to True.
+            grid (Optional[OccupancyGrid], optional): occupancy grid to keep up to date. Defaults to None.
+            sampler (Optional[FreeCellSampler], optional): draws free cells of the grid for new wall, instead of rejection sampling. Defaults to None.
+            rng (Optional[random.Random], optional): random generator of the wall positions (without sampler) and orientations. Defaults to None (the global random module).
+            cell_size (int, optional): size of a cell (px). Defaults to 10.
         """
         self.walls = [] if walls is None else walls
         self.width = width
         self.height = height
+        self.verbose = verbose
+        self.cell_size = cell_size
+
+        # collision cells of all walls (with the number of walls on each),
+        # and the pre-rendered walls, both refreshed only by add/remove
+        self.collision_cnt: Dict[Position, int] = {}
+        # walls by the cells they cover, for lookups and culling
+        self.index = ChunkIndex(cell_size)
+        for wall in self.walls:
+            self.__add_collision(wall)
+        self.collision_list: Optional[List[Position]] = None
+        self.layer: Optional["pygame.Surface"] = None
+
+        self.sampler = sampler
+        self.rng = random if rng is None else rng
+        self.grid = grid
+        if self.grid is not None:
+            for wall in self.walls:
+                for pos in wall.get_collision_detect_pos():
+                    self.grid.add(WALL, pos)
+
+    def reset(self) -> None:
+        """Remove all the walls, e.g. for a new game
+
+        The wall list, the collision cells and the index are emptied in place.
+        """
+        if self.grid is not None:
+            for wall in self.walls:
+                for pos in wall.get_collision_detect_pos():
+                    self.grid.remove(WALL, pos)
+        self.walls.clear()
+        self.collision_cnt.clear()
+        self.index.clear()
+        self.collision_list = None
+        self.layer = None
+
+    def copy(
+        self,
+        grid: Optional[OccupancyGrid] = None,
+        sampler: Optional[FreeCellSampler] = None,
+        rng: Optional[random.Random] = None,
+    ) -> "WallController":
+        """Get an independent copy of the controller, e.g. for a fork of the game
+
+        The walls are never modified and the cached collision list and layer are
+        replaced rather than changed, so the copy shares them.
+
+        Args:
+            grid (Optional[OccupancyGrid], optional): the copy of the grid, which already holds the walls. Defaults to None.
+            sampler (Optional[FreeCellSampler], optional): the sampler of the copy of the grid. Defaults to None.
+            rng (Optional[random.Random], optional): random generator of the copy. Defaults to None (the generator of this controller).
+
+        Returns:
+            WallController: the copy
+        """
+        controller = WallController.__new__(WallController)
+        controller.__dict__.update(self.__dict__)
+        controller.walls = list(self.walls)
+        controller.collision_cnt = dict(self.collision_cnt)
+        controller.index = self.index.copy()
+        controller.grid = grid
+        controller.sampler = sampler
+        if rng is not None:
+            controller.rng = rng
+        return controller
 
     def add(self, wall: Union[Wall, None] = None) -> None:
         """Add a wall to the list of walls
@@ -99,40 +193,87 @@ class WallController(Controller):
         if wall is None:
             wall = self.generate()
         self.walls.append(wall)
-        print(f"Wall added at {wall.pos}")
+        self.__add_collision(wall)
+        if self.grid is not None:
+            for pos in wall.get_collision_detect_pos():
+                self.grid.add(WALL, pos)
+        if self.verbose:
+            print(f"Wall added at {wall.pos}")
+
+    def __add_collision(self, wall: Wall) -> None:
+        """Add the cells of a wall to the collision cells and invalidate the caches"""
+        for pos in wall.get_collision_detect_pos():
+            self.collision_cnt[pos] = self.collision_cnt.get(pos, 0) + 1
+        self.index.add(wall, wall.get_collision_detect_pos())
+        self.collision_list = None
+        self.layer = None
+
+    def __remove_collision(self, wall: Wall) -> None:
+        """Remove the cells of a wall from the collision cells and invalidate the caches"""
+        for pos in wall.get_collision_detect_pos():
+            if self.collision_cnt[pos] == 1:
+                del self.collision_cnt[pos]
+            else:
+                self.collision_cnt[pos] -= 1
+        self.index.remove(wall, wall.get_collision_detect_pos())
+        self.collision_list = None
+        self.layer = None
 
     def generate(self, n: int = 1, *lists) -> Union[Wall, List[Wall]]:
         """Generate and add new walls to the list of walls
 
         Args:
             n (int, optional): number of wall(s) to generate. Defaults to 1.
+            *lists: Variable number of lists of positions the wall(s) must not overlap.
+
+        Raises:
+            PlacementError: if a sampler is used and no wall fitted in MAX_PLACEMENT_ATTEMPTS draws in a row, BoardFullError if no cell is free
 
         Returns:
             Union[Wall, List[Wall]]: generated wall(s), a single wall if n=1, else a list of walls
         """
+        occupied = set()
+        for lst in lists:
+            occupied.update(lst)
+
         cnt = 1
+        attempts = 0
         temp_wall_list = []
 
         while cnt <= n:
-            pos = generate_position(self.width, self.height)
-            orientation = random.choice(["Vertical", "Horizontal"])
-            wall = Wall(orientation=orientation, pos=pos)
-            if (
-                check(
-                    wall.get_collision_detect_pos(),
-                    lists[0],
+            if self.sampler is not None:
+                if attempts == MAX_PLACEMENT_ATTEMPTS:
+                    raise PlacementError(
+                        f"No place found for a new wall in {MAX_PLACEMENT_ATTEMPTS} draws"
+                    )
+                attempts += 1
+                pos = self.sampler.sample()
+            else:
+                pos = generate_position(
+                    self.width, self.height, rng=self.rng, cell_size=self.cell_size
                 )
-                == False
+            orientation = self.rng.choice(["Vertical", "Horizontal"])
+            wall = Wall(orientation=orientation, pos=pos, cell_size=self.cell_size)
+            collision_detect_pos = wall.get_collision_detect_pos()
+            if occupied.isdisjoint(collision_detect_pos) and not (
+                self.grid is not None
+                and any(self.grid.is_taken(cell) for cell in collision_detect_pos)
             ):
                 self.add(wall)
                 temp_wall_list.append(wall)
+                occupied.update(collision_detect_pos)
                 cnt += 1
+                attempts = 0
 
         return temp_wall_list[0] if n == 1 else temp_wall_list
 
     def remove(self, idx: int) -> None:
         """Remove a wall from the list of walls"""
-        self.walls.pop(idx)
+        wall = self.walls.pop(idx)
+        self.__remove_collision(wall)
+        if self.grid is not None:
+            for pos in wall.get_collision_detect_pos():
+                self.grid.remove(WALL, pos)
 
     def get(self, idx: Union[int, str] = "all") -> Union[Wall, List[Wall]]:
         """Get a wall from the list of walls
@@ -156,14 +297,65 @@ class WallController(Controller):
         """Get all collision detection positions of the walls
 
         Returns:
-            List[Tuple[Position, Position]]: list of collision detection positions of the walls
+            List[Tuple[Position, Position]]: list of collision detection positions of the walls, shared until the walls change
         """
-        collision_detect_pos = []
-        for wall in self.walls:
-            collision_detect_pos.extend(wall.get_collision_detect_pos())
-        return collision_detect_pos
+        if self.collision_list is None:
+            self.collision_list = []
+            for wall in self.walls:
+                self.collision_list.extend(wall.get_collision_detect_pos())
+        return self.collision_list
 
-    def draw(self: "WallController", screen: pygame.Surface):
-        """Draw all the walls on the screen"""
-        for wall in self.walls:
-            wall.draw(screen)
+    def is_collision(self, pos: Position) -> bool:
+        """Check if a position is covered by a wall
+
+        Args:
+            pos (Position): the position to check
+
+        Returns:
+            bool: True if a wall covers the position
+        """
+        return pos in self.collision_cnt
+
+    def get_at_pos(self, pos: Position) -> List[Wall]:
+        """Get the walls covering a position
+
+        Args:
+            pos (Position): the position to check
+
+        Returns:
+            List[Wall]: the walls covering the position, possibly empty
+        """
+        return self.index.at(pos)
+
+    def get_in_rect(self, x: int, y: int, width: int, height: int) -> List[Wall]:
+        """Get the walls near a region, e.g. to draw only the visible ones
+
+        Args:
+            x (int): left of the region (px)
+            y (int): top of the region (px)
+            width (int): width of the region (px)
+            height (int): height of the region (px)
+
+        Returns:
+            List[Wall]: the walls in the chunks the region overlaps, including some just outside it
+        """
+        return self.index.query(x, y, width, height)
+
+    def draw(self: "WallController", screen: "pygame.Surface"):
+        """Draw all the walls on the screen, as a single blit of the cached wall layer"""
+        import pygame
+
+        if self.layer is None:
+            colorkey = LAYER_COLORKEY
+            wall_colors = {tuple(wall.color) for wall in self.walls}
+            while colorkey in wall_colors:
+                colorkey = (colorkey[0] - 1, colorkey[1], colorkey[2])
+
+            self.layer = pygame.Surface((self.width, self.height))
+            self.layer.fill(colorkey)
+            for wall in self.walls:
+                wall.draw(self.layer)
+            # run-length encoding makes blitting the mostly transparent layer cheap
+            self.layer.set_colorkey(colorkey, pygame.RLEACCEL)
+
+        screen.blit(self.layer, (0, 0))